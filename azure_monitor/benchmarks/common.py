@@ -0,0 +1,103 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Helpers shared by the benchmark scripts of this folder.
+
+The benchmarks are plain scripts, run them from the ``azure_monitor`` folder
+with ``python benchmarks/<name>.py``.
+"""
+import os
+import random
+import time
+
+from opentelemetry.sdk.trace import Span
+from opentelemetry.trace import SpanContext, SpanKind
+from opentelemetry.trace.status import Status, StatusCanonicalCode
+
+os.environ.setdefault(
+    "APPINSIGHTS_INSTRUMENTATIONKEY", "1234abcd-5678-4efa-8abc-1234567890ab"
+)
+
+HOSTS = ["api{}.example.com".format(i) for i in range(20)]
+ROUTES = ["/users/{id}", "/orders/{id}", "/health", "/items", "/search"]
+
+
+def make_spans(count, spans_per_trace=5, seed=0):
+    """Returns ended spans looking like a typical web service batch.
+
+    Every trace has one SERVER span followed by CLIENT dependency spans and
+    all spans of a batch start within a few seconds of each other.
+    """
+    rand = random.Random(seed)
+    start = 1575494316027613500
+    spans = []
+    parent = None
+    trace_id = 0
+    for index in range(count):
+        if index % spans_per_trace == 0:
+            trace_id = rand.getrandbits(128)
+            parent = None
+        context = SpanContext(
+            trace_id=trace_id, span_id=rand.getrandbits(64), is_remote=False
+        )
+        if parent is None:
+            route = rand.choice(ROUTES)
+            span = Span(
+                name="GET " + route,
+                context=context,
+                kind=SpanKind.SERVER,
+                attributes={
+                    "component": "http",
+                    "http.method": "GET",
+                    "http.route": route,
+                    "http.url": "https://www.example.com" + route,
+                    "http.status_code": rand.choice((200, 200, 200, 404)),
+                },
+            )
+            parent = span
+        else:
+            host = rand.choice(HOSTS)
+            span = Span(
+                name="HTTP GET",
+                context=context,
+                parent=parent,
+                kind=SpanKind.CLIENT,
+                attributes={
+                    "component": "http",
+                    "http.method": "GET",
+                    "http.url": "https://{}/v1/resource/{}".format(
+                        host, rand.randint(0, 50)
+                    ),
+                    "http.status_code": 200,
+                    "peer.service": host,
+                },
+            )
+        begin = start + index * 1000000 + rand.randint(0, 999999)
+        span.start(start_time=begin)
+        span.end(end_time=begin + rand.randint(1000000, 500000000))
+        span.status = Status(canonical_code=StatusCanonicalCode.OK)
+        spans.append(span)
+    return spans
+
+
+def measure(function, repeat=5, number=1):
+    """Returns the best CPU time in seconds of ``number`` calls."""
+    best = None
+    for _ in range(repeat):
+        start = time.process_time()
+        for _ in range(number):
+            function()
+        elapsed = (time.process_time() - start) / number
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def print_table(headers, rows):
+    widths = [
+        max(len(str(value)) for value in column)
+        for column in zip(headers, *rows)
+    ]
+    line = "  ".join("{:>%d}" % width for width in widths)
+    print(line.format(*headers))
+    for row in rows:
+        print(line.format(*row))
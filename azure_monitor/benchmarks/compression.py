@@ -0,0 +1,42 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Bytes on the wire and CPU per batch for each gzip compression level."""
+import json
+
+from azure_monitor.export import transport
+from azure_monitor.export.trace import convert_span_to_envelope
+from common import make_spans, measure, print_table
+
+BATCH_SIZES = (10, 100, 512)
+
+
+def main():
+    rows = []
+    for batch_size in BATCH_SIZES:
+        envelopes = [
+            convert_span_to_envelope(span).to_dict()
+            for span in make_spans(batch_size)
+        ]
+        data = json.dumps(envelopes).encode("utf-8")
+        for level in (None,) + tuple(range(1, 10)):
+            body, _ = transport.encode_body(data, level=level, min_size=0)
+            seconds = measure(
+                lambda data=data, level=level: transport.encode_body(
+                    data, level=level, min_size=0
+                ),
+                number=10,
+            )
+            rows.append(
+                (
+                    batch_size,
+                    "off" if level is None else level,
+                    len(body),
+                    "{:.1f}x".format(len(data) / len(body)),
+                    "{:.3f}".format(seconds * 1000),
+                )
+            )
+    print_table(("items", "level", "bytes", "ratio", "cpu ms/batch"), rows)
+
+
+if __name__ == "__main__":
+    main()
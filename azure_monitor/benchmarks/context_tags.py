@@ -0,0 +1,64 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Cost per envelope of copying the context tags into every envelope
+against laying envelope tags over the shared context tags."""
+import tracemalloc
+
+from azure_monitor import json_backend, utils
+from azure_monitor.export.trace import convert_span_to_envelope
+from common import make_spans, measure, print_table
+
+BATCH_SIZE = 512
+
+
+def copied_tags(envelopes):
+    for envelope in envelopes:
+        envelope.tags = dict(envelope.tags)
+    return envelopes
+
+
+def allocated(function):
+    tracemalloc.start()
+    try:
+        result = function()
+        return tracemalloc.get_traced_memory()[0], result
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    spans = make_spans(BATCH_SIZE)
+    rows = []
+    for name, tags in (
+        ("copy", lambda: dict(utils.azure_monitor_context)),
+        ("shared", utils.envelope_tags),
+    ):
+        memory, _ = allocated(lambda tags=tags: [tags() for _ in spans])
+        create = measure(lambda tags=tags: [tags() for _ in spans], number=10)
+        envelopes = [convert_span_to_envelope(span) for span in spans]
+        if name == "copy":
+            copied_tags(envelopes)
+        for backend in json_backend.available_backends():
+            dumps = json_backend.get_backend(backend).dumps
+            seconds = measure(
+                lambda dumps=dumps, envelopes=envelopes: [
+                    dumps(e) for e in envelopes
+                ],
+                number=10,
+            )
+            rows.append(
+                (
+                    name,
+                    backend,
+                    "{:.0f}".format(memory / BATCH_SIZE),
+                    "{:.2f}".format(create / BATCH_SIZE * 1e6),
+                    "{:.2f}".format(seconds / BATCH_SIZE * 1e6),
+                )
+            )
+    print_table(
+        ("tags", "backend", "bytes/item", "create us", "serialize us"), rows
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""CPU per blob of sending the batches kept in local storage, with the
+ingestion endpoint mocked."""
+import os
+import shutil
+import tempfile
+import time
+from unittest import mock
+
+from azure_monitor.export.trace import AzureMonitorSpanExporter
+from common import make_spans, print_table
+
+BATCH_SIZES = (100, 512, 1000)
+BLOBS = 20
+REPEAT = 5
+
+
+class Response:
+    status_code = 200
+    text = '{"itemsReceived": 0, "itemsAccepted": 0, "errors": []}'
+    headers = {}
+
+
+# pylint: disable=protected-access
+def drain(exporter, envelopes):
+    """Returns the CPU seconds of sending ``BLOBS`` stored batches."""
+    for _ in range(BLOBS):
+        exporter._store_envelopes(envelopes)
+    start = time.process_time()
+    exporter._transmit_from_storage()
+    return time.process_time() - start
+
+
+def main():
+    os.environ.setdefault(
+        "APPINSIGHTS_INSTRUMENTATIONKEY",
+        "1234abcd-5678-4efa-8abc-1234567890ab",
+    )
+    rows = []
+    for batch_size in BATCH_SIZES:
+        folder = tempfile.mkdtemp()
+        try:
+            exporter = AzureMonitorSpanExporter(
+                storage_path=folder, retry_max_batches=BLOBS
+            )
+            envelopes = exporter._convert_spans(make_spans(batch_size))
+            with mock.patch("requests.Session.post", return_value=Response()):
+                best = min(drain(exporter, envelopes) for _ in range(REPEAT))
+            exporter.shutdown()
+        finally:
+            shutil.rmtree(folder)
+        rows.append((batch_size, "{:.3f}".format(best * 1000 / BLOBS)))
+    print_table(("items", "ms per blob"), rows)
+
+
+if __name__ == "__main__":
+    main()
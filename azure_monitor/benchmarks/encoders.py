@@ -0,0 +1,77 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""CPU per object of ``to_dict``, of a reflective loop over the slots and
+of the generated encoders, and serialization throughput of envelopes.
+
+``to_dict`` also converts the nested objects, the encoders leave them to
+the JSON encoder."""
+import functools
+
+from azure_monitor import json_backend, protocol
+from azure_monitor.export.trace import convert_span_to_envelope
+from common import make_spans, measure, print_table
+
+BATCH_SIZE = 512
+
+
+fields = functools.lru_cache()(protocol._fields)  # pylint: disable=W0212
+
+
+def reflective(value):
+    result = {}
+    for name, key, default in fields(type(value)):
+        field = getattr(value, name)
+        if field is not None and (
+            default is protocol._NO_DEFAULT  # pylint: disable=W0212
+            or field != default
+        ):
+            result[key] = field
+    return result
+
+
+def main():
+    envelopes = [
+        convert_span_to_envelope(span) for span in make_spans(BATCH_SIZE)
+    ]
+    objects = (
+        ("Envelope", envelopes),
+        ("Data", [envelope.data for envelope in envelopes]),
+        (
+            "RemoteDependency",
+            [envelope.data.base_data for envelope in envelopes],
+        ),
+    )
+    rows = []
+    for name, values in objects:
+        timings = [
+            measure(
+                lambda encode=encode, values=values: [
+                    encode(v) for v in values
+                ],
+                number=10,
+            )
+            for encode in (
+                lambda v: v.to_dict(),
+                reflective,
+                protocol.json_fields,
+            )
+        ]
+        rows.append(
+            (name,)
+            + tuple(
+                "{:.2f}".format(seconds / BATCH_SIZE * 1e6)
+                for seconds in timings
+            )
+        )
+    print_table(("class", "to_dict us", "reflective us", "generated us"), rows)
+    print()
+    rows = []
+    for name in json_backend.available_backends():
+        dumps = json_backend.get_backend(name).dumps
+        seconds = measure(lambda dumps=dumps: dumps(envelopes), number=10)
+        rows.append((name, "{:.0f}".format(BATCH_SIZE / seconds)))
+    print_table(("backend", "envelopes/s"), rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""CPU per span of the id, timestamp and duration formatting done when
+converting spans, with and without the cached formatters of ``utils``."""
+from opentelemetry.sdk.util import ns_to_iso_str
+
+from azure_monitor import utils
+from common import make_spans, measure, print_table
+
+BATCH_SIZE = 1000
+
+
+def ns_to_duration(nanoseconds):
+    value = (nanoseconds + 500000) // 1000000
+    value, microseconds = divmod(value, 1000)
+    value, seconds = divmod(value, 60)
+    value, minutes = divmod(value, 60)
+    days, hours = divmod(value, 24)
+    return "{:d}.{:02d}:{:02d}:{:02d}.{:03d}".format(
+        days, hours, minutes, seconds, microseconds
+    )
+
+
+def main():
+    spans = make_spans(BATCH_SIZE)
+    trace_ids = [span.context.trace_id for span in spans]
+    start_times = [span.start_time for span in spans]
+    durations = [span.end_time - span.start_time for span in spans]
+    cases = (
+        ("trace id", trace_ids, "{:032x}".format, utils.format_trace_id,),
+        ("timestamp", start_times, ns_to_iso_str, utils.ns_to_iso_str),
+        ("duration", durations, ns_to_duration, utils.ns_to_duration),
+    )
+    rows = []
+    total = [0.0, 0.0]
+    for name, values, before, after in cases:
+        timings = [
+            measure(
+                lambda f=f, values=values: [f(v) for v in values], number=10
+            )
+            for f in (before, after)
+        ]
+        for index, seconds in enumerate(timings):
+            total[index] += seconds
+        rows.append(
+            (name,)
+            + tuple(
+                "{:.3f}".format(seconds / BATCH_SIZE * 1e6)
+                for seconds in timings
+            )
+        )
+    rows.append(
+        ("total",)
+        + tuple(
+            "{:.3f}".format(seconds / BATCH_SIZE * 1e6) for seconds in total
+        )
+    )
+    print_table(("per span", "before us", "after us"), rows)
+
+
+if __name__ == "__main__":
+    main()
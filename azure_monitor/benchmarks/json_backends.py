@@ -0,0 +1,51 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Encoding and decoding throughput of every installed JSON backend."""
+from azure_monitor import json_backend
+from azure_monitor.export.trace import convert_span_to_envelope
+from common import make_spans, measure, print_table
+
+BATCH_SIZES = (10, 512)
+
+
+def main():
+    rows = []
+    for batch_size in BATCH_SIZES:
+        envelopes = [
+            convert_span_to_envelope(span) for span in make_spans(batch_size)
+        ]
+        for name in json_backend.available_backends():
+            backend = json_backend.get_backend(name)
+            data = backend.dumps(envelopes)
+            dumps = measure(
+                lambda: backend.dumps(envelopes),  # pylint: disable=W0640
+                number=10,
+            )
+            loads = measure(
+                lambda: backend.loads(data), number=10  # pylint: disable=W0640
+            )
+            rows.append(
+                (
+                    batch_size,
+                    name,
+                    "{:.3f}".format(dumps * 1000),
+                    "{:.1f}".format(len(data) / dumps / 1024 / 1024),
+                    "{:.3f}".format(loads * 1000),
+                    "{:.1f}".format(len(data) / loads / 1024 / 1024),
+                )
+            )
+    print_table(
+        (
+            "items",
+            "backend",
+            "dumps ms",
+            "dumps MB/s",
+            "loads ms",
+            "loads MB/s",
+        ),
+        rows,
+    )
+
+
+if __name__ == "__main__":
+    main()
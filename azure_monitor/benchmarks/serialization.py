@@ -0,0 +1,57 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Request body size and CPU per batch of ``to_dict`` followed by
+``json.dumps`` against ``protocol.serialize``."""
+import json
+
+from azure_monitor import protocol
+from azure_monitor.export.trace import convert_span_to_envelope
+from common import make_spans, measure, print_table
+
+BATCH_SIZES = (10, 100, 512, 1000)
+
+
+def to_dict_dumps(envelopes):
+    return json.dumps([envelope.to_dict() for envelope in envelopes]).encode(
+        "utf-8"
+    )
+
+
+def main():
+    rows = []
+    for batch_size in BATCH_SIZES:
+        envelopes = [
+            convert_span_to_envelope(span) for span in make_spans(batch_size)
+        ]
+        baseline = measure(
+            lambda envelopes=envelopes: to_dict_dumps(envelopes), number=10
+        )
+        serialized = measure(
+            lambda envelopes=envelopes: protocol.serialize(envelopes),
+            number=10,
+        )
+        rows.append(
+            (
+                batch_size,
+                len(to_dict_dumps(envelopes)),
+                len(protocol.serialize(envelopes)),
+                "{:.3f}".format(baseline * 1000),
+                "{:.3f}".format(serialized * 1000),
+                "{:.2f}x".format(baseline / serialized),
+            )
+        )
+    print_table(
+        (
+            "items",
+            "dumps bytes",
+            "serialize bytes",
+            "dumps ms",
+            "serialize ms",
+            "speedup",
+        ),
+        rows,
+    )
+
+
+if __name__ == "__main__":
+    main()
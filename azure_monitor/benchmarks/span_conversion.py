@@ -0,0 +1,45 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Spans converted per second by `convert_span_to_envelope` called for
+every span against `convert_spans_to_envelopes`."""
+from azure_monitor.export.trace import (
+    convert_span_to_envelope,
+    convert_spans_to_envelopes,
+)
+from common import make_spans, measure, print_table
+
+BATCH_SIZES = (10, 100, 512, 1000)
+IKEY = "1234abcd-5678-4efa-8abc-1234567890ab"
+
+
+def per_span(spans):
+    envelopes = []
+    for span in spans:
+        envelope = convert_span_to_envelope(span)
+        envelope.ikey = IKEY
+        envelopes.append(envelope)
+    return envelopes
+
+
+def main():
+    rows = []
+    for batch_size in BATCH_SIZES:
+        spans = make_spans(batch_size)
+        single = measure(lambda spans=spans: per_span(spans), number=10)
+        batch = measure(
+            lambda spans=spans: convert_spans_to_envelopes(spans, IKEY),
+            number=10,
+        )
+        rows.append(
+            (
+                batch_size,
+                "{:.0f}".format(batch_size / single),
+                "{:.0f}".format(batch_size / batch),
+                "{:.2f}x".format(single / batch),
+            )
+        )
+    print_table(("spans", "per span/s", "batch/s", "speedup"), rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""CPU per dropped span of a span filter against converting the span and
+dropping its envelope with a telemetry processor."""
+import shutil
+import tempfile
+
+from opentelemetry.trace import SpanKind
+
+from azure_monitor.export.trace import AzureMonitorSpanExporter
+from azure_monitor.export.trace.filters import SpanFilter
+from common import make_spans, measure, print_table
+
+BATCH_SIZE = 1000
+
+
+def main():
+    spans = make_spans(BATCH_SIZE)
+    folder = tempfile.mkdtemp()
+    try:
+        by_processor = AzureMonitorSpanExporter(storage_path=folder)
+        by_processor.add_telemetry_processor(
+            lambda envelope: envelope.name
+            != "Microsoft.ApplicationInsights.RemoteDependency"
+        )
+        by_filter = AzureMonitorSpanExporter(storage_path=folder)
+        by_filter.add_span_filter(SpanFilter(kind=SpanKind.CLIENT))
+        rows = []
+        for name, exporter in (
+            ("processor", by_processor),
+            ("span filter", by_filter),
+        ):
+
+            def export(exporter=exporter):
+                # pylint: disable=protected-access
+                return exporter._process_envelopes(
+                    exporter._convert_spans(spans)
+                )
+
+            seconds = measure(export, number=10)
+            kept = len(export())
+            rows.append(
+                (name, kept, "{:.2f}".format(seconds / BATCH_SIZE * 1e6),)
+            )
+        print_table(("drop with", "kept", "us/span"), rows)
+    finally:
+        shutil.rmtree(folder)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""CPU of getting and leasing the next blob, and of putting a blob, in a
+local storage holding a backlog of blobs, and of filling the blob and log
+storages during an outage."""
+import datetime
+import os
+import shutil
+import tempfile
+
+from azure_monitor.log_storage import LogStorage
+from azure_monitor.storage import LocalFileBlob, LocalFileStorage, _fmt
+from common import measure, print_table
+
+SIZES = (1000, 10000, 100000)
+OUTAGE = 10000
+LEASED = 20
+BATCH = [{"name": "test", "data": "x" * 200}] * 10
+
+
+def make_backlog(folder, size):
+    """Writes the blobs left by a previous run."""
+    start = datetime.datetime.utcnow() - datetime.timedelta(hours=1)
+    for index in range(size):
+        name = "{}-{:08x}.blob".format(
+            _fmt(start + datetime.timedelta(milliseconds=index)), index,
+        )
+        LocalFileBlob(os.path.join(folder, name)).put(({"name": "test"},))
+
+
+def main():
+    rows = []
+    for size in SIZES:
+        folder = tempfile.mkdtemp()
+        try:
+            make_backlog(folder, size)
+            with LocalFileStorage(folder, max_size=2 ** 40) as storage:
+                # blobs being sent by other exports
+                for blob in list(storage.gets())[:LEASED]:
+                    blob.lease(600)
+                get = measure(storage.get, number=20)
+
+                def lease_next(storage=storage):
+                    storage.get().lease(600)
+
+                lease = measure(lease_next, number=20)
+                put = measure(
+                    lambda storage=storage: storage.put(BATCH), number=20
+                )
+            rows.append(
+                (
+                    size,
+                    "{:.1f}".format(get * 1e6),
+                    "{:.1f}".format(lease * 1e6),
+                    "{:.1f}".format(put * 1e6),
+                )
+            )
+        finally:
+            shutil.rmtree(folder)
+    print_table(("blobs", "get us", "get+lease us", "put us"), rows)
+    print()
+    print_table(("engine", "put us", "drain us", "files"), outage())
+
+
+def outage():
+    """Batches stored during an outage then sent and deleted."""
+    rows = []
+    for engine, storage_class in (
+        ("blob", LocalFileStorage),
+        ("log", LogStorage),
+    ):
+        folder = tempfile.mkdtemp()
+        try:
+            with storage_class(folder, max_size=2 ** 40) as storage:
+
+                def fill(storage=storage):
+                    for _ in range(OUTAGE):
+                        storage.put(BATCH)
+
+                put = measure(fill, repeat=1)
+                files = len(os.listdir(folder))
+
+                def drain(storage=storage):
+                    for blob in storage.gets():
+                        if blob.lease(60):
+                            blob.get()
+                            blob.delete()
+
+                drain = measure(drain, repeat=1)
+            rows.append(
+                (
+                    engine,
+                    "{:.1f}".format(put * 1e6 / OUTAGE),
+                    "{:.1f}".format(drain * 1e6 / OUTAGE),
+                    files,
+                )
+            )
+        finally:
+            shutil.rmtree(folder)
+    return rows
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Size and throughput of the blobs kept in local storage, for each batch
+size: uncompressed, gzipped like the requests, and compressed with zlib
+without and with the preset dictionary."""
+import gzip
+import os
+import shutil
+import tempfile
+import zlib
+
+from azure_monitor.export.trace import AzureMonitorSpanExporter
+from azure_monitor.storage import compress_body, decompress_body
+from common import make_spans, measure, print_table
+
+BATCH_SIZES = (1, 10, 100, 512)
+LEVEL = 6
+
+
+def zlib_compress(data):
+    return zlib.compress(data, LEVEL)
+
+
+def main():
+    os.environ.setdefault(
+        "APPINSIGHTS_INSTRUMENTATIONKEY",
+        "1234abcd-5678-4efa-8abc-1234567890ab",
+    )
+    folder = tempfile.mkdtemp()
+    exporter = AzureMonitorSpanExporter(storage_path=folder)
+    rows = []
+    for batch_size in BATCH_SIZES:
+        # pylint: disable=protected-access
+        envelopes = exporter._convert_spans(make_spans(batch_size, seed=1))
+        data = exporter._json.dumps(envelopes)
+        for name, compress, decompress in (
+            ("gzip", lambda body: gzip.compress(body, LEVEL), gzip.decompress),
+            ("zlib", zlib_compress, zlib.decompress),
+            (
+                "zlib+dict",
+                lambda body: compress_body(body, LEVEL),
+                decompress_body,
+            ),
+        ):
+            blob = compress(data)
+            compress_seconds = measure(
+                lambda: compress(data), number=20  # pylint: disable=W0640
+            )
+            decompress_seconds = measure(
+                lambda: decompress(blob), number=20  # pylint: disable=W0640
+            )
+            rows.append(
+                (
+                    batch_size,
+                    name,
+                    len(data),
+                    len(blob),
+                    "{:.1f}x".format(len(data) / len(blob)),
+                    "{:.0f}".format(len(data) / compress_seconds / 2 ** 20),
+                    "{:.0f}".format(len(data) / decompress_seconds / 2 ** 20),
+                )
+            )
+    exporter.shutdown()
+    shutil.rmtree(folder)
+    print_table(
+        (
+            "items",
+            "codec",
+            "bytes",
+            "stored",
+            "ratio",
+            "compress MB/s",
+            "decompress MB/s",
+        ),
+        rows,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -13,7 +13,7 @@ from azure_monitor.sdk.auto_collection import (
 # Add Span Processor to get metrics about traces
 trace.set_tracer_provider(TracerProvider())
 tracer = trace.get_tracer_provider().get_tracer(__name__)
-span_processor = AzureMetricsSpanProcessor()
+span_processor = AzureMetricsSpanProcessor(standard_metrics=True)
 trace.get_tracer_provider().add_span_processor(span_processor)
 
 metrics.set_meter_provider(MeterProvider())
@@ -21,6 +21,8 @@ meter = metrics.get_meter(__name__)
 exporter = AzureMonitorMetricsExporter(
     connection_string="InstrumentationKey=<INSTRUMENTATION KEY HERE>"
 )
+# Send the standard request and dependency metrics aggregated from spans
+exporter.set_standard_metrics_source(span_processor.collect_standard_metrics)
 
 testing_label_set = {"environment": "testing"}
 
@@ -1,8 +1,9 @@
 # Copyright (c) Microsoft Corporation. All rights reserved.
 # Licensed under the MIT License.
-import json
 import logging
+import threading
 import typing
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
 from urllib.parse import urlparse
 
@@ -13,10 +14,16 @@ from opentelemetry.sdk.util import ns_to_iso_str
 from opentelemetry.trace import Span, SpanKind
 from opentelemetry.trace.status import StatusCanonicalCode
 
-from azure_monitor import protocol, utils
+from azure_monitor import json_backend, protocol, utils
+from azure_monitor.export import batching, transport
+from azure_monitor.export.circuit_breaker import CircuitBreaker, CircuitState
+from azure_monitor.export.processors import TelemetryProcessor
+from azure_monitor.export.retry import RetryScheduler, parse_retry_after
+from azure_monitor.export.transmission import TransmissionQueue
+from azure_monitor.log_storage import LogStorage
 from azure_monitor.options import ExporterOptions
 from azure_monitor.protocol import Envelope
-from azure_monitor.storage import LocalFileStorage
+from azure_monitor.storage import _GZIP_MAGIC, LocalFileStorage, decode_batch
 
 logger = logging.getLogger(__name__)
 
@@ -36,31 +43,149 @@ class BaseExporter:
     """
 
     def __init__(self, **options):
-        self._telemetry_processors = []
+        self._telemetry_processors = ()
+        self._processors_lock = threading.Lock()
         self.options = ExporterOptions(**options)
-        self.storage = LocalFileStorage(
+        self._json = json_backend.get_backend(self.options.json_backend)
+        if self.options.storage_engine == "blob":
+            storage_class = LocalFileStorage
+        elif self.options.storage_engine == "log":
+            # exporters of the process writing to the same folder share it
+            storage_class = LogStorage.open
+        else:
+            raise ValueError(
+                "Unknown storage engine {!r}.".format(
+                    self.options.storage_engine
+                )
+            )
+        self.storage = storage_class(
             path=self.options.storage_path,
             max_size=self.options.storage_max_size,
             maintenance_period=self.options.storage_maintenance_period,
             retention_period=self.options.storage_retention_period,
+            json_backend=self.options.json_backend,
+            compression_level=self.options.storage_compression_level,
+        )
+        self._session = transport.acquire_session(
+            self.options.endpoint,
+            pool_size=self.options.connection_pool_size,
+            keep_alive=self.options.connection_keep_alive,
+            idle_timeout=self.options.connection_idle_timeout,
+        )
+
+        self._circuit_breaker = CircuitBreaker(
+            failure_threshold=self.options.circuit_breaker_threshold,
+            recovery_timeout=self.options.circuit_breaker_recovery_timeout,
+        )
+        self._retry = RetryScheduler(
+            initial_backoff=self.options.retry_initial_backoff,
+            max_backoff=self.options.retry_max_backoff,
+            max_age=self.options.retry_max_age,
         )
+        self._retry_task = None
+        if self.options.retry_interval:
+            self._retry_task = utils.PeriodicTask(
+                interval=self.options.retry_interval,
+                function=self._retry_from_storage,
+            )
+            self._retry_task.daemon = True
+            self._retry_task.start()
+
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._transmission = None
+        if self.options.transmission_workers > 0:
+            self._transmission = TransmissionQueue(
+                send=self._send_batch,
+                spill=self._store_envelopes,
+                max_size=self.options.transmission_queue_size,
+                workers=self.options.transmission_workers,
+                overflow_policy=self.options.transmission_overflow_policy,
+            )
+
+    def flush(self, timeout: float = None) -> bool:
+        """Waits until the batches queued for transmission have been sent.
+
+        Args:
+            timeout: Maximum number of seconds to wait, None waits forever.
+
+        Returns False if the timeout expired first.
+        """
+        if self._transmission is None:
+            return True
+        return self._transmission.flush(timeout)
+
+    def shutdown(self, timeout: float = None) -> None:
+        """Sends the queued batches, releases the connection pool and stops
+        the storage maintenance.
+
+        The connection pool and the storage are left open while batches
+        are still being sent when the timeout expires.
+
+        Args:
+            timeout: Maximum number of seconds to wait for queued batches,
+            the ones left over are written to local storage.
+        """
+        if self._transmission is not None:
+            self._transmission.shutdown(timeout)
+        if self._retry_task is not None:
+            self._retry_task.cancel()
+            self._retry_task.join()
+        if self._transmission is not None and not self._transmission.stopped:
+            logger.warning(
+                "Transmission workers are still sending batches, "
+                "the connection pool and local storage are left open."
+            )
+            return
+        if self._executor is not None:
+            self._executor.shutdown()
+        transport.release_session(self._session)
+        self._session = None
+        self.storage.close()
+
+    def get_stats(self) -> typing.Dict[str, typing.Any]:
+        """Returns the state of the circuit breaker, the retries, the
+        transmission queue and the counters of the telemetry processors."""
+        stats = {
+            "circuit_breaker": self._circuit_breaker.stats(),
+            "retry": {"paused_for": self._retry.pause_remaining},
+            "telemetry_processors": [
+                processor.stats() for processor in self._telemetry_processors
+            ],
+        }
+        if self._transmission is not None:
+            stats["transmission"] = {
+                "queued": len(self._transmission),
+                "dropped": self._transmission.dropped,
+                "spilled": self._transmission.spilled,
+            }
+        return stats
 
     def add_telemetry_processor(
-        self, processor: typing.Callable[..., any]
+        self, processor: typing.Callable[..., any], batch: bool = False
     ) -> None:
         """Adds telemetry processor to the collection.
 
         Telemetry processors will be called one by one before telemetry
         item is pushed for sending and in the order they were added.
+        Processors can be added while envelopes are exported, the export
+        in progress keeps using the previous processors.
 
         Args:
             processor: Processor to add
+            batch: True if the processor is called once with the list of
+            envelopes and returns the envelopes to keep, see
+            `processors.TelemetryProcessor`.
         """
-        self._telemetry_processors.append(processor)
+        with self._processors_lock:
+            self._telemetry_processors = self._telemetry_processors + (
+                TelemetryProcessor(processor, batch),
+            )
 
     def clear_telemetry_processors(self) -> None:
         """Removes all telemetry processors"""
-        self._telemetry_processors = []
+        with self._processors_lock:
+            self._telemetry_processors = ()
 
     def _apply_telemetry_processors(
         self, envelopes: typing.List[Envelope]
@@ -76,127 +201,339 @@ class BaseExporter:
         Args:
             envelopes: The envelopes to apply each processor to.
         """
-        filtered_envelopes = []
-        for envelope in envelopes:
-            accepted = True
-            for processor in self._telemetry_processors:
-                try:
-                    if processor(envelope) is False:
-                        accepted = False
-                        break
-                except Exception as ex:
-                    logger.warning("Telemetry processor failed with: %s.", ex)
-            if accepted:
-                filtered_envelopes.append(envelope)
-        return filtered_envelopes
+        processors = self._telemetry_processors
+        if not processors:
+            return envelopes
+        for processor in processors:
+            envelopes = processor.process(envelopes)
+            if not envelopes:
+                break
+        return envelopes
+
+    def _process_envelopes(
+        self, envelopes: typing.List[Envelope]
+    ) -> typing.List[Envelope]:
+        """Applies the telemetry processors to the envelopes.
+
+        The envelopes are serialized only when they are sent or stored.
+        """
+        return self._apply_telemetry_processors(envelopes)
+
+    def _send(self, envelopes: typing.List[Envelope]) -> ExportResult:
+        """Sends serialized envelopes or queues them for transmission.
+
+        Queued envelopes are reported as a success, failures happening in the
+        background are handled by writing the envelopes to local storage.
+        """
+        if self._transmission is None:
+            return self._send_batch(envelopes)
+        if not envelopes:
+            return ExportResult.SUCCESS
+        if self._transmission.put(envelopes):
+            return ExportResult.SUCCESS
+        return ExportResult.FAILED_NOT_RETRYABLE
+
+    def _send_batch(self, envelopes: typing.List[Envelope]) -> ExportResult:
+        results = self._transmit_chunks(envelopes)
+        for data, result in results:
+            if result == ExportResult.FAILED_RETRYABLE:
+                # lease the blob until its first retry is due
+                self._store(data, lease_period=self._retry.record_failure())
+        result = merge_results(result for _, result in results)
+        if result == ExportResult.SUCCESS:
+            # Try to send any cached events
+            self._transmit_from_storage()
+        return result
+
+    def _split_envelopes(
+        self, envelopes: typing.List[Envelope]
+    ) -> typing.List[typing.Tuple[typing.List[Envelope], bytes]]:
+        return batching.split_envelopes(
+            envelopes,
+            max_bytes=self.options.transmission_max_bytes,
+            max_items=self.options.transmission_max_items,
+            encode=self._json.dumps,
+        )
+
+    def _transmit_chunks(
+        self, envelopes: typing.List[Envelope]
+    ) -> typing.List[typing.Tuple[bytes, ExportResult]]:
+        """Transmits envelopes in chunks fitting the request size limits.
+
+        Chunks are posted in parallel, each one gets its own ExportResult
+        returned with its serialized envelopes.
+        """
+        if not envelopes:
+            return []
+        chunks = self._split_envelopes(envelopes)
+        if len(chunks) == 1:
+            chunk, data = chunks[0]
+            return [(data, self._transmit(chunk, data))]
+        # transmission workers may split their batches at the same time
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.options.transmission_concurrency
+                )
+        futures = [
+            (data, self._executor.submit(self._transmit, chunk, data))
+            for chunk, data in chunks
+        ]
+        return [(data, future.result()) for data, future in futures]
+
+    def _store(self, data: bytes, lease_period: float = 0) -> None:
+        """Stores serialized envelopes as the body of the request retrying
+        them, compressed like the requests."""
+        data, _ = transport.encode_body(
+            data,
+            level=self.options.compression_level,
+            min_size=self.options.compression_min_size,
+        )
+        self.storage.put(data, lease_period=lease_period)
+
+    def _store_envelopes(
+        self, envelopes: typing.List[Envelope], lease_period: float = 0
+    ) -> None:
+        """Stores envelopes in blobs fitting the request size limits."""
+        for _, data in self._split_envelopes(envelopes):
+            self._store(data, lease_period=lease_period)
+
+    def _retry_from_storage(self) -> None:
+        try:
+            self._transmit_from_storage()
+        except Exception:
+            logger.exception("Exception occurred while retrying stored data.")
 
     def _transmit_from_storage(self) -> None:
+        """Sends the stored batches whose backoff has elapsed.
+
+        At most ``retry_max_batches`` are sent, the first batch failing again
+        with a retryable error stops the retries until the next call.
+        """
+        self._retry.prune(lambda name: name in self.storage)
+        if (
+            self._retry.paused
+            or self._circuit_breaker.state == CircuitState.OPEN
+        ):
+            return
+        sent = 0
         for blob in self.storage.gets():
+            if sent >= self.options.retry_max_batches:
+                return
+            if self._drop_expired(blob):
+                continue
             # give a few more seconds for blob lease operation
             # to reduce the chance of race (for perf consideration)
             if blob.lease(self.options.timeout + 5):
-                envelopes = blob.get()
-                result = self._transmit(envelopes)
-                if result == ExportResult.FAILED_RETRYABLE:
-                    blob.lease(1)
-                else:
-                    blob.delete()
+                sent += 1
+                # the blob is the request body, posted without parsing it
+                data = blob.read()
+                if data and (
+                    self._transmit(None, data) == ExportResult.FAILED_RETRYABLE
+                ):
+                    blob.lease(self._retry.record_failure(blob.name))
+                    return
+                self._retry.record_success(blob.name)
+                blob.delete()
 
-    # pylint: disable=too-many-branches
-    # pylint: disable=too-many-nested-blocks
-    # pylint: disable=too-many-return-statements
-    def _transmit(self, envelopes: typing.List[Envelope]) -> ExportResult:
+    def _drop_expired(self, blob) -> bool:
+        if not self._retry.is_expired(blob.created):
+            return False
+        logger.warning(
+            "Dropping telemetry stored for more than %s seconds.",
+            self.options.retry_max_age,
+        )
+        self._retry.record_success(blob.name)
+        blob.delete()
+        return True
+
+    def _transmit(
+        self, envelopes: typing.List[Envelope], data: bytes = None
+    ) -> ExportResult:
         """
         Transmit the data envelopes to the ingestion service.
 
         Returns an ExportResult, this function should never
-        throw an exception.
+        throw an exception. While the circuit breaker is open or ingestion
+        asked to wait with Retry-After, the envelopes are reported as
+        retryable without sending any request.
+
+        Args:
+            envelopes: The envelopes to send, None if they are only given
+            serialized.
+            data: The envelopes already serialized to a JSON array, possibly
+            gzipped.
         """
-        if len(envelopes) > 0:
-            try:
-                response = requests.post(
-                    url=self.options.endpoint,
-                    data=json.dumps(envelopes),
-                    headers={
-                        "Accept": "application/json",
-                        "Content-Type": "application/json; charset=utf-8",
-                    },
-                    timeout=self.options.timeout,
-                    proxies=self.options.proxies,
-                )
-            except requests.Timeout:
-                logger.warning(
-                    "Request time out. Ingestion may be backed up. Retrying."
-                )
-                return ExportResult.FAILED_RETRYABLE
-            except Exception as ex:
-                logger.warning(
-                    "Retrying due to transient client side error %s.", ex
-                )
-                # client side error (retryable)
+        if envelopes or data:
+            if self._retry.paused or not self._circuit_breaker.allow_request():
                 return ExportResult.FAILED_RETRYABLE
+            result = self._transmit_request(envelopes, data)
+            self._record_result(result)
+            return result
+        # No spans to export
+        return ExportResult.SUCCESS
+
+    def _record_result(self, result: ExportResult) -> None:
+        if result == ExportResult.FAILED_RETRYABLE:
+            self._circuit_breaker.record_failure()
+        else:
+            self._circuit_breaker.record_success()
+
+    def _transmit_request(
+        self, envelopes: typing.List[Envelope], data: bytes = None
+    ) -> ExportResult:
+        try:
+            data, headers = self._prepare_request(envelopes, data)
+            response = self._session.post(
+                url=self.options.endpoint,
+                data=data,
+                headers=headers,
+                timeout=self.options.timeout,
+                proxies=self.options.proxies,
+            )
+        except requests.Timeout:
+            logger.warning(
+                "Request time out. Ingestion may be backed up. Retrying."
+            )
+            return ExportResult.FAILED_RETRYABLE
+        except Exception as ex:
+            logger.warning(
+                "Retrying due to transient client side error %s.", ex
+            )
+            # client side error (retryable)
+            return ExportResult.FAILED_RETRYABLE
 
-            text = "N/A"
-            data = None
-            try:
-                text = response.text
-            except Exception as ex:
-                logger.warning("Error while reading response body %s.", ex)
-            else:
+        text = "N/A"
+        try:
+            text = response.text
+        except Exception as ex:
+            logger.warning("Error while reading response body %s.", ex)
+        if envelopes is None and response.status_code == 206:
+            envelopes = self._decode_envelopes(data)
+        result, resend_envelopes = self._handle_response(
+            envelopes,
+            response.status_code,
+            text,
+            getattr(response, "headers", None),
+        )
+        if resend_envelopes:
+            self._store_envelopes(resend_envelopes)
+        return result
+
+    def _decode_envelopes(self, data: bytes) -> typing.List[typing.Any]:
+        """Parses a stored request body, only needed to resend the envelopes
+        of a partial success."""
+        try:
+            return decode_batch(data, self._json)
+        except Exception as ex:
+            logger.error("Error while parsing stored envelopes %s.", ex)
+            return []
+
+    def _prepare_request(
+        self, envelopes: typing.List[Envelope], data: bytes = None
+    ) -> typing.Tuple[bytes, typing.Dict[str, str]]:
+        if data is None:
+            data = self._json.dumps(envelopes)
+        if data[:2] == _GZIP_MAGIC:
+            encoding = "gzip"  # stored compressed
+        else:
+            data, encoding = transport.encode_body(
+                data,
+                level=self.options.compression_level,
+                min_size=self.options.compression_min_size,
+            )
+        headers = {
+            "Accept": "application/json",
+            "Content-Type": "application/json; charset=utf-8",
+        }
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        return data, headers
+
+    # pylint: disable=too-many-branches
+    # pylint: disable=too-many-nested-blocks
+    # pylint: disable=too-many-return-statements
+    def _handle_response(
+        self,
+        envelopes: typing.List[Envelope],
+        status_code: int,
+        text: str,
+        headers: typing.Mapping[str, str] = None,
+    ) -> typing.Tuple[ExportResult, typing.List[Envelope]]:
+        """Maps an ingestion response to an ExportResult.
+
+        A Retry-After header on a throttling response pauses the requests.
+        Returns the result and the envelopes of a partial success that should
+        be stored to be sent again.
+        """
+        data = None
+        try:
+            data = self._json.loads(text)
+        except Exception:
+            pass
+
+        if status_code == 200:
+            logger.info("Transmission succeeded: %s.", text)
+            return ExportResult.SUCCESS, None
+        if status_code == 206:  # Partial Content
+            if data:
+                resend_envelopes = []
                 try:
-                    data = json.loads(text)
-                except Exception:
-                    pass
-
-            if response.status_code == 200:
-                logger.info("Transmission succeeded: %s.", text)
-                return ExportResult.SUCCESS
-            if response.status_code == 206:  # Partial Content
-                # TODO: store the unsent data
-                if data:
-                    try:
-                        resend_envelopes = []
-                        for error in data["errors"]:
-                            if error["statusCode"] in (
-                                429,  # Too Many Requests
-                                439,  # Too Many Requests over extended time
-                                500,  # Internal Server Error
-                                503,  # Service Unavailable
-                            ):
-                                resend_envelopes.append(
-                                    envelopes[error["index"]]
-                                )
-                            else:
-                                logger.error(
-                                    "Data drop %s: %s %s.",
-                                    error["statusCode"],
-                                    error["message"],
-                                    envelopes[error["index"]],
-                                )
-                        if resend_envelopes:
-                            self.storage.put(resend_envelopes)
-                    except Exception as ex:
-                        logger.error(
-                            "Error while processing %s: %s %s.",
-                            response.status_code,
-                            text,
-                            ex,
-                        )
-                    return ExportResult.FAILED_NOT_RETRYABLE
-                # cannot parse response body, fallback to retry
-
-            if response.status_code in (
-                206,  # Partial Content
-                429,  # Too Many Requests
-                439,  # Too Many Requests over extended time
-                500,  # Internal Server Error
-                503,  # Service Unavailable
-            ):
-                return ExportResult.FAILED_RETRYABLE
+                    for error in data["errors"]:
+                        if error["statusCode"] in (
+                            429,  # Too Many Requests
+                            439,  # Too Many Requests over extended time
+                            500,  # Internal Server Error
+                            503,  # Service Unavailable
+                        ):
+                            resend_envelopes.append(envelopes[error["index"]])
+                        else:
+                            logger.error(
+                                "Data drop %s: %s %s.",
+                                error["statusCode"],
+                                error["message"],
+                                envelopes[error["index"]],
+                            )
+                except Exception as ex:
+                    logger.error(
+                        "Error while processing %s: %s %s.",
+                        status_code,
+                        text,
+                        ex,
+                    )
+                    resend_envelopes = None
+                return ExportResult.FAILED_NOT_RETRYABLE, resend_envelopes
+            # cannot parse response body, fallback to retry
 
-            return ExportResult.FAILED_NOT_RETRYABLE
-        # No spans to export
-        return ExportResult.SUCCESS
+        if status_code in (
+            206,  # Partial Content
+            429,  # Too Many Requests
+            439,  # Too Many Requests over extended time
+            500,  # Internal Server Error
+            503,  # Service Unavailable
+        ):
+            if status_code in (429, 439, 503) and headers is not None:
+                retry_after = parse_retry_after(headers.get("Retry-After"))
+                if retry_after:
+                    self._retry.throttle(retry_after)
+            return ExportResult.FAILED_RETRYABLE, None
+
+        return ExportResult.FAILED_NOT_RETRYABLE, None
+
+
+def merge_results(results: typing.Iterable[ExportResult]) -> ExportResult:
+    """Returns the result of a batch sent in several chunks.
+
+    Any retryable chunk makes the whole batch retryable, otherwise any failed
+    chunk makes it fail.
+    """
+    merged = ExportResult.SUCCESS
+    for result in results:
+        if result == ExportResult.FAILED_RETRYABLE:
+            return result
+        if result != ExportResult.SUCCESS:
+            merged = result
+    return merged
 
 
 def get_trace_export_result(result: ExportResult) -> SpanExportResult:
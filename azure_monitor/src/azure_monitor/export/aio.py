@@ -0,0 +1,304 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Exporters sending telemetry from an asyncio event loop.
+
+The requests are sent with ``aiohttp``, install it with the ``aio`` extra:
+``pip install opentelemetry-azure-monitor[aio]``.
+"""
+import asyncio
+import functools
+import logging
+import typing
+from urllib.parse import urlparse
+
+from opentelemetry.sdk.metrics.export import MetricRecord, MetricsExportResult
+from opentelemetry.sdk.trace.export import SpanExportResult
+from opentelemetry.trace import Span
+
+from azure_monitor.export import (
+    BaseExporter,
+    ExportResult,
+    get_metrics_export_result,
+    get_trace_export_result,
+    merge_results,
+)
+from azure_monitor.export.circuit_breaker import CircuitState
+from azure_monitor.export.metrics import AzureMonitorMetricsExporter
+from azure_monitor.export.trace import AzureMonitorSpanExporter
+from azure_monitor.protocol import Envelope
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover
+    aiohttp = None
+
+logger = logging.getLogger(__name__)
+
+# request bodies from this size are compressed in the loop's default
+# executor instead of blocking the event loop
+_EXECUTOR_COMPRESSION_SIZE = 64 * 1024
+
+
+# pylint: disable=broad-except
+class AsyncBaseExporter(BaseExporter):
+    """Azure Monitor base exporter sending telemetry without blocking the
+    event loop.
+
+    At most ``transmission_concurrency`` requests are in flight at once and
+    local storage is accessed from the loop's default executor.
+
+    Args:
+        options: :doc:`export.options` to allow configuration for the exporter
+    """
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self._client = None
+        self._semaphore = None
+
+    def _create_client(self) -> "aiohttp.ClientSession":
+        if aiohttp is None:
+            raise ImportError(
+                "The asyncio exporters require aiohttp, install "
+                "opentelemetry-azure-monitor[aio]."
+            )
+        if self.options.connection_keep_alive:
+            connector = aiohttp.TCPConnector(
+                limit=self.options.connection_pool_size,
+                keepalive_timeout=self.options.connection_idle_timeout or None,
+            )
+        else:
+            connector = aiohttp.TCPConnector(
+                limit=self.options.connection_pool_size, force_close=True
+            )
+        return aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.options.timeout),
+        )
+
+    def _get_client(self) -> "aiohttp.ClientSession":
+        # created lazily as both must be bound to the running loop
+        if self._client is None:
+            self._client = self._create_client()
+            self._semaphore = asyncio.Semaphore(
+                self.options.transmission_concurrency
+            )
+        return self._client
+
+    async def shutdown_async(self) -> None:
+        """Closes the HTTP client, then shuts the exporter down."""
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+        await self._run_blocking(self.shutdown)
+
+    # pylint: disable=no-self-use
+    async def _run_blocking(self, function, *args) -> typing.Any:
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(
+            None, functools.partial(function, *args)
+        )
+
+    async def _send_batch_async(
+        self, envelopes: typing.List[Envelope]
+    ) -> ExportResult:
+        results = await self._transmit_chunks_async(envelopes)
+        for data, result in results:
+            if result == ExportResult.FAILED_RETRYABLE:
+                await self._run_blocking(
+                    self._store, data, self._retry.record_failure()
+                )
+        result = merge_results(result for _, result in results)
+        if result == ExportResult.SUCCESS:
+            # Try to send any cached events
+            await self._transmit_from_storage_async()
+        return result
+
+    async def _transmit_chunks_async(
+        self, envelopes: typing.List[Envelope]
+    ) -> typing.List[typing.Tuple[bytes, ExportResult]]:
+        """Asynchronous counterpart of `BaseExporter._transmit_chunks`."""
+        if not envelopes:
+            return []
+        chunks = self._split_envelopes(envelopes)
+        results = await asyncio.gather(
+            *[self._transmit_async(chunk, data) for chunk, data in chunks]
+        )
+        return [(data, result) for (_, data), result in zip(chunks, results)]
+
+    def _lease_blobs(self, count: int) -> typing.List[typing.Tuple]:
+        blobs = []
+        for blob in self.storage.gets():
+            if self._drop_expired(blob):
+                continue
+            # give a few more seconds for blob lease operation
+            # to reduce the chance of race (for perf consideration)
+            if blob.lease(self.options.timeout + 5):
+                blobs.append((blob, blob.read()))
+                if len(blobs) >= count:
+                    break
+        return blobs
+
+    async def _transmit_blob_async(self, blob, data) -> ExportResult:
+        result = ExportResult.SUCCESS
+        if data:
+            result = await self._transmit_async(None, data)
+        if result == ExportResult.FAILED_RETRYABLE:
+            await self._run_blocking(
+                blob.lease, self._retry.record_failure(blob.name)
+            )
+            return result
+        self._retry.record_success(blob.name)
+        await self._run_blocking(blob.delete)
+        return result
+
+    async def _transmit_from_storage_async(self) -> None:
+        # Blobs are sent concurrently in rounds, so that leases do not expire
+        # while waiting, until the storage is empty, ingestion fails again or
+        # retry_max_batches were sent.
+        self._retry.prune(lambda name: name in self.storage)
+        remaining = self.options.retry_max_batches
+        while (
+            remaining > 0
+            and not self._retry.paused
+            and self._circuit_breaker.state != CircuitState.OPEN
+        ):
+            blobs = await self._run_blocking(
+                self._lease_blobs,
+                min(self.options.transmission_concurrency, remaining),
+            )
+            remaining -= len(blobs)
+            if not blobs:
+                return
+            results = await asyncio.gather(
+                *[
+                    self._transmit_blob_async(blob, data)
+                    for blob, data in blobs
+                ]
+            )
+            if ExportResult.FAILED_RETRYABLE in results:
+                return
+
+    async def _transmit_async(
+        self, envelopes: typing.List[Envelope], data: bytes = None
+    ) -> ExportResult:
+        """Asynchronous counterpart of `BaseExporter._transmit`."""
+        if not envelopes and not data:
+            return ExportResult.SUCCESS
+        # raises ImportError before the breaker lets a probe through
+        client = self._get_client()
+        if self._retry.paused or not self._circuit_breaker.allow_request():
+            return ExportResult.FAILED_RETRYABLE
+        result = await self._transmit_request_async(client, envelopes, data)
+        self._record_result(result)
+        return result
+
+    async def _prepare_request_async(
+        self, envelopes: typing.List[Envelope], data: bytes = None
+    ) -> typing.Tuple[bytes, typing.Dict[str, str]]:
+        if data is None:
+            data = self._json.dumps(envelopes)
+        if (
+            self.options.compression_level is not None
+            and len(data) >= _EXECUTOR_COMPRESSION_SIZE
+        ):
+            return await self._run_blocking(self._prepare_request, None, data)
+        return self._prepare_request(None, data)
+
+    async def _transmit_request_async(
+        self,
+        client: "aiohttp.ClientSession",
+        envelopes: typing.List[Envelope],
+        data: bytes = None,
+    ) -> ExportResult:
+        text = "N/A"
+        try:
+            data, headers = await self._prepare_request_async(envelopes, data)
+            proxy = self.options.proxies.get(
+                urlparse(self.options.endpoint).scheme
+            )
+            async with self._semaphore:
+                async with client.post(
+                    self.options.endpoint,
+                    data=data,
+                    headers=headers,
+                    proxy=proxy,
+                ) as response:
+                    status_code = response.status
+                    headers = response.headers
+                    try:
+                        text = await response.text()
+                    except Exception as ex:
+                        logger.warning(
+                            "Error while reading response body %s.", ex
+                        )
+        except asyncio.TimeoutError:
+            logger.warning(
+                "Request time out. Ingestion may be backed up. Retrying."
+            )
+            return ExportResult.FAILED_RETRYABLE
+        except Exception as ex:
+            logger.warning(
+                "Retrying due to transient client side error %s.", ex
+            )
+            # client side error (retryable)
+            return ExportResult.FAILED_RETRYABLE
+
+        if envelopes is None and status_code == 206:
+            envelopes = self._decode_envelopes(data)
+        result, resend_envelopes = self._handle_response(
+            envelopes, status_code, text, headers
+        )
+        if resend_envelopes:
+            await self._run_blocking(self._store_envelopes, resend_envelopes)
+        return result
+
+
+class AsyncAzureMonitorSpanExporter(
+    AsyncBaseExporter, AzureMonitorSpanExporter
+):
+    """Azure Monitor span exporter for asyncio applications.
+
+    `export_async` sends the spans from the running event loop, `export`
+    keeps working synchronously.
+
+    Args:
+        options: :doc:`export.options` to allow configuration for the exporter
+    """
+
+    async def export_async(
+        self, spans: typing.Sequence[Span]
+    ) -> SpanExportResult:
+        envelopes = self._process_envelopes(self._convert_spans(spans))
+        try:
+            result = await self._send_batch_async(envelopes)
+            return get_trace_export_result(result)
+        except Exception:
+            logger.exception("Exception occurred while exporting the data.")
+            return get_trace_export_result(ExportResult.FAILED_NOT_RETRYABLE)
+
+
+class AsyncAzureMonitorMetricsExporter(
+    AsyncBaseExporter, AzureMonitorMetricsExporter
+):
+    """Azure Monitor metrics exporter for asyncio applications.
+
+    `export_async` sends the metrics from the running event loop, `export`
+    keeps working synchronously.
+
+    Args:
+        options: :doc:`export.options` to allow configuration for the exporter
+    """
+
+    async def export_async(
+        self, metric_records: typing.Sequence[MetricRecord]
+    ) -> MetricsExportResult:
+        envelopes = self._process_envelopes(
+            self._metrics_to_envelopes(metric_records)
+        )
+        try:
+            result = await self._send_batch_async(envelopes)
+            return get_metrics_export_result(result)
+        except Exception:
+            logger.exception("Exception occurred while exporting the data.")
+            return get_metrics_export_result(ExportResult.FAILED_NOT_RETRYABLE)
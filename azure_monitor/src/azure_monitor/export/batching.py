@@ -0,0 +1,54 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+import logging
+import typing
+
+from azure_monitor.protocol import serialize
+
+logger = logging.getLogger(__name__)
+
+
+def split_envelopes(
+    envelopes: typing.Sequence[typing.Any],
+    max_bytes: int,
+    max_items: int,
+    encode: typing.Callable[[typing.Any], bytes] = serialize,
+) -> typing.List[typing.Tuple[typing.List[typing.Any], bytes]]:
+    """Splits envelopes into chunks that fit into a single request.
+
+    Every envelope is serialized once, the request body of each chunk is
+    assembled from the serialized envelopes so it can be posted as is.
+    An envelope larger than ``max_bytes`` is sent alone in its own chunk.
+
+    Args:
+        envelopes: The serializable envelopes to split.
+        max_bytes: Maximum size in bytes of a chunk's request body.
+        max_items: Maximum number of envelopes in a chunk.
+        encode: Function serializing one envelope to JSON bytes.
+
+    Returns a list of (envelopes, request body) pairs.
+    """
+    chunks = []
+    chunk = []
+    encoded = []
+    size = 2  # enclosing brackets
+    for envelope in envelopes:
+        item = encode(envelope)
+        if chunk and (
+            len(chunk) >= max_items or size + 1 + len(item) > max_bytes
+        ):
+            chunks.append((chunk, b"[" + b",".join(encoded) + b"]"))
+            chunk = []
+            encoded = []
+            size = 2
+        if len(item) + 2 > max_bytes:
+            logger.warning(
+                "Envelope of %d bytes exceeds the maximum request size.",
+                len(item),
+            )
+        size += len(item) + (1 if chunk else 0)
+        chunk.append(envelope)
+        encoded.append(item)
+    if chunk:
+        chunks.append((chunk, b"[" + b",".join(encoded) + b"]"))
+    return chunks
@@ -0,0 +1,131 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+import logging
+import threading
+import time
+import typing
+from enum import Enum
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitState(Enum):
+    """State of a :class:`CircuitBreaker`."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Stops sending requests to an endpoint that keeps failing.
+
+    The circuit opens after ``failure_threshold`` consecutive failures and
+    rejects every request for ``recovery_timeout`` seconds. It then lets a
+    single probe request through: a success closes the circuit, a failure
+    opens it again.
+
+    Args:
+        failure_threshold: Consecutive failures opening the circuit, 0 never
+        opens it.
+        recovery_timeout: Seconds the circuit stays open before a probe.
+        clock: Returns the current time in seconds.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        recovery_timeout: float = 30.0,
+        clock: typing.Callable[[], float] = time.time,
+    ) -> None:
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._clock = clock
+        self._state = CircuitState.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._rejected = 0
+        self._transitions = {state: 0 for state in CircuitState}
+        self._last_transition = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> CircuitState:
+        with self._lock:
+            self._check_recovery()
+            return self._state
+
+    def allow_request(self) -> bool:
+        """Returns True if a request may be sent now.
+
+        Callers given True must report the outcome with `record_success` or
+        `record_failure`.
+        """
+        with self._lock:
+            self._check_recovery()
+            if self._state == CircuitState.CLOSED:
+                return True
+            if self._state == CircuitState.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            self._rejected += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._probing = False
+            if self._state != CircuitState.CLOSED:
+                self._transition(CircuitState.CLOSED)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self._state == CircuitState.HALF_OPEN or (
+                self._state == CircuitState.CLOSED
+                and self.failure_threshold
+                and self._failures >= self.failure_threshold
+            ):
+                self._opened_at = self._clock()
+                self._transition(CircuitState.OPEN)
+
+    def stats(self) -> typing.Dict[str, typing.Any]:
+        """Returns the state of the circuit and counters of its activity.
+
+        ``transitions`` counts how many times the circuit entered each state.
+        """
+        with self._lock:
+            self._check_recovery()
+            return {
+                "state": self._state.value,
+                "consecutive_failures": self._failures,
+                "rejected_requests": self._rejected,
+                "transitions": {
+                    state.value: count
+                    for state, count in self._transitions.items()
+                },
+                "last_transition": self._last_transition,
+            }
+
+    def _check_recovery(self) -> None:
+        if (
+            self._state == CircuitState.OPEN
+            and self._clock() - self._opened_at >= self.recovery_timeout
+        ):
+            self._transition(CircuitState.HALF_OPEN)
+
+    def _transition(self, state: CircuitState) -> None:
+        if state == CircuitState.OPEN:
+            logger.warning(
+                "Ingestion failed %d times in a row, suspending requests "
+                "for %s seconds.",
+                self._failures,
+                self.recovery_timeout,
+            )
+        else:
+            logger.info("Ingestion circuit is now %s.", state.value)
+        self._state = state
+        self._transitions[state] += 1
+        self._last_transition = self._clock()
@@ -1,8 +1,7 @@
 # Copyright (c) Microsoft Corporation. All rights reserved.
 # Licensed under the MIT License.
-import json
 import logging
-from typing import Sequence
+from typing import Callable, List, Optional, Sequence
 from urllib.parse import urlparse
 
 from opentelemetry.sdk.metrics import (
@@ -18,7 +17,6 @@ from opentelemetry.sdk.metrics.export import (
     MetricsExporter,
     MetricsExportResult,
 )
-from opentelemetry.sdk.util import ns_to_iso_str
 from opentelemetry.util import time_ns
 
 from azure_monitor import protocol, utils
@@ -38,28 +36,44 @@ class AzureMonitorMetricsExporter(BaseExporter, MetricsExporter):
         options: :doc:`export.options` to allow configuration for the exporter
     """
 
+    def __init__(self, **options):
+        super().__init__(**options)
+        self._standard_metrics_source = None
+
+    def set_standard_metrics_source(
+        self, source: Optional[Callable[[], List[protocol.MetricData]]]
+    ) -> None:
+        """Sets the source of pre-aggregated metrics sent with every export,
+        like the ``collect_standard_metrics`` method of an
+        `AzureMetricsSpanProcessor`. None removes it."""
+        self._standard_metrics_source = source
+
     def export(
         self, metric_records: Sequence[MetricRecord]
     ) -> MetricsExportResult:
-        envelopes = list(map(self._metric_to_envelope, metric_records))
-        envelopes = list(
-            map(
-                lambda x: x.to_dict(),
-                self._apply_telemetry_processors(envelopes),
-            )
+        envelopes = self._process_envelopes(
+            self._metrics_to_envelopes(metric_records)
         )
         try:
-            result = self._transmit(envelopes)
-            if result == ExportResult.FAILED_RETRYABLE:
-                self.storage.put(envelopes, result)
-            if result == ExportResult.SUCCESS:
-                # Try to send any cached events
-                self._transmit_from_storage()
+            result = self._send(envelopes)
             return get_metrics_export_result(result)
         except Exception:  # pylint: disable=broad-except
             logger.exception("Exception occurred while exporting the data.")
             return get_metrics_export_result(ExportResult.FAILED_NOT_RETRYABLE)
 
+    def _metrics_to_envelopes(
+        self, metric_records: Sequence[MetricRecord]
+    ) -> List[protocol.Envelope]:
+        """Converts the records and the pre-aggregated metrics."""
+        envelopes = list(map(self._metric_to_envelope, metric_records))
+        source = self._standard_metrics_source
+        if source is not None:
+            try:
+                envelopes.extend(map(self._metric_data_to_envelope, source()))
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Exception while collecting metrics.")
+        return envelopes
+
     def _metric_to_envelope(
         self, metric_record: MetricRecord
     ) -> protocol.Envelope:
@@ -68,8 +82,10 @@ class AzureMonitorMetricsExporter(BaseExporter, MetricsExporter):
             return None
         envelope = protocol.Envelope(
             ikey=self.options.instrumentation_key,
-            tags=dict(utils.azure_monitor_context),
-            time=ns_to_iso_str(metric_record.aggregator.last_update_timestamp),
+            tags=utils.envelope_tags(),
+            time=utils.ns_to_iso_str(
+                metric_record.aggregator.last_update_timestamp
+            ),
         )
         envelope.name = "Microsoft.ApplicationInsights.Metric"
         value = 0
@@ -99,3 +115,15 @@ class AzureMonitorMetricsExporter(BaseExporter, MetricsExporter):
         data = protocol.MetricData(metrics=[data_point], properties=properties)
         envelope.data = protocol.Data(base_data=data, base_type="MetricData")
         return envelope
+
+    def _metric_data_to_envelope(
+        self, data: protocol.MetricData
+    ) -> protocol.Envelope:
+        envelope = protocol.Envelope(
+            ikey=self.options.instrumentation_key,
+            tags=utils.envelope_tags(),
+            time=utils.ns_to_iso_str(time_ns()),
+        )
+        envelope.name = "Microsoft.ApplicationInsights.Metric"
+        envelope.data = protocol.Data(base_data=data, base_type="MetricData")
+        return envelope
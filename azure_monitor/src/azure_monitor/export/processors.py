@@ -0,0 +1,95 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+import logging
+import threading
+import time
+import typing
+
+from azure_monitor.protocol import Envelope
+
+logger = logging.getLogger(__name__)
+
+
+class TelemetryProcessor:
+    """A telemetry processor and the counters of its activity.
+
+    An envelope processor is called with every envelope and drops it by
+    returning False. A batch processor is called with the list of envelopes
+    and returns the envelopes to keep, None keeps them all. A processor
+    raising an exception keeps the envelopes it was given.
+
+    Args:
+        function: The processor.
+        batch: True if the processor takes a list of envelopes.
+    """
+
+    __slots__ = (
+        "function",
+        "batch",
+        "calls",
+        "dropped",
+        "errors",
+        "seconds",
+        "_lock",
+    )
+
+    def __init__(
+        self, function: typing.Callable[..., typing.Any], batch: bool = False
+    ) -> None:
+        self.function = function
+        self.batch = batch
+        self.calls = 0
+        self.dropped = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def name(self) -> str:
+        return getattr(self.function, "__qualname__", repr(self.function))
+
+    def process(
+        self, envelopes: typing.List[Envelope]
+    ) -> typing.List[Envelope]:
+        """Returns the envelopes kept by the processor."""
+        count = len(envelopes)
+        errors = 0
+        start = time.perf_counter()
+        if self.batch:
+            try:
+                result = self.function(envelopes)
+                if result is not None:
+                    envelopes = list(result)
+            except Exception as ex:  # pylint: disable=broad-except
+                errors = 1
+                logger.warning("Telemetry processor failed with: %s.", ex)
+        else:
+            function = self.function
+            accepted = []
+            for envelope in envelopes:
+                try:
+                    if function(envelope) is False:
+                        continue
+                except Exception as ex:  # pylint: disable=broad-except
+                    errors += 1
+                    logger.warning("Telemetry processor failed with: %s.", ex)
+                accepted.append(envelope)
+            envelopes = accepted
+        seconds = time.perf_counter() - start
+        with self._lock:
+            self.calls += 1 if self.batch else count
+            self.dropped += max(count - len(envelopes), 0)
+            self.errors += errors
+            self.seconds += seconds
+        return envelopes
+
+    def stats(self) -> typing.Dict[str, typing.Any]:
+        with self._lock:
+            return {
+                "name": self.name,
+                "batch": self.batch,
+                "calls": self.calls,
+                "dropped": self.dropped,
+                "errors": self.errors,
+                "seconds": self.seconds,
+            }
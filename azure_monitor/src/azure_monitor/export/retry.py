@@ -0,0 +1,137 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+import datetime
+import email.utils
+import logging
+import random
+import threading
+import time
+import typing
+
+logger = logging.getLogger(__name__)
+
+
+def parse_retry_after(value: typing.Any, now: float = None) -> float:
+    """Parses a Retry-After header value into a number of seconds.
+
+    Both forms allowed by RFC 7231 are accepted, a number of seconds or an
+    HTTP date. Returns None when the value is missing or cannot be parsed.
+    """
+    if not isinstance(value, str):
+        return None
+    value = value.strip()
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+    if date is None:
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=datetime.timezone.utc)
+    if now is None:
+        now = time.time()
+    return max(date.timestamp() - now, 0.0)
+
+
+class RetryScheduler:
+    """Decides when batches that failed with a retryable error are sent again.
+
+    Every failure of a batch doubles its backoff, starting from
+    ``initial_backoff`` and capped at ``max_backoff``. Half of each delay is
+    randomized so that exporters recovering together do not retry in lock
+    step. A Retry-After received from ingestion pauses all retries.
+
+    Attempts are counted per stored batch in memory, they restart from one
+    when the process restarts.
+
+    Args:
+        initial_backoff: Seconds before the first retry of a batch.
+        max_backoff: Maximum number of seconds between two retries.
+        max_age: Seconds after which a stored batch is dropped instead of
+        retried, None keeps retrying.
+        clock: Returns the current time in seconds.
+    """
+
+    def __init__(
+        self,
+        initial_backoff: float = 1.0,
+        max_backoff: float = 600.0,
+        max_age: float = None,
+        clock: typing.Callable[[], float] = time.time,
+    ) -> None:
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.max_age = max_age
+        self._clock = clock
+        self._attempts = {}
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def pause_remaining(self) -> float:
+        """Seconds left before ingestion accepts retries again."""
+        return max(self._paused_until - self._clock(), 0.0)
+
+    @property
+    def paused(self) -> bool:
+        return self.pause_remaining > 0
+
+    def attempts(self, key: str) -> int:
+        """Returns the number of failed attempts recorded for a batch."""
+        return self._attempts.get(key, 0)
+
+    def backoff(self, attempt: int) -> float:
+        """Returns the jittered delay before retrying after ``attempt``
+        failures."""
+        delay = min(
+            self.initial_backoff * 2 ** (max(attempt, 1) - 1), self.max_backoff
+        )
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def record_failure(self, key: str = None) -> float:
+        """Records a failed attempt and returns the seconds to wait before
+        the next one.
+
+        A batch without a key is counted as failing for the first time.
+        """
+        attempt = 1
+        if key is not None:
+            with self._lock:
+                attempt = self._attempts.get(key, 1) + 1
+                self._attempts[key] = attempt
+        return max(self.backoff(attempt), self.pause_remaining)
+
+    def record_success(self, key: str) -> None:
+        """Forgets the attempts of a batch that left the storage."""
+        with self._lock:
+            self._attempts.pop(key, None)
+
+    def prune(self, is_stored: typing.Callable[[str], bool]) -> None:
+        """Forgets the attempts of the batches no longer stored, like the
+        ones removed by the storage retention."""
+        with self._lock:
+            for key in [key for key in self._attempts if not is_stored(key)]:
+                del self._attempts[key]
+
+    def throttle(self, seconds: float) -> None:
+        """Pauses all retries for the given number of seconds."""
+        seconds = min(seconds, self.max_backoff)
+        with self._lock:
+            self._paused_until = max(
+                self._paused_until, self._clock() + seconds
+            )
+        logger.warning(
+            "Ingestion is throttled, retrying in %.1f seconds.", seconds
+        )
+
+    def is_expired(self, created: datetime.datetime) -> bool:
+        """Returns True if a batch stored at ``created`` (UTC) is too old to
+        be retried."""
+        if self.max_age is None or created is None:
+            return False
+        age = datetime.datetime.utcnow() - created
+        return age.total_seconds() > self.max_age
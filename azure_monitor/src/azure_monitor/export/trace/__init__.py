@@ -1,21 +1,20 @@
 # Copyright (c) Microsoft Corporation. All rights reserved.
 # Licensed under the MIT License.
-import json
 import logging
-from typing import Sequence
-from urllib.parse import urlparse
+from typing import Any, Callable, Dict, List, Optional, Sequence
 
 from opentelemetry.sdk.trace.export import SpanExporter, SpanExportResult
-from opentelemetry.sdk.util import ns_to_iso_str
-from opentelemetry.trace import Span, SpanKind
+from opentelemetry.trace import Span
 from opentelemetry.trace.status import StatusCanonicalCode
 
-from azure_monitor import protocol, utils
+from azure_monitor import json_backend, protocol, utils
 from azure_monitor.export import (
     BaseExporter,
     ExportResult,
     get_trace_export_result,
 )
+from azure_monitor.export.trace.filters import SpanSampler, apply_filter
+from azure_monitor.export.trace.sampling import SAMPLE_RATE_ATTRIBUTE
 
 logger = logging.getLogger(__name__)
 
@@ -27,28 +26,75 @@ class AzureMonitorSpanExporter(BaseExporter, SpanExporter):
         options: :doc:`export.options` to allow configuration for the exporter
     """
 
+    def __init__(self, **options):
+        super().__init__(**options)
+        self._span_filters = ()
+        self._span_sampler = None
+        self._filtered_spans = 0
+        self._sampled_out_spans = 0
+
     def export(self, spans: Sequence[Span]) -> SpanExportResult:
-        envelopes = list(map(self._span_to_envelope, spans))
-        envelopes = list(
-            map(
-                lambda x: x.to_dict(),
-                self._apply_telemetry_processors(envelopes),
-            )
-        )
+        envelopes = self._process_envelopes(self._convert_spans(spans))
         try:
-            result = self._transmit(envelopes)
-            if result == ExportResult.FAILED_RETRYABLE:
-                self.storage.put(envelopes, result)
-            if result == ExportResult.SUCCESS:
-                # Try to send any cached events
-                self._transmit_from_storage()
+            result = self._send(envelopes)
             return get_trace_export_result(result)
         except Exception:  # pylint: disable=broad-except
             logger.exception("Exception occurred while exporting the data.")
             return get_trace_export_result(ExportResult.FAILED_NOT_RETRYABLE)
 
-    # pylint: disable=too-many-statements
-    # pylint: disable=too-many-branches
+    def add_span_filter(self, span_filter: Callable[[Span], bool]) -> None:
+        """Adds a filter called with every exported span before it is
+        converted to an envelope.
+
+        Args:
+            span_filter: Returns False if the span must be dropped, like a
+            `filters.SpanFilter`.
+        """
+        with self._processors_lock:
+            self._span_filters = self._span_filters + (span_filter,)
+
+    def clear_span_filters(self) -> None:
+        """Removes all span filters"""
+        with self._processors_lock:
+            self._span_filters = ()
+
+    def set_span_sampler(self, sampler: Optional[SpanSampler]) -> None:
+        """Sets the sampler of the spans kept by the span filters, None
+        exports all of them."""
+        self._span_sampler = sampler
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = super().get_stats()
+        stats["spans"] = {
+            "filtered": self._filtered_spans,
+            "sampled_out": self._sampled_out_spans,
+        }
+        return stats
+
+    def _convert_spans(self, spans: Sequence[Span]) -> List[protocol.Envelope]:
+        span_filters = self._span_filters
+        sampler = self._span_sampler
+        if span_filters or sampler is not None:
+            spans = [span for span in spans if span]
+            count = len(spans)
+            for span_filter in span_filters:
+                spans = apply_filter(span_filter, spans)
+            filtered = count - len(spans)
+            if sampler is not None:
+                spans = sampler.sample(spans)
+            with self._processors_lock:
+                self._filtered_spans += filtered
+                self._sampled_out_spans += count - filtered - len(spans)
+        envelopes = convert_spans_to_envelopes(
+            spans, self.options.instrumentation_key
+        )
+        if sampler is not None:
+            for span, envelope in zip(spans, envelopes):
+                rate = sampler.rate_of(span)
+                if rate < 100:
+                    envelope.sample_rate = rate
+        return envelopes
+
     def _span_to_envelope(self, span: Span) -> protocol.Envelope:
         if not span:
             return None
@@ -57,103 +103,149 @@ class AzureMonitorSpanExporter(BaseExporter, SpanExporter):
         return envelope
 
 
-# pylint: disable=too-many-statements
-# pylint: disable=too-many-branches
+# index of the attributes read by _convert_span in its list of values,
+# these attributes are not sent as properties
+_ATTRIBUTES = {
+    "http.method": 0,
+    "http.route": 1,
+    "http.path": 2,
+    "http.url": 3,
+    "http.status_code": 4,
+    SAMPLE_RATE_ATTRIBUTE: 5,
+}
+
+
 def convert_span_to_envelope(span: Span) -> protocol.Envelope:
     if not span:
         return None
-    envelope = protocol.Envelope(
-        ikey="",
-        tags=dict(utils.azure_monitor_context),
-        time=ns_to_iso_str(span.start_time),
+    return _convert_span(
+        span, "", utils.context_tags(), json_backend.get_backend().dumps
     )
-    envelope.tags["ai.operation.id"] = "{:032x}".format(span.context.trace_id)
+
+
+def convert_spans_to_envelopes(
+    spans: Sequence[Span], ikey: str = ""
+) -> List[protocol.Envelope]:
+    """Converts a batch of spans to envelopes.
+
+    Gives the same envelopes as `convert_span_to_envelope`, the shared
+    context tags and the JSON encoder of the links being looked up once for
+    the whole batch. None spans are skipped.
+
+    Args:
+        spans: The spans to convert.
+        ikey: The instrumentation key of the envelopes.
+    """
+    context = utils.context_tags()
+    dumps = json_backend.get_backend().dumps
+    return [
+        _convert_span(span, ikey, context, dumps) for span in spans if span
+    ]
+
+
+# pylint: disable=too-many-locals
+# pylint: disable=too-many-statements
+# pylint: disable=too-many-branches
+def _convert_span(
+    span: Span,
+    ikey: str,
+    context: protocol.ContextTags,
+    dumps: Callable[[Any], bytes],
+) -> protocol.Envelope:
+    start_time = span.start_time
+    tags = {"ai.operation.id": utils.format_trace_id(span.context.trace_id)}
     parent = span.parent
     if isinstance(parent, Span):
         parent = parent.context
     if parent:
-        envelope.tags["ai.operation.parentId"] = "{:016x}".format(
-            parent.span_id
-        )
-    if span.kind in (SpanKind.CONSUMER, SpanKind.SERVER):
+        tags["ai.operation.parentId"] = format(parent.span_id, "016x")
+    envelope = protocol.Envelope(
+        ikey=ikey,
+        tags=protocol.EnvelopeTags(context, tags),
+        time=utils.ns_to_iso_str(start_time),
+    )
+    # a single pass over the attributes, http ones are not sent as
+    # properties to avoid redundant data in Application Insights
+    values = [None] * len(_ATTRIBUTES)
+    properties = {}
+    attributes = span.attributes
+    for key in attributes:
+        index = _ATTRIBUTES.get(key)
+        if index is not None:
+            values[index] = attributes[key]
+        elif not key.startswith("http."):
+            properties[key] = attributes[key]
+    method, route, path, url, status_code, sample_rate = values
+    if sample_rate is not None:
+        # sampled by an upstream sampler
+        envelope.sample_rate = sample_rate
+    span_id = format(span.context.span_id, "016x")
+    duration = utils.ns_to_duration(span.end_time - start_time)
+    canonical_code = span.status.canonical_code
+    if span.kind in utils.REQUEST_KINDS:
         envelope.name = "Microsoft.ApplicationInsights.Request"
         data = protocol.Request(
-            id="{:016x}".format(span.context.span_id),
-            duration=utils.ns_to_duration(span.end_time - span.start_time),
-            response_code=str(span.status.canonical_code.value),
-            success=span.status.canonical_code
-            == StatusCanonicalCode.OK,  # Modify based off attributes or Status
+            id=span_id,
+            duration=duration,
+            response_code=str(canonical_code.value),
+            # Modify based off attributes or Status
+            success=canonical_code == StatusCanonicalCode.OK,
             properties={},
         )
         envelope.data = protocol.Data(base_data=data, base_type="RequestData")
-        if "http.method" in span.attributes:
-            data.name = span.attributes["http.method"]
-            if "http.route" in span.attributes:
-                data.name = data.name + " " + span.attributes["http.route"]
-                envelope.tags["ai.operation.name"] = data.name
+        if method is not None:
+            data.name = method
+            if route is not None:
+                data.name = method + " " + route
+                tags["ai.operation.name"] = data.name
                 data.properties["request.name"] = data.name
-            elif "http.path" in span.attributes:
-                data.properties["request.name"] = (
-                    data.name + " " + span.attributes["http.path"]
-                )
-        if "http.url" in span.attributes:
-            data.url = span.attributes["http.url"]
-            data.properties["request.url"] = span.attributes["http.url"]
-        if "http.status_code" in span.attributes:
-            status_code = span.attributes["http.status_code"]
+            elif path is not None:
+                data.properties["request.name"] = method + " " + path
+        if url is not None:
+            data.url = url
+            data.properties["request.url"] = url
+        if status_code is not None:
             data.response_code = str(status_code)
             data.success = 200 <= status_code < 400
     else:
         envelope.name = "Microsoft.ApplicationInsights.RemoteDependency"
         data = protocol.RemoteDependency(
             name=span.name,
-            id="{:016x}".format(span.context.span_id),
-            result_code=str(span.status.canonical_code.value),
-            duration=utils.ns_to_duration(span.end_time - span.start_time),
-            success=span.status.canonical_code
-            == StatusCanonicalCode.OK,  # Modify based off attributes or Status
+            id=span_id,
+            result_code=str(canonical_code.value),
+            duration=duration,
+            # Modify based off attributes or Status
+            success=canonical_code == StatusCanonicalCode.OK,
             properties={},
         )
         envelope.data = protocol.Data(
             base_data=data, base_type="RemoteDependencyData"
         )
-        if span.kind in (SpanKind.CLIENT, SpanKind.PRODUCER):
-            if (
-                "component" in span.attributes
-                and span.attributes["component"] == "http"
-            ):
+        if span.kind in utils.OUTGOING_KINDS:
+            if properties.get("component") == "http":
                 data.type = "HTTP"
-            if "http.url" in span.attributes:
-                url = span.attributes["http.url"]
+            if url is not None:
                 # data is the url
                 data.data = url
-                parse_url = urlparse(url)
                 # TODO: error handling, probably put scheme as well
                 # target matches authority (host:port)
-                data.target = parse_url.netloc
-                if "http.method" in span.attributes:
+                data.target, url_path = utils.parse_url(url)
+                if method is not None:
                     # name is METHOD/path
-                    data.name = (
-                        span.attributes["http.method"] + "/" + parse_url.path
-                    )
-            if "http.status_code" in span.attributes:
-                status_code = span.attributes["http.status_code"]
+                    data.name = method + "/" + url_path
+            if status_code is not None:
                 data.result_code = str(status_code)
                 data.success = 200 <= status_code < 400
         else:  # SpanKind.INTERNAL
             data.type = "InProc"
             data.success = True
-    for key in span.attributes:
-        # This removes redundant data from ApplicationInsights
-        if key.startswith("http."):
-            continue
-        data.properties[key] = span.attributes[key]
+    data.properties.update(properties)
     if span.links:
         links = []
         for link in span.links:
-            operation_id = "{:032x}".format(link.context.trace_id)
-            span_id = "{:016x}".format(link.context.span_id)
+            operation_id = utils.format_trace_id(link.context.trace_id)
+            span_id = format(link.context.span_id, "016x")
             links.append({"operation_Id": operation_id, "id": span_id})
-        data.properties["_MS.links"] = json.dumps(links)
+        data.properties["_MS.links"] = dumps(links).decode("utf-8")
     # TODO: tracestate, tags
     return envelope
@@ -0,0 +1,124 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Filters and samplers deciding which spans are exported.
+
+They run on the spans given to `AzureMonitorSpanExporter.export`, before
+the spans are converted to envelopes, so a dropped span costs a single
+call instead of a conversion.
+"""
+import logging
+import typing
+
+from opentelemetry.trace import Span, SpanKind
+from opentelemetry.trace.status import StatusCanonicalCode
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+def _as_tuple(value: typing.Any) -> typing.Optional[tuple]:
+    if value is None:
+        return None
+    if isinstance(value, (str, SpanKind, StatusCanonicalCode)):
+        return (value,)
+    return tuple(value)
+
+
+class SpanFilter:
+    """Drops the spans matching all the given criteria.
+
+    A filter is called with a span and returns False if the span must be
+    dropped, like telemetry processors do with envelopes.
+
+    Args:
+        name: Span name, list of span names or compiled regular expression
+        that must match the whole name.
+        kind: `SpanKind` or list of kinds.
+        attributes: Attribute values the span must have.
+        status: `StatusCanonicalCode` or list of codes.
+    """
+
+    __slots__ = ("_names", "_pattern", "_kinds", "_attributes", "_codes")
+
+    def __init__(
+        self,
+        name: typing.Any = None,
+        kind: typing.Any = None,
+        attributes: typing.Mapping[str, typing.Any] = None,
+        status: typing.Any = None,
+    ) -> None:
+        self._pattern = None
+        self._names = None
+        if hasattr(name, "fullmatch"):
+            self._pattern = name
+        elif name is not None:
+            self._names = frozenset(_as_tuple(name))
+        self._kinds = _as_tuple(kind)
+        self._attributes = tuple(attributes.items()) if attributes else ()
+        self._codes = _as_tuple(status)
+
+    def __call__(self, span: Span) -> bool:
+        name = span.name
+        status = span.status
+        attributes = span.attributes
+        matches = (
+            (self._names is None or name in self._names)
+            and (self._pattern is None or self._pattern.fullmatch(name))
+            and (self._kinds is None or span.kind in self._kinds)
+            and (
+                self._codes is None
+                or (
+                    status is not None and status.canonical_code in self._codes
+                )
+            )
+            and all(
+                attributes.get(key, _MISSING) == value
+                for key, value in self._attributes
+            )
+        )
+        return not matches
+
+
+class SpanSampler:
+    """Base class of the samplers of exported spans.
+
+    ``sample_rate`` is the percentage of spans currently kept, set on the
+    envelopes of the kept spans.
+    """
+
+    sample_rate = 100.0
+
+    # hooks overridden by the samplers deciding by span
+    # pylint: disable=unused-argument
+    def rate_of(self, span: Span) -> float:
+        """Returns the sample rate set on the envelope of a kept span."""
+        return self.sample_rate
+
+    # pylint: disable=no-self-use
+    def should_sample(self, span: Span) -> bool:
+        """Returns True if the span is exported, every span by default."""
+        return True
+
+    def sample(self, spans: typing.Sequence[Span]) -> typing.List[Span]:
+        """Returns the spans of a batch that are exported."""
+        should_sample = self.should_sample
+        return [span for span in spans if should_sample(span)]
+
+
+def apply_filter(
+    span_filter: typing.Callable[[Span], bool], spans: typing.Sequence[Span]
+) -> typing.List[Span]:
+    """Returns the spans not dropped by a filter.
+
+    A span is kept when the filter raises an exception for it.
+    """
+    kept = []
+    for span in spans:
+        try:
+            if span_filter(span) is False:
+                continue
+        except Exception as ex:  # pylint: disable=broad-except
+            logger.warning("Span filter failed with: %s.", ex)
+        kept.append(span)
+    return kept
@@ -0,0 +1,181 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Samplers of the spans exported to Application Insights.
+
+The decision for a span is made from a score computed on its trace id with
+the algorithm of the Application Insights SDKs, so all the spans of a
+trace are kept or dropped together, across services and when the sample
+rate changes. The percentage of kept spans is set as ``sample_rate`` of
+their envelopes for the portal to extrapolate the counts.
+"""
+import functools
+import math
+import threading
+import time
+import typing
+
+from opentelemetry.trace import Span
+
+from azure_monitor.export.trace.filters import SpanSampler
+from azure_monitor.utils import format_trace_id
+
+# span attribute holding the sample rate applied by an upstream sampler
+SAMPLE_RATE_ATTRIBUTE = "_MS.sampleRate"
+
+_INT32_MAX = 2 ** 31 - 1
+
+
+@functools.lru_cache(maxsize=1024)
+def sampling_score(trace_id: int) -> float:
+    """Returns the sampling score of a trace, between 0 and 1.
+
+    The score is the 32 bits DJB2 hash of the hex trace id divided by the
+    maximum 32 bits integer, like the Application Insights SDKs compute it.
+    """
+    value = 5381
+    for char in format_trace_id(trace_id):
+        value = (value * 33 + ord(char)) & 0xFFFFFFFF
+    if value > _INT32_MAX:
+        # absolute value of the signed integer
+        value = min(2 ** 32 - value, _INT32_MAX)
+    return value / _INT32_MAX
+
+
+def upstream_sample_rate(span: Span) -> float:
+    """Returns the sample rate an upstream sampler recorded on a span, 100
+    if there is none."""
+    try:
+        return float(span.attributes[SAMPLE_RATE_ATTRIBUTE])
+    except (KeyError, TypeError, ValueError):
+        return 100.0
+
+
+class FixedRateSampler(SpanSampler):
+    """Exports a fixed percentage of the traces.
+
+    Spans sampled upstream at a lower rate keep that rate, the same score
+    being used they are already consistent with this sampler.
+
+    Args:
+        sample_rate: Percentage of the traces exported, between 0 and 100.
+        respect_sampled_flag: Drops the spans whose context is not flagged
+        as sampled.
+    """
+
+    def __init__(
+        self, sample_rate: float = 100.0, respect_sampled_flag: bool = True
+    ) -> None:
+        if not 0 <= sample_rate <= 100:
+            raise ValueError("Sample rate must be between 0 and 100.")
+        self.sample_rate = float(sample_rate)
+        self.respect_sampled_flag = respect_sampled_flag
+
+    def rate_of(self, span: Span) -> float:
+        return min(self.sample_rate, upstream_sample_rate(span))
+
+    def should_sample(self, span: Span) -> bool:
+        context = span.context
+        if self.respect_sampled_flag and not context.trace_flags.sampled:
+            return False
+        rate = self.rate_of(span)
+        if rate >= 100:
+            return True
+        return sampling_score(context.trace_id) * 100 < rate
+
+    def sample(self, spans: typing.Sequence[Span]) -> typing.List[Span]:
+        if self.sample_rate >= 100 and not self.respect_sampled_flag:
+            return list(spans)
+        return super().sample(spans)
+
+
+class AdaptiveSampler(FixedRateSampler):
+    """Adjusts the sample rate to export a target number of spans per
+    second.
+
+    The rate of incoming spans is estimated every ``evaluation_interval``
+    seconds with an exponential moving average. The sample rate is then
+    lowered right away when the traffic grows, and raised no more than once
+    per ``increase_timeout`` seconds when it drops, to avoid oscillations.
+    Like in the Application Insights SDKs the rate is rounded to 100 / N
+    so that every kept span stands for a whole number of spans.
+
+    Args:
+        target_items_per_second: Spans exported per second by the process.
+        initial_sample_rate: Sample rate until the first evaluation.
+        min_sample_rate: Lowest sample rate.
+        evaluation_interval: Seconds between two adjustments.
+        moving_average_ratio: Weight of the last interval in the average.
+        increase_timeout: Minimum seconds between a change of the rate and
+        an increase.
+        respect_sampled_flag: Drops the spans whose context is not flagged
+        as sampled.
+        clock: Returns the current time in seconds.
+    """
+
+    def __init__(
+        self,
+        target_items_per_second: float = 5.0,
+        initial_sample_rate: float = 100.0,
+        min_sample_rate: float = 0.1,
+        evaluation_interval: float = 15.0,
+        moving_average_ratio: float = 0.25,
+        increase_timeout: float = 60.0,
+        respect_sampled_flag: bool = True,
+        clock: typing.Callable[[], float] = time.monotonic,
+    ) -> None:
+        super().__init__(initial_sample_rate, respect_sampled_flag)
+        if not 0 < min_sample_rate <= 100:
+            raise ValueError("Minimum sample rate must be between 0 and 100.")
+        self.target_items_per_second = target_items_per_second
+        self.min_sample_rate = min_sample_rate
+        self.evaluation_interval = evaluation_interval
+        self.moving_average_ratio = moving_average_ratio
+        self.increase_timeout = increase_timeout
+        self._clock = clock
+        self._items = 0
+        self._average = None
+        self._evaluated_at = clock()
+        self._changed_at = self._evaluated_at
+        self._lock = threading.Lock()
+
+    @property
+    def items_per_second(self) -> typing.Optional[float]:
+        """Moving average of the incoming spans per second, None before the
+        first evaluation."""
+        return self._average
+
+    def sample(self, spans: typing.Sequence[Span]) -> typing.List[Span]:
+        with self._lock:
+            self._items += len(spans)
+            self._evaluate()
+        return super().sample(spans)
+
+    def _evaluate(self) -> None:
+        now = self._clock()
+        elapsed = now - self._evaluated_at
+        if elapsed < self.evaluation_interval:
+            return
+        items_per_second = self._items / elapsed
+        if self._average is None:
+            self._average = items_per_second
+        else:
+            self._average += self.moving_average_ratio * (
+                items_per_second - self._average
+            )
+        self._items = 0
+        self._evaluated_at = now
+        if self._average <= self.target_items_per_second:
+            suggested = 100.0
+        else:
+            suggested = max(
+                100.0 * self.target_items_per_second / self._average,
+                self.min_sample_rate,
+            )
+            # every kept span stands for a whole number of spans
+            suggested = 100.0 / math.ceil(100.0 / suggested)
+        if suggested < self.sample_rate or (
+            suggested > self.sample_rate
+            and now - self._changed_at >= self.increase_timeout
+        ):
+            self.sample_rate = suggested
+            self._changed_at = now
@@ -0,0 +1,284 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Tail-based sampling of whole traces.
+
+`TailSamplingSpanExporter` buffers the spans of each trace before the
+exporter it wraps, and decides to keep or drop a trace once its local root
+span has ended or no span of the trace was exported for ``decision_wait``
+seconds. A trace is kept when one of the policies keeps it, otherwise the
+sampler decides, so errors and slow requests are always exported while
+healthy traces are sampled.
+"""
+import collections
+import logging
+import threading
+import time
+import typing
+
+from opentelemetry.sdk.trace.export import SpanExporter, SpanExportResult
+from opentelemetry.trace import Span
+from opentelemetry.trace.status import StatusCanonicalCode
+
+from azure_monitor.export.trace.filters import SpanFilter, SpanSampler
+from azure_monitor.export.trace.sampling import SAMPLE_RATE_ATTRIBUTE
+
+logger = logging.getLogger(__name__)
+
+# number of decided traces remembered to route spans ending after the root
+_DECISIONS_SIZE = 4096
+
+
+class ErrorPolicy:
+    """Keeps the traces with a span whose status is not OK."""
+
+    def __call__(self, spans: typing.Sequence[Span]) -> bool:
+        for span in spans:
+            status = span.status
+            if (
+                status is not None
+                and status.canonical_code != StatusCanonicalCode.OK
+            ):
+                return True
+        return False
+
+
+class LatencyPolicy:
+    """Keeps the traces with a span lasting at least ``threshold`` seconds.
+
+    Args:
+        threshold: Duration in seconds.
+    """
+
+    def __init__(self, threshold: float) -> None:
+        self.threshold = threshold
+        self._threshold_ns = int(threshold * 1e9)
+
+    def __call__(self, spans: typing.Sequence[Span]) -> bool:
+        threshold_ns = self._threshold_ns
+        for span in spans:
+            if (
+                span.end_time is not None
+                and span.end_time - span.start_time >= threshold_ns
+            ):
+                return True
+        return False
+
+
+class AttributePolicy:
+    """Keeps the traces with a span having the given attribute values.
+
+    Args:
+        attributes: Attribute values a span of the trace must have.
+    """
+
+    def __init__(self, attributes: typing.Mapping[str, typing.Any]) -> None:
+        self._filter = SpanFilter(attributes=attributes)
+
+    def __call__(self, spans: typing.Sequence[Span]) -> bool:
+        span_filter = self._filter
+        for span in spans:
+            if span_filter(span) is False:
+                return True
+        return False
+
+
+class _Trace:
+    __slots__ = ("spans", "updated")
+
+    def __init__(self, updated: float) -> None:
+        self.spans = []
+        self.updated = updated
+
+
+def _is_local_root(span: Span) -> bool:
+    parent = getattr(span, "parent", None)
+    if isinstance(parent, Span):
+        parent = parent.context
+    return parent is None or parent.is_remote
+
+
+class TailSamplingSpanExporter(SpanExporter):
+    """Span exporter keeping or dropping whole traces.
+
+    Buffered traces are checked for the timeout when spans are exported and
+    on `shutdown`. The buffer holds ``max_spans`` spans at most, the traces
+    not updated for the longest time being decided first when it is full.
+
+    The sampler gets the spans of each trace kept by no policy at once, an
+    `AdaptiveSampler` adjusting its rate to the spans of these traces only.
+    The sample rate of the healthy traces kept by the sampler is recorded
+    on their spans as ``_MS.sampleRate``, which `AzureMonitorSpanExporter`
+    sets on the envelopes.
+
+    Args:
+        exporter: The exporter of the kept spans.
+        policies: Callables taking the spans of a trace and returning True
+        if it must be kept.
+        sampler: Decides for the traces kept by no policy, None drops them.
+        decision_wait: Seconds without new span after which an incomplete
+        trace is decided.
+        max_spans: Maximum number of buffered spans.
+        clock: Returns the current time in seconds.
+    """
+
+    def __init__(
+        self,
+        exporter: SpanExporter,
+        policies: typing.Sequence[
+            typing.Callable[[typing.Sequence[Span]], bool]
+        ] = (),
+        sampler: typing.Optional[SpanSampler] = None,
+        decision_wait: float = 30.0,
+        max_spans: int = 10000,
+        clock: typing.Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.exporter = exporter
+        self.policies = tuple(policies)
+        self.sampler = sampler
+        self.decision_wait = decision_wait
+        self.max_spans = max_spans
+        self._clock = clock
+        self._traces = collections.OrderedDict()
+        # trace id to the sample rate of a kept trace, 0 if it was dropped
+        self._decisions = collections.OrderedDict()
+        self._span_count = 0
+        self._lock = threading.Lock()
+        self._kept = 0
+        self._dropped = 0
+        self._expired = 0
+        self._evicted = 0
+
+    def export(self, spans: typing.Sequence[Span]) -> SpanExportResult:
+        with self._lock:
+            now = self._clock()
+            kept, complete = self._add(spans, now)
+            kept.extend(self._collect(complete, now))
+        return self._export(kept)
+
+    def flush(self) -> SpanExportResult:
+        """Decides and exports all the buffered traces."""
+        with self._lock:
+            traces = list(self._traces.items())
+            self._traces.clear()
+            self._span_count = 0
+            kept = []
+            for trace_id, trace in traces:
+                kept.extend(self._decide(trace_id, trace.spans))
+        return self._export(kept)
+
+    def shutdown(self) -> None:
+        self.flush()
+        self.exporter.shutdown()
+
+    def get_stats(self) -> typing.Dict[str, typing.Any]:
+        """Returns the occupancy of the buffer and the counters of the
+        decided traces."""
+        with self._lock:
+            return {
+                "buffered_traces": len(self._traces),
+                "buffered_spans": self._span_count,
+                "max_spans": self.max_spans,
+                "kept": self._kept,
+                "dropped": self._dropped,
+                "expired": self._expired,
+                "evicted": self._evicted,
+            }
+
+    def _add(
+        self, spans: typing.Sequence[Span], now: float
+    ) -> typing.Tuple[typing.List[Span], typing.List[int]]:
+        """Buffers the spans of undecided traces, returns the spans of the
+        traces already kept and the ids of the traces whose root ended."""
+        traces = self._traces
+        decisions = self._decisions
+        kept = []
+        complete = []
+        for span in spans:
+            if not span:
+                continue
+            trace_id = span.context.trace_id
+            rate = decisions.get(trace_id)
+            if rate is not None:
+                if rate:
+                    _set_sample_rate(span, rate)
+                    kept.append(span)
+                continue
+            trace = traces.get(trace_id)
+            if trace is None:
+                trace = traces[trace_id] = _Trace(now)
+            else:
+                trace.updated = now
+                traces.move_to_end(trace_id)
+            trace.spans.append(span)
+            self._span_count += 1
+            if _is_local_root(span):
+                complete.append(trace_id)
+        return kept, complete
+
+    def _collect(
+        self, complete: typing.Sequence[int], now: float
+    ) -> typing.List[Span]:
+        """Decides the complete, expired and evicted traces."""
+        traces = self._traces
+        kept = []
+        for trace_id in complete:
+            trace = traces.pop(trace_id, None)
+            if trace is None:
+                continue
+            self._span_count -= len(trace.spans)
+            kept.extend(self._decide(trace_id, trace.spans))
+        expires = now - self.decision_wait
+        while traces:
+            trace_id, trace = next(iter(traces.items()))
+            if trace.updated > expires and self._span_count <= self.max_spans:
+                break
+            del traces[trace_id]
+            self._span_count -= len(trace.spans)
+            if trace.updated > expires:
+                self._evicted += 1
+            else:
+                self._expired += 1
+            kept.extend(self._decide(trace_id, trace.spans))
+        return kept
+
+    def _decide(
+        self, trace_id: int, spans: typing.List[Span]
+    ) -> typing.List[Span]:
+        rate = 0.0
+        for policy in self.policies:
+            try:
+                if policy(spans):
+                    rate = 100.0
+                    break
+            except Exception as ex:  # pylint: disable=broad-except
+                logger.warning("Tail sampling policy failed with: %s.", ex)
+        else:
+            sampler = self.sampler
+            if sampler is not None:
+                # through sample so that adaptive samplers count the spans
+                spans = sampler.sample(spans)
+                if spans:
+                    rate = sampler.rate_of(spans[0])
+        decisions = self._decisions
+        decisions[trace_id] = rate
+        if len(decisions) > _DECISIONS_SIZE:
+            decisions.popitem(last=False)
+        if not rate:
+            self._dropped += 1
+            return []
+        self._kept += 1
+        for span in spans:
+            _set_sample_rate(span, rate)
+        return spans
+
+    def _export(self, spans: typing.List[Span]) -> SpanExportResult:
+        if not spans:
+            return SpanExportResult.SUCCESS
+        return self.exporter.export(spans)
+
+
+def _set_sample_rate(span: Span, rate: float) -> None:
+    if rate < 100:
+        # the span has ended, its attributes can no longer be set through
+        # set_attribute
+        span.attributes[SAMPLE_RATE_ATTRIBUTE] = rate
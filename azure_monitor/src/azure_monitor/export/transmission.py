@@ -0,0 +1,171 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+import collections
+import logging
+import threading
+import time
+import typing
+from enum import Enum
+
+logger = logging.getLogger(__name__)
+
+
+class OverflowPolicy(Enum):
+    """What to do with a batch when the transmission queue is full."""
+
+    BLOCK = "block"
+    DROP_OLDEST = "drop_oldest"
+    SPILL_TO_DISK = "spill_to_disk"
+
+
+# pylint: disable=broad-except
+class TransmissionQueue:
+    """Bounded queue of envelope batches posted by background threads.
+
+    Args:
+        send: Called from a worker thread with every queued batch.
+        spill: Called with the batches that cannot be queued under the
+        SPILL_TO_DISK policy and with the ones left over after a shutdown.
+        max_size: Maximum number of batches waiting to be sent.
+        workers: Number of worker threads.
+        overflow_policy: :class:`OverflowPolicy` applied when the queue is
+        full.
+    """
+
+    def __init__(
+        self,
+        send: typing.Callable[[typing.List], typing.Any],
+        spill: typing.Callable[[typing.List], typing.Any] = None,
+        max_size: int = 64,
+        workers: int = 1,
+        overflow_policy: OverflowPolicy = OverflowPolicy.BLOCK,
+    ) -> None:
+        self._send = send
+        self._spill = spill
+        self.max_size = max_size
+        self.overflow_policy = OverflowPolicy(overflow_policy)
+        self.dropped = 0
+        self.spilled = 0
+        self._queue = collections.deque()
+        self._in_flight = 0
+        self._is_shutdown = False
+        self._condition = threading.Condition()
+        self._workers = []
+        for index in range(workers):
+            worker = threading.Thread(
+                target=self._run, name="AzureMonitorTransmission-%d" % index
+            )
+            worker.daemon = True
+            worker.start()
+            self._workers.append(worker)
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    @property
+    def stopped(self) -> bool:
+        """Whether every worker thread has exited."""
+        return not any(worker.is_alive() for worker in self._workers)
+
+    def put(self, batch: typing.List) -> bool:
+        """Queues a batch, returns False if it was neither queued nor spilled.
+
+        Depending on the overflow policy, a full queue blocks the caller
+        until a worker takes a batch, drops the oldest queued batch or hands
+        the new batch to ``spill``.
+        """
+        with self._condition:
+            while (
+                not self._is_shutdown
+                and len(self._queue) >= self.max_size
+                and self.overflow_policy == OverflowPolicy.BLOCK
+            ):
+                self._condition.wait()
+            if self._is_shutdown:
+                return False
+            if len(self._queue) < self.max_size:
+                self._queue.append(batch)
+                self._condition.notify_all()
+                return True
+            if self.overflow_policy == OverflowPolicy.DROP_OLDEST:
+                self._queue.popleft()
+                self._queue.append(batch)
+                self.dropped += 1
+                logger.warning(
+                    "Transmission queue is full, dropped the oldest batch."
+                )
+                return True
+        return self._spill_batch(batch)
+
+    def flush(self, timeout: float = None) -> bool:
+        """Waits until every queued batch has been sent.
+
+        Returns False if the timeout expired first.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self._condition:
+            while self._queue or self._in_flight:
+                remaining = None
+                if deadline is not None:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        return False
+                self._condition.wait(remaining)
+        return True
+
+    def shutdown(self, timeout: float = None) -> bool:
+        """Sends the queued batches and stops the workers.
+
+        Batches still queued when the timeout expires are spilled, the
+        workers get what is left of the timeout to finish the batches they
+        are sending. Returns False if the timeout expired before every batch
+        was sent.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        flushed = self.flush(timeout)
+        with self._condition:
+            self._is_shutdown = True
+            left_over = list(self._queue)
+            self._queue.clear()
+            self._condition.notify_all()
+        for batch in left_over:
+            self._spill_batch(batch)
+        for worker in self._workers:
+            if deadline is None:
+                worker.join()
+            else:
+                worker.join(max(deadline - time.time(), 0))
+        return flushed
+
+    def _spill_batch(self, batch: typing.List) -> bool:
+        if self._spill is None:
+            self.dropped += 1
+            logger.warning("Transmission queue is full, dropped a batch.")
+            return False
+        try:
+            self._spill(batch)
+            self.spilled += 1
+            return True
+        except Exception:
+            logger.exception("Failed to spill a batch.")
+            self.dropped += 1
+            return False
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while not self._queue and not self._is_shutdown:
+                    self._condition.wait()
+                if not self._queue:
+                    return
+                batch = self._queue.popleft()
+                self._in_flight += 1
+                self._condition.notify_all()
+            try:
+                self._send(batch)
+            except Exception:
+                logger.exception("Exception occurred while sending a batch.")
+            finally:
+                with self._condition:
+                    self._in_flight -= 1
+                    self._condition.notify_all()
@@ -0,0 +1,114 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+import gzip
+import logging
+import threading
+import time
+import typing
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+class PooledSession:
+    """HTTP session keeping a pool of connections open to one endpoint.
+
+    Args:
+        pool_size: Maximum number of connections kept open to the endpoint.
+        keep_alive: Reuse connections between requests.
+        idle_timeout: Seconds a pool may stay unused before its connections
+        are dropped and reopened on the next request. 0 disables eviction.
+    """
+
+    def __init__(
+        self,
+        pool_size: int = 10,
+        keep_alive: bool = True,
+        idle_timeout: float = 60.0,
+    ) -> None:
+        self.pool_size = pool_size
+        self.keep_alive = keep_alive
+        self.idle_timeout = idle_timeout
+        self._key = None
+        self._references = 0
+        self._lock = threading.Lock()
+        self._last_used = time.time()
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+        if not keep_alive:
+            self._session.headers["Connection"] = "close"
+
+    def post(self, **kwargs) -> requests.Response:
+        with self._lock:
+            now = time.time()
+            if self.idle_timeout and now - self._last_used > self.idle_timeout:
+                # Idle connections have most likely been closed by the server
+                # or a proxy already, drop them instead of failing on reuse.
+                logger.debug("Evicting idle connections.")
+                self._session.close()
+            self._last_used = now
+        return self._session.post(**kwargs)
+
+    def close(self) -> None:
+        self._session.close()
+
+
+def encode_body(
+    data: bytes, level: int = None, min_size: int = 1024
+) -> typing.Tuple[bytes, typing.Optional[str]]:
+    """Gzips a request body when compression is enabled and worth it.
+
+    Returns the body to send and its ``Content-Encoding``, which is None when
+    the body is sent as is.
+    """
+    if level is None or len(data) < min_size:
+        return data, None
+    return gzip.compress(data, compresslevel=level), "gzip"
+
+
+def acquire_session(
+    endpoint: str,
+    pool_size: int = 10,
+    keep_alive: bool = True,
+    idle_timeout: float = 60.0,
+) -> PooledSession:
+    """Returns the session shared by every exporter of the endpoint.
+
+    Each call must be paired with a call to :func:`release_session`, the
+    session is closed when the last exporter using it releases it.
+    """
+    parsed = urlparse(endpoint)
+    key = (parsed.scheme, parsed.netloc, pool_size, keep_alive, idle_timeout)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = PooledSession(
+                pool_size=pool_size,
+                keep_alive=keep_alive,
+                idle_timeout=idle_timeout,
+            )
+            session._key = key  # pylint: disable=protected-access
+            _sessions[key] = session
+        session._references += 1  # pylint: disable=protected-access
+        return session
+
+
+def release_session(session: typing.Optional[PooledSession]) -> None:
+    if session is None:
+        return
+    # pylint: disable=protected-access
+    with _sessions_lock:
+        session._references -= 1
+        if session._references > 0:
+            return
+        if _sessions.get(session._key) is session:
+            del _sessions[session._key]
+    session.close()
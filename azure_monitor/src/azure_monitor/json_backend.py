@@ -0,0 +1,156 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""JSON libraries used to encode and decode telemetry.
+
+The fastest installed library among orjson, ujson and python-rapidjson is
+used by default, falling back to the standard library ``json`` module.
+A library is only used once it has encoded a protocol object correctly.
+Every backend encodes protocol objects like `protocol.serialize` does,
+all but orjson splicing the pre-encoded shared context tags.
+"""
+import importlib
+import json
+import typing
+
+from azure_monitor.protocol import (
+    Data,
+    Envelope,
+    json_fields,
+    make_serializer,
+    serialize,
+)
+
+AUTO = "auto"
+
+
+class JsonBackend:
+    """Encodes values to compact JSON bytes and decodes JSON documents.
+
+    Args:
+        name: Name of the backend.
+        dumps: Returns the JSON bytes of a value.
+        loads: Decodes a JSON document given as bytes or str.
+    """
+
+    __slots__ = ("name", "dumps", "loads")
+
+    def __init__(
+        self,
+        name: str,
+        dumps: typing.Callable[[typing.Any], bytes],
+        loads: typing.Callable[[typing.Union[bytes, str]], typing.Any],
+    ) -> None:
+        self.name = name
+        self.dumps = dumps
+        self.loads = loads
+
+    def __repr__(self):
+        return "JsonBackend({!r})".format(self.name)
+
+
+def _orjson(module) -> JsonBackend:
+    option = module.OPT_NON_STR_KEYS
+
+    def dumps(value):
+        return module.dumps(value, default=json_fields, option=option)
+
+    # orjson encodes the merged tags faster than the splice saves
+    return JsonBackend("orjson", dumps, module.loads)
+
+
+def _ujson(module) -> JsonBackend:
+    def dumps(value):
+        return module.dumps(
+            value,
+            default=json_fields,
+            ensure_ascii=False,
+            escape_forward_slashes=False,
+        ).encode("utf-8")
+
+    return JsonBackend("ujson", make_serializer(dumps), module.loads)
+
+
+def _rapidjson(module) -> JsonBackend:
+    # rapidjson hands dicts with non-str keys to ``default`` otherwise
+    mapping_mode = module.MM_COERCE_KEYS_TO_STRINGS
+
+    def dumps(value):
+        return module.dumps(
+            value,
+            default=json_fields,
+            ensure_ascii=False,
+            mapping_mode=mapping_mode,
+        ).encode("utf-8")
+
+    return JsonBackend("rapidjson", make_serializer(dumps), module.loads)
+
+
+def _json(module) -> JsonBackend:
+    return JsonBackend("json", serialize, module.loads)
+
+
+# in order of preference
+_FACTORIES = (
+    ("orjson", _orjson),
+    ("ujson", _ujson),
+    ("rapidjson", _rapidjson),
+    ("json", _json),
+)
+_backends = {}
+
+
+def _works(backend: JsonBackend) -> bool:
+    """Whether the backend encodes protocol objects like `serialize` does.
+
+    Old releases of a library may lack an option the backend relies on,
+    like the ``default`` argument before ujson 4, and only fail when called.
+    """
+    probe = [
+        Envelope(name="probe", tags={"ai.cloud.role": "probe"}, data=Data())
+    ]
+    try:
+        return json.loads(backend.dumps(probe).decode("utf-8")) == json.loads(
+            serialize(probe).decode("utf-8")
+        )
+    except (TypeError, ValueError):
+        return False
+
+
+def _load(name: str) -> typing.Optional[JsonBackend]:
+    if name not in _backends:
+        factory = dict(_FACTORIES)[name]
+        try:
+            module = json if name == "json" else importlib.import_module(name)
+            backend = factory(module)
+        except (ImportError, AttributeError):
+            backend = None
+        if backend is not None and not _works(backend):
+            backend = None
+        _backends[name] = backend
+    return _backends[name]
+
+
+def available_backends() -> typing.List[str]:
+    """Returns the names of the installed backends, fastest first."""
+    return [name for name, _ in _FACTORIES if _load(name) is not None]
+
+
+def get_backend(name: str = None) -> JsonBackend:
+    """Returns a JSON backend by name.
+
+    Args:
+        name: One of "orjson", "ujson", "rapidjson" or "json". None or
+        "auto" selects the fastest installed backend.
+
+    Raises ValueError if the backend is unknown or not installed.
+    """
+    if name is None or name == AUTO:
+        if AUTO not in _backends:
+            _backends[AUTO] = _load(available_backends()[0])
+        return _backends[AUTO]
+    if name not in dict(_FACTORIES):
+        raise ValueError("Unknown JSON backend {!r}.".format(name))
+    backend = _load(name)
+    if backend is None:
+        raise ValueError("JSON backend {!r} is not installed.".format(name))
+    return backend
@@ -0,0 +1,589 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""Append-only log storage.
+
+`LogStorage` stores the batches as records appended to segment files
+instead of writing one file per batch like `LocalFileStorage`. A segment
+is rolled once it holds ``segment_size`` bytes and deleted once all its
+records are deleted or expired. A checkpoint file holds the name of the
+first record not deleted yet followed by the names of the records deleted
+after it, so the deleted records are not sent again after a restart. The
+deleted records are appended to it, it is rewritten once they outnumber
+the ones it held after the last rewrite.
+
+The storage must be the only writer of its folder: exporters of a process
+using the same path share one storage, and the storage locks its folder.
+When another process holds the lock, like a worker of the same server
+using the default path, the storage uses the first unlocked folder among
+``path-1``, ``path-2``... so the batches stored by every worker are sent
+again after a restart.
+"""
+import bisect
+import datetime
+import logging
+import os
+import threading
+
+from azure_monitor.json_backend import get_backend
+from azure_monitor.storage import (
+    _FORMAT,
+    _fmt,
+    _now,
+    _seconds,
+    compress_body,
+    decode_batch,
+    decompress_body,
+    encode_batch,
+)
+from azure_monitor.utils import PeriodicTask
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+    import msvcrt  # pylint: disable=import-error
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT = "checkpoint"
+LOCK = "lock"
+# deleted records appended to the checkpoint before it is rewritten, at least
+_COMPACT_MIN = 1024
+_SUFFIX = ".log"
+# a record is its creation time and the size of its request body, followed
+# by the body and a newline
+_TIME_SIZE = len(_fmt(datetime.datetime(2000, 1, 1)))
+_HEADER_SIZE = _TIME_SIZE + 12
+
+_storages = {}
+_storages_lock = threading.Lock()
+
+
+def _record_name(segment, offset):
+    return "{:020d}-{:012d}".format(segment, offset)
+
+
+def _segment_of(name):
+    return int(name[:20])
+
+
+def _lock_file(file):
+    """Locks an open file without waiting, raises OSError if another open
+    file holds the lock."""
+    if fcntl is not None:
+        fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    else:  # pragma: no cover
+        msvcrt.locking(file.fileno(), msvcrt.LK_NBLCK, 1)
+
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except Exception:  # pylint: disable=broad-except
+        pass  # keep silent
+
+
+def _record_end(content, offset):
+    """Returns the offset after the record starting at ``offset``, None if
+    there is no complete record."""
+    header = content[offset : offset + _HEADER_SIZE]
+    if len(header) < _HEADER_SIZE:
+        return None
+    try:
+        end = offset + _HEADER_SIZE + int(header[_TIME_SIZE + 1 : -1]) + 1
+    except ValueError:
+        return None
+    if len(content) < end or content[end - 1 : end] != b"\n":
+        return None
+    return end
+
+
+# pylint: disable=protected-access
+class LogRecord:
+    """A batch stored in a `LogStorage`, with the methods of
+    `LocalFileBlob` used by the exporters.
+
+    Like the file name of a leased blob, the record holds the deadline of
+    its lease: only the record holding the current lease renews it.
+    """
+
+    __slots__ = ("name", "_storage", "_deadline")
+
+    def __init__(self, storage, name, deadline=None):
+        self.name = name
+        self._storage = storage
+        self._deadline = deadline
+
+    @property
+    def created(self):
+        """UTC time the batch was written, None if it was deleted."""
+        return self._storage._created_time(self.name)
+
+    def get(self):
+        """Returns the envelopes of the batch."""
+        try:
+            return decode_batch(self.read(), self._storage._json)
+        except Exception:  # pylint: disable=broad-except
+            pass  # keep silent
+
+    def read(self):
+        """Returns the body of the request sending the batch."""
+        content = self._storage._read(self.name)
+        if content is None:
+            return None
+        return decompress_body(content)
+
+    def lease(self, period):
+        deadline = self._storage._lease(self.name, period, self._deadline)
+        if deadline is None:
+            return None
+        self._deadline = deadline
+        return self
+
+    def delete(self):
+        self._storage._delete(self.name)
+
+
+# pylint: disable=broad-except
+# pylint: disable=too-many-instance-attributes
+class LogStorage:
+    """Stores batches of envelopes as records of an append-only log.
+
+    Args:
+        path: Folder of the segment files, the first unlocked folder among
+        ``path-1``, ``path-2``... if another process locked it.
+        max_size: Size in bytes of the segments above which batches are
+        dropped.
+        maintenance_period: Seconds between two deletions of expired
+        segments.
+        retention_period: Seconds after which the segments whose records
+        are all older are deleted.
+        segment_size: Size in bytes after which a new segment is started.
+        json_backend: JSON library encoding the envelopes.
+        compression_level: Zlib level compressing the records with the
+        preset dictionary of `LocalFileStorage`, None leaves them as is.
+    """
+
+    def __init__(
+        self,
+        path,
+        max_size=50 * 1024 * 1024,  # 50MiB
+        maintenance_period=60,  # 1 minute
+        retention_period=7 * 24 * 60 * 60,  # 7 days
+        segment_size=1024 * 1024,  # 1MiB
+        json_backend=None,
+        compression_level=None,
+    ):
+        self.path = os.path.abspath(path)
+        # key of the storage shared by the exporters of the process
+        self._key = self.path
+        self._folder_lock = None
+        try:
+            self.path = self._lock_folder(self.path)
+        except Exception:
+            logger.exception("Exception while locking the storage folder.")
+        self.max_size = max_size
+        self.maintenance_period = maintenance_period
+        self.retention_period = retention_period
+        self.segment_size = segment_size
+        self.compression_level = compression_level
+        self._json = get_backend(json_backend)
+        self._lock = threading.Lock()
+        self._users = 0
+        # names of the records not deleted, in the order they were written
+        self._names = []
+        self._created = {}
+        self._leases = {}
+        # names of the deleted records after the first one not deleted when
+        # the checkpoint was last rewritten, and appended to it since
+        self._deleted = set()
+        self._acks = 0
+        self._compacted = 0
+        # segment to its number of records not deleted, size and time of
+        # its last record
+        self._segments = {}
+        self._size = 0
+        self._active = 1
+        self._active_size = 0
+        self._file = None
+        self._checkpoint = None
+        try:
+            self._load()
+        except Exception:
+            logger.exception("Exception while loading the storage log.")
+        self._maintenance_routine()
+        self._maintenance_task = PeriodicTask(
+            interval=self.maintenance_period,
+            function=self._maintenance_routine,
+        )
+        self._maintenance_task.daemon = True
+        self._maintenance_task.start()
+
+    @classmethod
+    def open(cls, path, **options):
+        """Returns the storage of a folder, shared by all the users in the
+        process until they all closed it."""
+        path = os.path.abspath(path)
+        with _storages_lock:
+            storage = _storages.get(path)
+            if storage is None:
+                storage = _storages[path] = cls(path, **options)
+            storage._users += 1
+            return storage
+
+    def __contains__(self, name):
+        """Whether a record of that name is stored and not deleted."""
+        return name in self._created
+
+    def close(self):
+        with _storages_lock:
+            self._users -= 1
+            if self._users > 0:
+                return
+            if _storages.get(self._key) is self:
+                del _storages[self._key]
+        self._maintenance_task.cancel()
+        self._maintenance_task.join()
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            if self._checkpoint is not None:
+                self._checkpoint.close()
+                self._checkpoint = None
+        if self._folder_lock is not None:
+            self._folder_lock.close()  # releases the lock
+            self._folder_lock = None
+
+    def __enter__(self):
+        return self
+
+    # pylint: disable=redefined-builtin
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def _lock_folder(self, path):
+        """Locks the first folder among ``path``, ``path-1``, ``path-2``...
+        not locked by another process and returns it."""
+        index = 0
+        while True:
+            folder = "{}-{}".format(path, index) if index else path
+            os.makedirs(folder, exist_ok=True)
+            file = open(os.path.join(folder, LOCK), "ab")
+            try:
+                _lock_file(file)
+            except OSError:
+                file.close()
+                index += 1
+                continue
+            self._folder_lock = file
+            if index:
+                logger.warning(
+                    "Storage folder %s is locked by another process, using "
+                    "%s instead.",
+                    path,
+                    folder,
+                )
+            return folder
+
+    def _segment_path(self, segment):
+        return os.path.join(self.path, "{:020d}{}".format(segment, _SUFFIX))
+
+    def _load(self):
+        """Indexes the records of the segments not deleted according to the
+        checkpoint."""
+        os.makedirs(self.path, exist_ok=True)
+        first, deleted = self._read_checkpoint()
+        segments = sorted(
+            int(filename[: -len(_SUFFIX)])
+            for filename in os.listdir(self.path)
+            if filename.endswith(_SUFFIX) and filename[:20].isdigit()
+        )
+        for segment in segments:
+            path = self._segment_path(segment)
+            pending, last = self._load_segment(segment, first, deleted)
+            if not pending:
+                _remove_file(path)
+                continue
+            size = os.path.getsize(path)
+            self._segments[segment] = [pending, size, last]
+            self._size += size
+        self._deleted = deleted
+        last_segment = max(segments[-1] if segments else 0, _segment_of(first))
+        self._active = last_segment + 1
+        # also drops a torn last line
+        self._compact()
+
+    def _load_segment(self, segment, first, deleted):
+        """Indexes the records of a segment not deleted according to the
+        checkpoint, returns their number and the creation time of the last
+        one."""
+        with open(self._segment_path(segment), "rb") as file:
+            content = file.read()
+        pending = 0
+        last = None
+        offset = 0
+        while True:
+            end = _record_end(content, offset)
+            if end is None:
+                break  # torn write
+            name = _record_name(segment, offset)
+            created = content[offset : offset + _TIME_SIZE]
+            offset = end
+            if name < first or name in deleted:
+                continue
+            pending += 1
+            last = created.decode("ascii")
+            self._names.append(name)
+            self._created[name] = last
+        return pending, last
+
+    def _read_checkpoint(self):
+        try:
+            with open(os.path.join(self.path, CHECKPOINT), "r") as file:
+                # the last line is empty or torn
+                lines = file.read().split("\n")[:-1]
+        except FileNotFoundError:
+            return _record_name(0, 0), set()
+        if (
+            not lines
+            or len(lines[0]) != 33
+            or not lines[0].replace("-", "").isdigit()
+        ):
+            logger.warning("Invalid storage checkpoint, ignored.")
+            return _record_name(0, 0), set()
+        return lines[0], set(lines[1:])
+
+    def _compact(self):
+        """Rewrites the checkpoint with the first record not deleted and the
+        records deleted after it, called with the lock held."""
+        if self._names:
+            first = self._names[0]
+        else:
+            first = _record_name(self._active, self._active_size)
+        self._deleted = {name for name in self._deleted if name > first}
+        self._acks = 0
+        self._compacted = len(self._deleted)
+        content = "".join(
+            name + "\n" for name in [first] + sorted(self._deleted)
+        )
+        path = os.path.join(self.path, CHECKPOINT)
+        try:
+            if self._checkpoint is not None:
+                self._checkpoint.close()
+                self._checkpoint = None
+            # replaced whole, a failed rewrite leaves the previous one
+            with open(path + ".tmp", "wb") as file:
+                file.write(content.encode("ascii"))
+            os.replace(path + ".tmp", path)
+            self._checkpoint = open(path, "ab")
+        except Exception:
+            pass  # keep silent
+
+    def _ack(self, name):
+        """Appends a deleted record to the checkpoint, called with the lock
+        held."""
+        self._deleted.add(name)
+        self._acks += 1
+        if self._acks >= max(self._compacted, _COMPACT_MIN):
+            self._compact()
+            return
+        try:
+            if self._checkpoint is None:
+                self._checkpoint = open(
+                    os.path.join(self.path, CHECKPOINT), "ab"
+                )
+            # a torn line only resends the record
+            self._checkpoint.write(name.encode("ascii") + b"\n")
+            self._checkpoint.flush()
+        except Exception:
+            pass  # keep silent
+
+    def _remove_segment(self, segment):
+        """Deletes a segment and its records, called with the lock held."""
+        if segment == self._active and self._file is not None:
+            self._file.close()
+            self._file = None
+            self._active += 1
+            self._active_size = 0
+        _, size, _ = self._segments.pop(segment)
+        self._size -= size
+        names = self._names
+        start = bisect.bisect_left(names, _record_name(segment, 0))
+        end = bisect.bisect_left(names, _record_name(segment + 1, 0))
+        for name in names[start:end]:
+            del self._created[name]
+            self._leases.pop(name, None)
+        del names[start:end]
+        _remove_file(self._segment_path(segment))
+
+    def _maintenance_routine(self):
+        try:
+            if not os.path.isdir(self.path):
+                os.makedirs(self.path, exist_ok=True)
+        except Exception:
+            pass  # keep silent
+        retention_deadline = _fmt(_now() - _seconds(self.retention_period))
+        with self._lock:
+            expired = [
+                segment
+                for segment, (_, _, last) in self._segments.items()
+                if last is not None and last < retention_deadline
+            ]
+            for segment in expired:
+                self._remove_segment(segment)  # TODO: log data loss
+            if expired:
+                self._compact()
+
+    def put(self, data, lease_period=0):
+        """Appends a request body, or the envelopes of one.
+
+        Args:
+            data: Bytes of the request body or envelopes.
+            lease_period: Seconds the record is leased for once written.
+        """
+        try:
+            if not isinstance(data, bytes):
+                data = encode_batch(data, self._json)
+            if self.compression_level is not None:
+                data = compress_body(data, self.compression_level)
+        except Exception:
+            return None  # keep silent
+        now = _now()
+        created = _fmt(now)
+        record = b"".join(
+            (created.encode("ascii"), b" %010d " % len(data), data, b"\n",)
+        )
+        with self._lock:
+            if (
+                self._size >= self.max_size
+                and self._file is not None
+                and not self._segments[self._active][0]
+            ):
+                self._roll()  # deletes the acked active segment
+            if self._size >= self.max_size:
+                logger.warning(
+                    "Persistent storage max capacity has been "
+                    "reached. Currently at %fKB. Telemetry will be "
+                    "lost. Please consider increasing the value of "
+                    "'storage_max_size' in exporter config.",
+                    self._size / 1024,
+                )
+                return None
+            try:
+                if self._file is None or (
+                    self._active_size
+                    and self._active_size + len(record) > self.segment_size
+                ):
+                    self._roll()
+                self._file.write(record)
+                self._file.flush()
+            except Exception:
+                return None  # keep silent
+            name = _record_name(self._active, self._active_size)
+            self._active_size += len(record)
+            self._size += len(record)
+            segment = self._segments[self._active]
+            segment[0] += 1
+            segment[1] += len(record)
+            segment[2] = created
+            self._names.append(name)
+            self._created[name] = created
+            deadline = None
+            if lease_period:
+                deadline = _fmt(now + _seconds(lease_period))
+                self._leases[name] = deadline
+        return LogRecord(self, name, deadline)
+
+    def _roll(self):
+        """Starts a new segment, called with the lock held."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            previous = self._active
+            # segments are never reused, names of deleted records neither
+            self._active += 1
+            self._active_size = 0
+            if not self._segments[previous][0]:
+                self._remove_segment(previous)
+        self._file = open(self._segment_path(self._active), "ab")
+        self._segments[self._active] = [0, 0, None]
+
+    def gets(self):
+        lease_deadline = _fmt(_now())
+        with self._lock:
+            if not self._names:
+                return
+            # the records put while iterating are left to the next call
+            last = self._names[-1]
+        after = None
+        while True:
+            with self._lock:
+                names = self._names
+                index = (
+                    0 if after is None else bisect.bisect_right(names, after)
+                )
+                name = None
+                while index < len(names) and names[index] <= last:
+                    deadline = self._leases.get(names[index])
+                    if deadline is None or deadline <= lease_deadline:
+                        name = names[index]
+                        break
+                    index += 1  # under lease
+            if name is None:
+                return
+            after = name
+            yield LogRecord(self, name)
+
+    def get(self):
+        cursor = self.gets()
+        try:
+            return next(cursor)
+        except StopIteration:
+            pass
+        return None
+
+    def _created_time(self, name):
+        created = self._created.get(name)
+        if created is None:
+            return None
+        return datetime.datetime.strptime(created, _FORMAT)
+
+    def _read(self, name):
+        try:
+            with open(self._segment_path(_segment_of(name)), "rb") as file:
+                file.seek(int(name[21:]))
+                header = file.read(_HEADER_SIZE)
+                return file.read(int(header[_TIME_SIZE + 1 : -1]))
+        except Exception:
+            pass  # keep silent
+
+    def _lease(self, name, period, held):
+        """Leases a record not leased by another holder and returns the
+        deadline of the lease, None if the record cannot be leased."""
+        now = _now()
+        with self._lock:
+            if name not in self._created:
+                return None
+            current = self._leases.get(name)
+            if current is not None and current != held and current > _fmt(now):
+                return None  # leased by another holder
+            deadline = _fmt(now + _seconds(period))
+            self._leases[name] = deadline
+            return deadline
+
+    def _delete(self, name):
+        with self._lock:
+            names = self._names
+            index = bisect.bisect_left(names, name)
+            if index == len(names) or names[index] != name:
+                return
+            del names[index]
+            del self._created[name]
+            self._leases.pop(name, None)
+            segment = _segment_of(name)
+            entry = self._segments[segment]
+            entry[0] -= 1
+            if not entry[0] and segment != self._active:
+                self._remove_segment(segment)
+            self._ack(name)
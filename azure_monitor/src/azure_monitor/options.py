@@ -21,55 +21,190 @@ uuid_regex_pattern = re.compile(
     "[0-9a-f]{12}$"
 )
 
+# Smallest value of the numeric options, None keeps an option's default
+# behaviour where its description allows it
+_MINIMUMS = (
+    ("circuit_breaker_recovery_timeout", 0),
+    ("circuit_breaker_threshold", 0),
+    ("compression_min_size", 0),
+    ("connection_idle_timeout", 0),
+    ("connection_pool_size", 1),
+    ("retry_initial_backoff", 0),
+    ("retry_interval", 0),
+    ("retry_max_age", 0),
+    ("retry_max_backoff", 0),
+    ("retry_max_batches", 1),
+    ("transmission_concurrency", 1),
+    ("transmission_max_bytes", 1),
+    ("transmission_max_items", 1),
+    ("transmission_queue_size", 1),
+    ("transmission_workers", 0),
+)
+
 
 class ExporterOptions(BaseObject):
     """Options to configure Azure exporters.
 
     Args:
+        circuit_breaker_recovery_timeout: Seconds requests stay suspended once
+        the circuit breaker opened, before a probe request is sent.
+        circuit_breaker_threshold: Consecutive retryable failures opening the
+        circuit breaker, batches are then stored without any request until
+        a probe succeeds. 0 disables the circuit breaker.
+        compression_level: Gzip level (1-9) used to compress request bodies,
+        including the ones kept in local storage, None sends them
+        uncompressed.
+        compression_min_size: Request bodies smaller than this many bytes are
+        sent uncompressed.
+        connection_idle_timeout: Seconds a pooled connection may stay unused
+        before it is closed, 0 disables eviction.
+        connection_keep_alive: Reuse connections to the ingestion endpoint.
+        connection_pool_size: Maximum number of pooled connections to the
+        ingestion endpoint.
         connection_string: Azure Connection String.
         instrumentation_key: Azure Instrumentation Key.
+        json_backend: JSON library encoding and decoding telemetry: "orjson",
+        "ujson", "rapidjson" or "json". None picks the fastest installed one.
         proxies: Proxies to pass Azure Monitor request through.
+        retry_initial_backoff: Seconds before a failed batch is retried for
+        the first time, the delay doubles with every failure.
+        retry_interval: Seconds between two attempts at sending the batches
+        kept in local storage from a background thread, 0 only retries them
+        after a successful export.
+        retry_max_age: Seconds after which a stored batch is dropped instead
+        of retried, None keeps it for the storage retention period.
+        retry_max_backoff: Maximum number of seconds between two retries of a
+        batch, also caps the delay requested by a Retry-After header.
+        retry_max_batches: Maximum number of stored batches sent at each
+        retry.
+        storage_compression_level: Zlib level (1-9) compressing the batches
+        kept in local storage with a dictionary of common envelope content,
+        None stores them uncompressed.
+        storage_engine: How batches are kept in local storage: "blob" writes
+        a file per batch, "log" appends them to segment files, in
+        ``storage_path-1``, ``storage_path-2``... when other processes
+        hold ``storage_path``.
         storage_maintenance_period: Local storage maintenance interval in seconds.
         storage_max_size: Local storage maximum size in bytes.
         storage_path: Local storage file path.
         storage_retention_period: Local storage retention period in seconds
         timeout: Request timeout in seconds
+        transmission_concurrency: Maximum number of requests an exporter
+        keeps in flight at once.
+        transmission_max_bytes: Maximum size in bytes of a request body before
+        compression, larger batches are split.
+        transmission_max_items: Maximum number of envelopes in a request,
+        larger batches are split.
+        transmission_overflow_policy: What to do with a batch when the
+        transmission queue is full: "block", "drop_oldest" or "spill_to_disk".
+        transmission_queue_size: Maximum number of batches waiting for a
+        transmission worker.
+        transmission_workers: Number of background threads posting batches,
+        0 sends batches synchronously from export().
     """
 
     __slots__ = (
+        "circuit_breaker_recovery_timeout",
+        "circuit_breaker_threshold",
+        "compression_level",
+        "compression_min_size",
+        "connection_idle_timeout",
+        "connection_keep_alive",
+        "connection_pool_size",
         "connection_string",
         "endpoint",
         "instrumentation_key",
+        "json_backend",
         "proxies",
+        "retry_initial_backoff",
+        "retry_interval",
+        "retry_max_age",
+        "retry_max_backoff",
+        "retry_max_batches",
+        "storage_compression_level",
+        "storage_engine",
         "storage_maintenance_period",
         "storage_max_size",
         "storage_path",
         "storage_retention_period",
         "timeout",
+        "transmission_concurrency",
+        "transmission_max_bytes",
+        "transmission_max_items",
+        "transmission_overflow_policy",
+        "transmission_queue_size",
+        "transmission_workers",
     )
 
+    # one keyword argument per option
+    # pylint: disable=too-many-locals
     def __init__(
         self,
+        circuit_breaker_recovery_timeout: float = 30.0,
+        circuit_breaker_threshold: int = 5,
+        compression_level: int = None,
+        compression_min_size: int = 1024,
+        connection_idle_timeout: float = 60.0,
+        connection_keep_alive: bool = True,
+        connection_pool_size: int = 10,
         connection_string: str = None,
         instrumentation_key: str = None,
+        json_backend: str = None,
         proxies: typing.Dict[str, str] = None,
+        retry_initial_backoff: float = 1.0,
+        retry_interval: float = 0.0,
+        retry_max_age: float = None,
+        retry_max_backoff: float = 600.0,
+        retry_max_batches: int = 20,
+        storage_compression_level: int = None,
+        storage_engine: str = "blob",
         storage_maintenance_period: int = 60,
         storage_max_size: int = 50 * 1024 * 1024,
         storage_path: str = None,
         storage_retention_period: int = 7 * 24 * 60 * 60,
         timeout: int = 10.0,  # networking timeout in seconds
+        transmission_concurrency: int = 4,
+        transmission_max_bytes: int = 4 * 1024 * 1024,
+        transmission_max_items: int = 1000,
+        transmission_overflow_policy: str = "block",
+        transmission_queue_size: int = 64,
+        transmission_workers: int = 0,
     ) -> None:
+        self.circuit_breaker_recovery_timeout = (
+            circuit_breaker_recovery_timeout
+        )
+        self.circuit_breaker_threshold = circuit_breaker_threshold
+        self.compression_level = compression_level
+        self.compression_min_size = compression_min_size
+        self.connection_idle_timeout = connection_idle_timeout
+        self.connection_keep_alive = connection_keep_alive
+        self.connection_pool_size = connection_pool_size
         self.connection_string = connection_string
         self.instrumentation_key = instrumentation_key
+        self.json_backend = json_backend
         self.proxies = proxies
+        self.retry_initial_backoff = retry_initial_backoff
+        self.retry_interval = retry_interval
+        self.retry_max_age = retry_max_age
+        self.retry_max_backoff = retry_max_backoff
+        self.retry_max_batches = retry_max_batches
+        self.storage_compression_level = storage_compression_level
+        self.storage_engine = storage_engine
         self.storage_maintenance_period = storage_maintenance_period
         self.storage_max_size = storage_max_size
         self.storage_path = storage_path
         self.storage_retention_period = storage_retention_period
         self.timeout = timeout
+        self.transmission_concurrency = transmission_concurrency
+        self.transmission_max_bytes = transmission_max_bytes
+        self.transmission_max_items = transmission_max_items
+        self.transmission_overflow_policy = transmission_overflow_policy
+        self.transmission_queue_size = transmission_queue_size
+        self.transmission_workers = transmission_workers
         self.endpoint = ""
         self._initialize()
         self._validate_instrumentation_key()
+        self._validate_ranges()
 
     def _initialize(self) -> None:
         # connection string and ikey
@@ -125,6 +260,23 @@ class ExporterOptions(BaseObject):
         if not match:
             raise ValueError("Invalid instrumentation key.")
 
+    def _validate_ranges(self) -> None:
+        """Validates the numeric options, a value out of range fails here
+        rather than at the first export.
+        """
+        for name in ("compression_level", "storage_compression_level"):
+            level = getattr(self, name)
+            if level is not None and not 1 <= level <= 9:
+                raise ValueError(
+                    "{} must be between 1 and 9 or None.".format(name)
+                )
+        for name, minimum in _MINIMUMS:
+            value = getattr(self, name)
+            if value is not None and value < minimum:
+                raise ValueError(
+                    "{} must be at least {}.".format(name, minimum)
+                )
+
 
 def parse_connection_string(connection_string) -> typing.Dict:
     if connection_string is None:
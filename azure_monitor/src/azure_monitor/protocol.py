@@ -1,6 +1,8 @@
 # Copyright (c) Microsoft Corporation. All rights reserved.
 # Licensed under the MIT License.
 
+import collections.abc
+import json
 import typing
 from enum import Enum
 
@@ -8,6 +10,16 @@ from enum import Enum
 class BaseObject:
     __slots__ = ()
 
+    # JSON keys of the fields not named after the camel cased slot
+    _json_keys = {}
+    # fields left out of the JSON payload when they have this value
+    _json_defaults = {}
+
+    @classmethod
+    def json_keys_and_defaults(cls) -> typing.Tuple[dict, dict]:
+        """Returns the JSON keys not named after slots and the omitted values."""
+        return cls._json_keys, cls._json_defaults
+
     def __repr__(self):
         tmp = {}
 
@@ -106,6 +118,102 @@ class DataPoint(BaseObject):
         }
 
 
+class ContextTags(collections.abc.Mapping):
+    """Read-only tags shared by many envelopes.
+
+    Their JSON encoding is computed once per JSON encoder and spliced into
+    the serialized envelopes.
+
+    Args:
+        tags: The tags to share, copied.
+    """
+
+    __slots__ = ("_tags", "_fragments")
+
+    def __init__(self, tags: typing.Mapping[str, str]) -> None:
+        self._tags = dict(tags)
+        self._fragments = {}
+
+    def __getitem__(self, key):
+        return self._tags[key]
+
+    def __iter__(self):
+        return iter(self._tags)
+
+    def __len__(self):
+        return len(self._tags)
+
+    def __eq__(self, other):
+        if isinstance(other, ContextTags):
+            other = other._tags  # pylint: disable=protected-access
+        return self._tags == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "ContextTags({!r})".format(self._tags)
+
+    def fragment(self, dumps: typing.Callable[[typing.Any], bytes]) -> bytes:
+        """Returns the JSON members of the tags, without the braces."""
+        fragment = self._fragments.get(dumps)
+        if fragment is None:
+            fragment = dumps(self._tags)[1:-1]
+            self._fragments[dumps] = fragment
+        return fragment
+
+
+class EnvelopeTags(collections.abc.MutableMapping):
+    """Tags of an envelope laid over shared `ContextTags`.
+
+    New tags are stored in the envelope's own dictionary, removing a shared
+    tag copies the shared tags into the envelope first.
+
+    Args:
+        context: The shared tags.
+        own: The tags of this envelope only.
+    """
+
+    __slots__ = ("context", "own")
+
+    def __init__(
+        self, context: ContextTags = None, own: typing.Dict = None
+    ) -> None:
+        self.context = context
+        self.own = {} if own is None else own
+
+    def __getitem__(self, key):
+        try:
+            return self.own[key]
+        except KeyError:
+            if self.context is None:
+                raise
+            return self.context[key]
+
+    def __setitem__(self, key, value):
+        self.own[key] = value
+
+    def __delitem__(self, key):
+        if key not in self.own and self.context and key in self.context:
+            self.own = dict(self.context, **self.own)
+            self.context = None
+        del self.own[key]
+
+    def __iter__(self):
+        if self.context:
+            for key in self.context:
+                if key not in self.own:
+                    yield key
+        yield from self.own
+
+    def __len__(self):
+        if not self.context:
+            return len(self.own)
+        return len(self.context.keys() | self.own.keys())
+
+    def __repr__(self):
+        return "EnvelopeTags({!r})".format(dict(self))
+
+
 class Envelope(BaseObject):
     """Envelope represents a telemetry item
 
@@ -138,6 +246,8 @@ class Envelope(BaseObject):
         "tags",
         "data",
     )
+    _json_keys = {"ikey": "iKey"}
+    _json_defaults = {"ver": 1}
 
     def __init__(
         self,
@@ -170,7 +280,7 @@ class Envelope(BaseObject):
             "seq": self.seq,
             "iKey": self.ikey,
             "flags": self.flags,
-            "tags": self.tags,
+            "tags": dict(self.tags) if self.tags else self.tags,
             "data": self.data.to_dict() if self.data else None,
         }
 
@@ -263,7 +373,7 @@ class ExceptionDetails(BaseObject):
             "outerId": self.outer_id,
             "typeName": self.type_name,
             "message": self.message,
-            "hasFullStack ": self.has_full_stack,
+            "hasFullStack": self.has_full_stack,
             "stack": self.stack,
             "parsedStack": self.parsed_stack,
         }
@@ -403,7 +513,7 @@ class MetricData(BaseObject):
     def to_dict(self):
         return {
             "ver": self.ver,
-            "metrics": list(map(lambda x: x.to_dict(), self.metrics)),
+            "metrics": [metric.to_dict() for metric in self.metrics],
             "properties": self.properties,
         }
 
@@ -572,6 +682,13 @@ class LiveMetricDocument(BaseObject):
         "operation_id",
         "properties",
     )
+    _json_keys = {
+        "quickpulse_type": "__type",
+        "document_type": "DocumentType",
+        "version": "Version",
+        "operation_id": "OperationId",
+        "properties": "Properties",
+    }
 
     def __init__(
         self,
@@ -600,6 +717,7 @@ class LiveMetricDocument(BaseObject):
 class LiveMetric(BaseObject):
 
     __slots__ = ("name", "value", "weight")
+    _json_keys = {"name": "Name", "value": "Value", "weight": "Weight"}
 
     def __init__(self, name: str, value: str, weight: int) -> None:
         self.name = name
@@ -637,6 +755,19 @@ class LiveMetricEnvelope(BaseObject):
         "timestamp",
         "version",
     )
+    _json_keys = {
+        "documents": "Documents",
+        "instance": "Instance",
+        "instrumentation_key": "InstrumentationKey",
+        "invariant_version": "InvariantVersion",
+        "machine_name": "MachineName",
+        "metrics": "Metrics",
+        "stream_id": "StreamId",
+        "timestamp": "Timestamp",
+        "version": "Version",
+    }
+    # to_dict sends no documents as null
+    _json_defaults = {"documents": []}
 
     def __init__(
         self,
@@ -664,15 +795,206 @@ class LiveMetricEnvelope(BaseObject):
 
     def to_dict(self):
         return {
-            "Documents": list(map(lambda x: x.to_dict(), self.documents))
+            "Documents": [document.to_dict() for document in self.documents]
             if self.documents
             else None,
             "Instance": self.instance,
             "InstrumentationKey": self.instrumentation_key,
             "InvariantVersion": self.invariant_version,
             "MachineName": self.machine_name,
-            "Metrics": list(map(lambda x: x.to_dict(), self.metrics)),
+            "Metrics": [metric.to_dict() for metric in self.metrics],
             "StreamId": self.stream_id,
             "Timestamp": self.timestamp,
             "Version": self.version,
         }
+
+
+_NO_DEFAULT = object()
+# generated encoder of each protocol class, see `make_encoder`
+_encoders = {}
+
+
+def _json_key(name: str) -> str:
+    head, *tail = name.split("_")
+    return head + "".join(word.capitalize() for word in tail)
+
+
+def _fields(cls: type) -> typing.List[typing.Tuple[str, str, typing.Any]]:
+    """Returns the (slot, JSON key, default) triples of a protocol class."""
+    if not issubclass(cls, BaseObject):
+        raise TypeError(
+            "Object of type {} is not JSON serializable".format(cls.__name__)
+        )
+    keys, defaults = cls.json_keys_and_defaults()
+    return [
+        (
+            name,
+            keys.get(name) or _json_key(name),
+            defaults.get(name, _NO_DEFAULT),
+        )
+        for name in cls.__slots__
+    ]
+
+
+def make_encoder(
+    cls: type, first: str = None
+) -> typing.Callable[..., typing.Dict[str, typing.Any]]:
+    """Generates the function returning the JSON fields of a protocol class.
+
+    The function reads every slot once and adds it to the result unless it
+    is None or holds its default value, like `json_fields` documents.
+
+    Args:
+        cls: The protocol class.
+        first: A slot left out of the generated code, its value is then
+        passed as second argument and always encoded first.
+
+    Raises TypeError if the class is not a protocol class.
+    """
+    namespace = {}
+    lines = ["def encode(value{}):".format(", first" if first else "")]
+    lines.append("    result = {}")
+    for index, (name, key, default) in enumerate(_fields(cls)):
+        if name == first:
+            lines[1] = "    result = {{{!r}: first}}".format(key)
+            continue
+        lines.append("    field = value.{}".format(name))
+        if default is _NO_DEFAULT:
+            lines.append("    if field is not None:")
+        else:
+            namespace["default_{}".format(index)] = default
+            lines.append(
+                "    if field is not None and field != default_{}:".format(
+                    index
+                )
+            )
+        lines.append("        result[{!r}] = field".format(key))
+    lines.append("    return result")
+    exec("\n".join(lines), namespace)  # pylint: disable=exec-used
+    encode = namespace["encode"]
+    encode.__name__ = encode.__qualname__ = "encode_" + cls.__name__
+    return encode
+
+
+def json_fields(value: typing.Any) -> typing.Dict[str, typing.Any]:
+    """Returns the fields of a protocol object to encode in its place.
+
+    Meant as the ``default`` hook of JSON encoders. None fields and the
+    ones holding their default value (like the envelope ``ver``) are left
+    out, nested objects are left to the encoder. Mappings other than dict,
+    like `EnvelopeTags`, are encoded as dictionaries.
+
+    Raises TypeError for a dict, which the encoder gave up on: returning it
+    as is would send it back here forever.
+    """
+    encode = _encoders.get(type(value))
+    if encode is None:
+        if type(value) is dict:  # pylint: disable=unidiomatic-typecheck
+            raise TypeError("Cannot encode dict {!r}".format(value))
+        if isinstance(value, EnvelopeTags):
+            # pylint: disable=protected-access
+            tags = dict(value.context._tags) if value.context else {}
+            tags.update(value.own)
+            return tags
+        if isinstance(value, collections.abc.Mapping):
+            return dict(value)
+        encode = make_encoder(type(value))
+        _encoders[type(value)] = encode
+    return encode(value)
+
+
+def _subclasses(cls: type) -> typing.Iterator[type]:
+    for subclass in cls.__subclasses__():
+        yield subclass
+        yield from _subclasses(subclass)
+
+
+_encoders.update((cls, make_encoder(cls)) for cls in _subclasses(BaseObject))
+# the envelope without its tags, see `_dumps_envelope`
+_encode_envelope = make_encoder(Envelope, first="tags")
+
+
+if json.encoder.c_make_encoder is not None:
+    _iterencode = json.encoder.c_make_encoder(
+        None,  # no circular reference check
+        json_fields,
+        json.encoder.encode_basestring_ascii,
+        None,  # no indent
+        ":",
+        ",",
+        False,  # sort_keys
+        False,  # skipkeys
+        True,  # allow_nan
+    )
+else:  # pragma: no cover
+    _iterencode = json.JSONEncoder(
+        separators=(",", ":"), default=json_fields
+    ).iterencode
+
+
+def _dumps(value: typing.Any) -> bytes:
+    # non ASCII characters are escaped
+    return "".join(_iterencode(value, 0)).encode("ascii")
+
+
+def _dumps_envelope(
+    envelope: Envelope, dumps: typing.Callable[[typing.Any], bytes]
+) -> bytes:
+    tags = envelope.tags
+    if type(tags) is not EnvelopeTags:  # pylint: disable=unidiomatic-typecheck
+        return dumps(envelope)
+    context = tags.context
+    own = tags.own
+    # pylint: disable=protected-access
+    if not context or not own.keys().isdisjoint(context._tags):
+        return dumps(envelope)
+    # tags come first so the shared tags are inserted at a known offset,
+    # unless the dict does not keep its insertion order (Python 3.5)
+    fields = _encode_envelope(envelope, own)
+    data = dumps(fields)
+    if not data.startswith(b'{"tags":{'):
+        return dumps(envelope)
+    fragment = context.fragment(dumps)
+    if own:
+        fragment += b","
+    return data[:9] + fragment + data[9:]
+
+
+def make_serializer(
+    dumps: typing.Callable[[typing.Any], bytes]
+) -> typing.Callable[[typing.Any], bytes]:
+    """Returns a function serializing values like ``dumps``, splicing the
+    encoded `ContextTags` into envelopes and lists of envelopes.
+
+    Args:
+        dumps: Serializes values to JSON bytes, `json_fields` being its
+        hook for protocol objects.
+    """
+
+    # exact types, the Envelope encoder does not know the slots of subclasses
+    # pylint: disable=unidiomatic-typecheck
+    def serialize_value(value: typing.Any) -> bytes:
+        if type(value) is Envelope:
+            return _dumps_envelope(value, dumps)
+        if (
+            isinstance(value, (list, tuple))
+            and value
+            and type(value[0]) is Envelope
+        ):
+            return b"[" + b",".join(map(serialize_value, value)) + b"]"
+        return dumps(value)
+
+    return serialize_value
+
+
+_serialize = make_serializer(_dumps)
+
+
+def serialize(value: typing.Any) -> bytes:
+    """Serializes protocol objects and JSON values to compact JSON bytes.
+
+    Protocol objects are encoded in the same pass as the values around them,
+    without building their `to_dict` representation first. Their None
+    fields and the envelope ``ver`` of 1 are left out of the payload.
+    """
+    return _serialize(value)
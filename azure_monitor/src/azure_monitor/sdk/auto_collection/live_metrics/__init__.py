@@ -30,6 +30,11 @@ class LiveMetricsAutoCollection:
     Args:
         meter: OpenTelemetry Meter
         labels: Dictionary of labels
+        span_processor: Processor collecting the request and dependency
+        metrics.
+        instrumentation_key: Instrumentation key to send data to.
+        sender_options: Keyword arguments of the LiveMetricsSender
+        (compression_level, compression_min_size, json_backend).
     """
 
     def __init__(
@@ -38,6 +43,7 @@ class LiveMetricsAutoCollection:
         labels: Dict[str, str],
         span_processor: AzureMetricsSpanProcessor,
         instrumentation_key: str,
+        **sender_options
     ):
         col_type = AutoCollectionType.LIVE_METRICS
         self._performance_metrics = PerformanceMetrics(meter, labels, col_type)
@@ -48,7 +54,7 @@ class LiveMetricsAutoCollection:
             meter, labels, span_processor, col_type
         )
         self._manager = LiveMetricsManager(
-            meter, instrumentation_key, span_processor
+            meter, instrumentation_key, span_processor, **sender_options
         )
 
     def shutdown(self):
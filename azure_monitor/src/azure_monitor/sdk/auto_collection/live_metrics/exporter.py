@@ -35,16 +35,26 @@ class LiveMetricsExporter(MetricsExporter):
     """Live Metrics Exporter
 
     Export data to Azure Live Metrics service and determine if user is subscribed.
+
+    Args:
+        instrumentation_key: Instrumentation key to send data to.
+        span_processor: Processor collecting the request and dependency
+        documents.
+        sender_options: Keyword arguments of the LiveMetricsSender
+        (compression_level, compression_min_size, json_backend).
     """
 
     def __init__(
         self,
         instrumentation_key: str,
         span_processor: AzureMetricsSpanProcessor,
+        **sender_options
     ):
         self._instrumentation_key = instrumentation_key
         self._span_processor = span_processor
-        self._sender = LiveMetricsSender(self._instrumentation_key)
+        self._sender = LiveMetricsSender(
+            self._instrumentation_key, **sender_options
+        )
         self.subscribed = True
 
     def export(
@@ -34,6 +34,15 @@ class LiveMetricsManager(threading.Thread):
 
     It will start Live Metrics process when instantiated,
     responsible for switching between ping and post actions.
+
+    Args:
+        meter: OpenTelemetry Meter
+        instrumentation_key: Instrumentation key to send data to.
+        span_processor: Processor collecting the request and dependency
+        documents.
+        sender_options: Keyword arguments of the LiveMetricsSender used to
+        ping and post (compression_level, compression_min_size,
+        json_backend).
     """
 
     daemon = True
@@ -43,6 +52,7 @@ class LiveMetricsManager(threading.Thread):
         meter: Meter,
         instrumentation_key: str,
         span_processor: AzureMetricsSpanProcessor,
+        **sender_options
     ):
         super().__init__()
         self.thread_event = threading.Event()
@@ -51,11 +61,14 @@ class LiveMetricsManager(threading.Thread):
         self._is_user_subscribed = False
         self._meter = meter
         self._span_processor = span_processor
+        self._sender_options = sender_options
         self._exporter = LiveMetricsExporter(
-            self._instrumentation_key, self._span_processor
+            self._instrumentation_key, self._span_processor, **sender_options
         )
         self._post = None
-        self._ping = LiveMetricsPing(self._instrumentation_key)
+        self._ping = LiveMetricsPing(
+            self._instrumentation_key, **sender_options
+        )
         self.start()
 
     def run(self):
@@ -79,7 +92,9 @@ class LiveMetricsManager(threading.Thread):
                 self._span_processor.is_collecting_documents = False
                 self._post.shutdown()
                 self._post = None
-                self._ping = LiveMetricsPing(self._instrumentation_key)
+                self._ping = LiveMetricsPing(
+                    self._instrumentation_key, **self._sender_options
+                )
 
     def shutdown(self):
         if self._ping:
@@ -97,7 +112,7 @@ class LiveMetricsPing(threading.Thread):
 
     daemon = True
 
-    def __init__(self, instrumentation_key):
+    def __init__(self, instrumentation_key, **sender_options):
         super().__init__()
         self.instrumentation_key = instrumentation_key
         self.thread_event = threading.Event()
@@ -105,7 +120,9 @@ class LiveMetricsPing(threading.Thread):
         self.is_user_subscribed = False
         self.last_send_succeeded = False
         self.last_request_success_time = 0
-        self.sender = LiveMetricsSender(self.instrumentation_key)
+        self.sender = LiveMetricsSender(
+            self.instrumentation_key, **sender_options
+        )
         self.start()
 
     def run(self):
@@ -1,12 +1,13 @@
 # Copyright (c) Microsoft Corporation. All rights reserved.
 # Licensed under the MIT License.
 #
-import json
 import logging
 import time
 
 import requests
 
+from azure_monitor.export import transport
+from azure_monitor.json_backend import get_backend
 from azure_monitor.protocol import LiveMetricEnvelope
 from azure_monitor.sdk.auto_collection.live_metrics import utils
 
@@ -17,35 +18,61 @@ class LiveMetricsSender:
     """Live Metrics Sender
 
     Send HTTP requests to Live Metrics service
+
+    Args:
+        instrumentation_key: Instrumentation key to send data to.
+        compression_level: Gzip level (1-9) used to compress request bodies,
+        None sends them uncompressed.
+        compression_min_size: Request bodies smaller than this many bytes are
+        sent uncompressed.
+        json_backend: Name of the JSON library encoding the requests, None
+        picks the fastest installed one.
     """
 
-    def __init__(self, instrumentation_key: str):
+    def __init__(
+        self,
+        instrumentation_key: str,
+        compression_level: int = None,
+        compression_min_size: int = 1024,
+        json_backend: str = None,
+    ):
         self._instrumentation_key = instrumentation_key
+        self._compression_level = compression_level
+        self._compression_min_size = compression_min_size
+        self._json = get_backend(json_backend)
 
     def ping(self, envelope: LiveMetricEnvelope):
-        return self._send_request(json.dumps(envelope.to_dict()), "ping")
+        return self._send_request(self._json.dumps(envelope.to_dict()), "ping")
 
     def post(self, envelope: LiveMetricEnvelope):
-        return self._send_request(json.dumps([envelope.to_dict()]), "post")
+        return self._send_request(
+            self._json.dumps([envelope.to_dict()]), "post"
+        )
 
-    def _send_request(self, data: str, request_type: str) -> requests.Response:
+    def _send_request(
+        self, data: bytes, request_type: str
+    ) -> requests.Response:
         try:
             url = "{0}/QuickPulseService.svc/{1}?ikey={2}".format(
                 utils.DEFAULT_LIVEMETRICS_ENDPOINT,
                 request_type,
                 self._instrumentation_key,
             )
-            response = requests.post(
-                url=url,
-                data=data,
-                headers={
-                    "Expect": "100-continue",
-                    "Content-Type": "application/json; charset=utf-8",
-                    utils.LIVE_METRICS_TRANSMISSION_TIME_HEADER: str(
-                        round(time.time()) * 1000
-                    ),
-                },
+            body, encoding = transport.encode_body(
+                data,
+                level=self._compression_level,
+                min_size=self._compression_min_size,
             )
+            headers = {
+                "Expect": "100-continue",
+                "Content-Type": "application/json; charset=utf-8",
+                utils.LIVE_METRICS_TRANSMISSION_TIME_HEADER: str(
+                    round(time.time()) * 1000
+                ),
+            }
+            if encoding:
+                headers["Content-Encoding"] = encoding
+            response = requests.post(url=url, data=body, headers=headers)
         except requests.exceptions.RequestException as ex:
             logger.warning("Failed to send live metrics: %s.", ex.strerror)
             return ex.response
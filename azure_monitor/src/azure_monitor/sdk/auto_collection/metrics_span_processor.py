@@ -2,22 +2,55 @@
 # Licensed under the MIT License.
 import collections
 import logging
+import math
+import threading
+import typing
 
 from opentelemetry.sdk.trace import Span, SpanProcessor
 from opentelemetry.trace import SpanKind
+from opentelemetry.trace.status import StatusCanonicalCode
 
+from azure_monitor import protocol, utils
 from azure_monitor.export.trace import convert_span_to_envelope
 
 logger = logging.getLogger(__name__)
 
+# span attribute, sent as envelope property, telling Application Insights
+# not to compute the standard metrics from the envelope
+PROCESSED_BY_METRIC_EXTRACTORS = "_MS.ProcessedByMetricExtractors"
+_REQUESTS_EXTRACTOR = "(Name:'Requests', Ver:'1.1')"
+_DEPENDENCIES_EXTRACTOR = "(Name:'Dependencies', Ver:'1.1')"
+# maximum number of series of each standard metric, the spans of new
+# series are then aggregated in a series with "Other" dimensions
+_MAX_SERIES = 1000
+_REQUEST_DIMENSIONS = ("request/resultCode", "Request.Success")
+_DEPENDENCY_DIMENSIONS = (
+    "dependency/resultCode",
+    "Dependency.Success",
+    "dependency/target",
+    "Dependency.Type",
+)
+
 
 class AzureMetricsSpanProcessor(SpanProcessor):
     """AzureMetricsSpanProcessor is an implementation of `SpanProcessor` used
     to generate Azure specific metrics, including dependencies/requests rate, average duration
     and failed dependencies/requests.
+
+    With ``standard_metrics`` it also aggregates the standard request and
+    dependency duration metrics of Application Insights over all the spans,
+    before they are sampled, and marks the spans so the metrics are not
+    computed again from their envelopes. It must then be added before the
+    span processors exporting the spans, and ``collect_standard_metrics``
+    given to an `AzureMonitorMetricsExporter` with
+    ``set_standard_metrics_source``, else the standard metrics are lost.
+
+    Args:
+        standard_metrics: Aggregates the standard metrics.
     """
 
-    def __init__(self):
+    def __init__(self, standard_metrics: bool = False):
+        self.standard_metrics = standard_metrics
         self.is_collecting_documents = False
         self.documents = collections.deque()
         self.request_count = 0
@@ -26,6 +59,8 @@ class AzureMetricsSpanProcessor(SpanProcessor):
         self.failed_dependency_count = 0
         self.request_duration = 0
         self.dependency_duration = 0
+        self._series = {}
+        self._series_lock = threading.Lock()
 
     def on_start(self, span: Span) -> None:
         pass
@@ -56,9 +91,128 @@ class AzureMetricsSpanProcessor(SpanProcessor):
                     if self.is_collecting_documents:
                         self.documents.append(convert_span_to_envelope(span))
 
+            if self.standard_metrics:
+                self._aggregate(span)
         # pylint: disable=broad-except
         except Exception:
             logger.exception("Exception while processing Span.")
 
     def shutdown(self) -> None:
         pass
+
+    def collect_standard_metrics(self) -> typing.List[protocol.MetricData]:
+        """Returns the standard metrics aggregated since the last call."""
+        with self._series_lock:
+            series = self._series
+            self._series = {}
+        context = utils.context_tags()
+        cloud = {
+            "cloud/roleName": context.get("ai.cloud.role"),
+            "cloud/roleInstance": context.get("ai.cloud.roleInstance"),
+        }
+        return [
+            _metric_data(is_request, dimensions, aggregate, cloud)
+            for (is_request, dimensions), aggregate in series.items()
+        ]
+
+    def _aggregate(self, span: Span) -> None:
+        """Adds the duration of a span to its standard metric series."""
+        is_request, dimensions = _dimensions(span)
+        duration = (span.end_time - span.start_time) / 1000000
+        key = (is_request, dimensions)
+        with self._series_lock:
+            series = self._series
+            aggregate = series.get(key)
+            if aggregate is None:
+                if len(series) >= _MAX_SERIES:
+                    # keeps the success dimension
+                    key = (
+                        is_request,
+                        tuple(
+                            value if index == 1 else "Other"
+                            for index, value in enumerate(dimensions)
+                        ),
+                    )
+                aggregate = series.setdefault(
+                    key, [0, 0.0, duration, duration, 0.0]
+                )
+            aggregate[0] += 1
+            aggregate[1] += duration
+            if duration < aggregate[2]:
+                aggregate[2] = duration
+            if duration > aggregate[3]:
+                aggregate[3] = duration
+            aggregate[4] += duration * duration
+        # the span has ended, its attributes can no longer be set through
+        # set_attribute
+        span.attributes[PROCESSED_BY_METRIC_EXTRACTORS] = (
+            _REQUESTS_EXTRACTOR if is_request else _DEPENDENCIES_EXTRACTOR
+        )
+
+
+def _dimensions(span: Span) -> typing.Tuple[bool, typing.Tuple]:
+    """Returns whether a span is a request and the dimensions of its
+    standard metric series."""
+    is_request = span.kind in utils.REQUEST_KINDS
+    attributes = span.attributes
+    canonical_code = span.status.canonical_code
+    status_code = attributes.get("http.status_code")
+    if status_code is not None and (
+        is_request or span.kind in utils.OUTGOING_KINDS
+    ):
+        result_code = str(status_code)
+        success = 200 <= status_code < 400
+    else:
+        result_code = str(canonical_code.value)
+        success = canonical_code == StatusCanonicalCode.OK
+    if is_request:
+        return is_request, (result_code, str(success))
+    target = None
+    dependency_type = None
+    if span.kind in utils.OUTGOING_KINDS:
+        if attributes.get("component") == "http":
+            dependency_type = "HTTP"
+        url = attributes.get("http.url")
+        if url is not None:
+            target = utils.parse_url(url)[0]
+    else:
+        dependency_type = "InProc"
+        success = True
+    return is_request, (result_code, str(success), target, dependency_type)
+
+
+def _metric_data(
+    is_request: bool,
+    dimensions: typing.Tuple,
+    aggregate: typing.List,
+    cloud: typing.Dict[str, str],
+) -> protocol.MetricData:
+    """Returns the standard metric of a series."""
+    count, total, minimum, maximum, squares = aggregate
+    if is_request:
+        name = "Server response time"
+        properties = dict(zip(_REQUEST_DIMENSIONS, dimensions))
+        properties["_MS.MetricId"] = "requests/duration"
+        properties["operation/synthetic"] = "False"
+    else:
+        name = "Dependency duration"
+        # an unknown target or type is left out rather than sent as null
+        properties = {
+            key: value
+            for key, value in zip(_DEPENDENCY_DIMENSIONS, dimensions)
+            if value is not None
+        }
+        properties["_MS.MetricId"] = "dependencies/duration"
+    properties["_MS.IsAutocollected"] = "True"
+    properties.update(cloud)
+    mean = total / count
+    data_point = protocol.DataPoint(
+        name=name,
+        kind=protocol.DataPointType.AGGREGATION.value,
+        value=total,
+        count=count,
+        min=minimum,
+        max=maximum,
+        std_dev=math.sqrt(max(squares / count - mean * mean, 0.0)),
+    )
+    return protocol.MetricData(metrics=[data_point], properties=properties)
@@ -1,19 +1,73 @@
 # Copyright (c) Microsoft Corporation. All rights reserved.
 # Licensed under the MIT License.
 
+import bisect
 import datetime
-import json
+import gzip
 import logging
 import os
 import random
+import threading
+import time
+import zlib
 
+from azure_monitor.json_backend import get_backend
 from azure_monitor.utils import PeriodicTask
 
 logger = logging.getLogger(__name__)
 
 
+_FORMAT = "%Y-%m-%dT%H%M%S.%f"
+_GZIP_MAGIC = b"\x1f\x8b"
+# seconds within which two changes of a folder may leave it with the same
+# modification time, on the coarsest file systems
+_MTIME_RESOLUTION = 2
+
+# Preset dictionary of the compressed blobs: fragments of the JSON of typical
+# envelopes, the most frequent last as zlib finds them at a shorter distance.
+# The zlib header of a blob holds the checksum of its dictionary, a new
+# dictionary must be added to _DICTIONARIES for older blobs to stay readable.
+_DICTIONARY = b"".join(
+    (
+        b'"measurements":{},"problemId":"","parsedStack":[],',
+        b'"name":"Microsoft.ApplicationInsights.Event",',
+        b'"baseType":"EventData"}}',
+        b'"exceptions":[{"id":1,"outerId":0,"typeName":"","message":"",',
+        b'"hasFullStack":true,"stack":"Traceback (most recent call last):',
+        b'\\n  File \\""}],"severityLevel":3,',
+        b'"name":"Microsoft.ApplicationInsights.Exception",',
+        b'"baseType":"ExceptionData"}}',
+        b'"name":"Microsoft.ApplicationInsights.Message",',
+        b'"message":"","severityLevel":1,"baseType":"MessageData"}}',
+        b'"name":"Microsoft.ApplicationInsights.Metric",',
+        b'"data":{"baseData":{"ver":2,"metrics":[{"ns":"","name":"",',
+        b'"kind":0,"value":0,"count":1,"min":0,"max":0,"stdDev":0}],',
+        b'"baseType":"MetricData"}}',
+        b'"name":"Microsoft.ApplicationInsights.Request",',
+        b'"responseCode":"200","success":true,"source":"","url":"https://',
+        b'"properties":{"request.name":"GET /","request.url":"https://',
+        b'"component":"http"}},"baseType":"RequestData"}}',
+        b'"name":"Microsoft.ApplicationInsights.RemoteDependency",',
+        b'"resultCode":"200","duration":"0.00:00:00.000","success":true,',
+        b'"data":"https://","type":"HTTP","target":"","properties":',
+        b'{"component":"http","peer.service":""}},',
+        b'"baseType":"RemoteDependencyData"}}',
+        b'[{"tags":{"ai.cloud.role":"","ai.cloud.roleInstance":"",',
+        b'"ai.device.id":"","ai.device.locale":"en_US",',
+        b'"ai.device.osVersion":"","ai.device.type":"Other",',
+        b'"ai.internal.sdkVersion":"py3:ot0:ext0","ai.operation.id":"',
+        b'","ai.operation.parentId":"","ai.operation.name":"GET /"},',
+        b'"name":"Microsoft.ApplicationInsights.',
+        b'","time":"2020-01-01T00:00:00.000000Z","iKey":"',
+        b'","data":{"baseData":{"ver":2,"name":"GET /","id":"',
+        b'","duration":"0.00:00:00.000","success":true,',
+    )
+)
+_DICTIONARIES = {zlib.adler32(_DICTIONARY): _DICTIONARY}
+
+
 def _fmt(timestamp):
-    return timestamp.strftime("%Y-%m-%dT%H%M%S.%f")
+    return timestamp.strftime(_FORMAT)
 
 
 def _now():
@@ -24,36 +78,144 @@ def _seconds(seconds):
     return datetime.timedelta(seconds=seconds)
 
 
+def _split_lease(name):
+    """Returns the blob name and lease deadline of a file name, the deadline
+    is None if the blob is not leased."""
+    if name.endswith(".lock"):
+        index = name.rindex("@")
+        return name[:index], name[index + 1 : -5]
+    return name, None
+
+
+def encode_batch(data, json):
+    """Returns the request body of a batch of envelopes, a JSON array."""
+    return b"".join((b"[", b",".join(json.dumps(item) for item in data), b"]"))
+
+
+def compress_body(data, level):
+    """Compresses a request body with zlib and the preset dictionary, a
+    gzipped body is returned as is."""
+    if data[:2] == _GZIP_MAGIC:
+        return data
+    compressor = zlib.compressobj(level, zdict=_DICTIONARY)
+    return compressor.compress(data) + compressor.flush()
+
+
+def decompress_body(content):
+    """Returns the request body of a blob compressed by `compress_body`,
+    other blobs are returned as is."""
+    if (
+        len(content) > 6
+        and content[0] & 0x0F == 8  # deflate
+        and content[1] & 0x20  # preset dictionary
+        and (content[0] << 8 | content[1]) % 31 == 0
+    ):
+        dictionary = _DICTIONARIES.get(int.from_bytes(content[2:6], "big"))
+        if dictionary is not None:
+            decompressor = zlib.decompressobj(zdict=dictionary)
+            return decompressor.decompress(content) + decompressor.flush()
+    return content
+
+
+def decode_batch(content, json):
+    """Returns the envelopes of a stored request body, compressed or not.
+
+    Blobs written by earlier versions hold an envelope per line.
+    """
+    content = decompress_body(content)
+    if content[:2] == _GZIP_MAGIC:
+        content = gzip.decompress(content)
+    if content.lstrip()[:1] == b"[":
+        return tuple(json.loads(content))
+    return tuple(
+        json.loads(line) for line in content.splitlines() if line.strip()
+    )
+
+
 # pylint: disable=broad-except
 class LocalFileBlob:
-    def __init__(self, fullpath):
+    """A batch stored in a file, as the body of the request sending it.
+
+    The exporters post the content of the file as is, it is only parsed
+    when the envelopes themselves are needed.
+    """
+
+    def __init__(self, fullpath, json_backend=None, storage=None):
         self.fullpath = fullpath
+        self.size = None  # bytes written by put
+        self._json = get_backend(json_backend)
+        self._storage = storage
+
+    @property
+    def name(self):
+        """File name of the blob, without its lease."""
+        name = os.path.basename(self.fullpath)
+        if name.endswith(".lock"):
+            name = name[: name.rindex("@")]
+        return name
+
+    @property
+    def created(self):
+        """UTC time the blob was written, None if the name is not parsable."""
+        try:
+            return datetime.datetime.strptime(
+                self.name.rsplit("-", 1)[0], _FORMAT
+            )
+        except ValueError:
+            return None
 
     def delete(self):
+        mtime = self._storage.folder_mtime() if self._storage else None
         try:
             os.remove(self.fullpath)
         except Exception:
             pass  # keep silent
+        if self._storage is not None:
+            self._storage.unindex(self.name, mtime)
 
     def get(self):
+        """Returns the envelopes of the batch."""
         try:
-            with open(self.fullpath, "r") as file:
-                return tuple(
-                    json.loads(line.strip()) for line in file.readlines()
-                )
+            with open(self.fullpath, "rb") as file:
+                return decode_batch(file.read(), self._json)
         except Exception:
             pass  # keep silent
 
+    def read(self):
+        """Returns the body of the request sending the batch, gzipped if it
+        was stored gzipped."""
+        try:
+            with open(self.fullpath, "rb") as file:
+                content = decompress_body(file.read())
+        except Exception:
+            return None  # keep silent
+        if content[:2] == _GZIP_MAGIC or content.lstrip()[:1] == b"[":
+            return content
+        # envelope per line written by earlier versions
+        return b"".join(
+            (
+                b"[",
+                b",".join(
+                    line for line in content.splitlines() if line.strip()
+                ),
+                b"]",
+            )
+        )
+
     def put(self, data, lease_period=0):
+        """Writes a request body, or the envelopes of one.
+
+        Args:
+            data: Bytes of the request body or envelopes.
+            lease_period: Seconds the blob is leased for once written.
+        """
         try:
             fullpath = self.fullpath + ".tmp"
-            with open(fullpath, "w") as file:
-                for item in data:
-                    file.write(json.dumps(item))
-                    # The official Python doc: Do not use os.linesep as a line
-                    # terminator when writing files opened in text mode (the
-                    # default); use a single '\n' instead, on all platforms.
-                    file.write("\n")
+            if not isinstance(data, bytes):
+                data = encode_batch(data, self._json)
+            with open(fullpath, "wb") as file:
+                file.write(data)
+            self.size = len(data)
             if lease_period:
                 timestamp = _now() + _seconds(lease_period)
                 self.fullpath += "@{}.lock".format(_fmt(timestamp))
@@ -67,17 +229,40 @@ class LocalFileBlob:
         fullpath = self.fullpath
         if fullpath.endswith(".lock"):
             fullpath = fullpath[: fullpath.rindex("@")]
-        fullpath += "@{}.lock".format(_fmt(timestamp))
+        deadline = _fmt(timestamp)
+        fullpath += "@{}.lock".format(deadline)
+        mtime = self._storage.folder_mtime() if self._storage else None
         try:
             os.rename(self.fullpath, fullpath)
         except Exception:
+            # deleted or leased by another storage sharing the folder
+            if self._storage is not None:
+                self._storage.unindex(self.name)
             return None
         self.fullpath = fullpath
+        if self._storage is not None:
+            self._storage.index(self.name, deadline, mtime=mtime)
         return self
 
 
 # pylint: disable=broad-except
 class LocalFileStorage:
+    """Stores batches of envelopes in files of a folder.
+
+    The blobs are indexed in memory, sorted by name hence by creation time,
+    with the deadline of their lease and their size. The index is built
+    from the folder at startup and updated when blobs are put, leased and
+    deleted. It is rebuilt by a maintenance only when the modification time
+    of the folder shows a change made by another storage sharing it, other
+    maintenances only delete the expired blobs of the index. Getting the
+    next blob is a lookup in the index instead of a listing of the folder,
+    and the size of the storage checked by put is a running total instead
+    of a sum over the files.
+
+    With ``compression_level``, the blobs are compressed with zlib and a
+    preset dictionary of common envelope content, and read decompressed.
+    """
+
     def __init__(
         self,
         path,
@@ -85,12 +270,25 @@ class LocalFileStorage:
         maintenance_period=60,  # 1 minute
         retention_period=7 * 24 * 60 * 60,  # 7 days
         write_timeout=60,  # 1 minute
+        json_backend=None,
+        compression_level=None,
     ):
         self.path = os.path.abspath(path)
+        self.json_backend = json_backend
+        self.compression_level = compression_level
+        self._json = get_backend(json_backend)
         self.max_size = max_size
         self.maintenance_period = maintenance_period
         self.retention_period = retention_period
         self.write_timeout = write_timeout
+        self._names = []
+        self._leases = {}
+        self._sizes = {}
+        self._size = 0
+        # modification time of the folder in sync with the index, None if
+        # unknown
+        self._mtime = None
+        self._lock = threading.Lock()
         self._maintenance_routine()
         self._maintenance_task = PeriodicTask(
             interval=self.maintenance_period,
@@ -99,6 +297,10 @@ class LocalFileStorage:
         self._maintenance_task.daemon = True
         self._maintenance_task.start()
 
+    def __contains__(self, name):
+        """Whether a blob of that name, without its lease, is stored."""
+        return name in self._sizes
+
     def close(self):
         self._maintenance_task.cancel()
         self._maintenance_task.join()
@@ -118,44 +320,201 @@ class LocalFileStorage:
         except Exception:
             pass  # keep silent
         try:
-            # pylint: disable=unused-variable
-            for blob in self.gets():
-                pass  # keep silent
+            if self.folder_mtime() in (None, self._mtime):
+                self._expire()
+            else:
+                self._load_index()
         except Exception:
             pass  # keep silent
 
-    def gets(self):
+    def folder_mtime(self):
+        """Returns the modification time of the folder, None if unknown."""
+        try:
+            return os.stat(self.path).st_mtime
+        except Exception:
+            return None
+
+    def _settled_mtime(self):
+        """Returns the modification time of the folder, None if a change may
+        still follow with the same time."""
+        mtime = self.folder_mtime()
+        if mtime is not None and time.time() - mtime < _MTIME_RESOLUTION:
+            return None
+        return mtime
+
+    def _load_index(self):
+        """Rebuilds the index and the size of the storage from the files of
+        the folder, removing the temporary files of failed writes and the
+        expired blobs."""
+        mtime = self._settled_mtime()
         now = _now()
-        lease_deadline = _fmt(now)
+        started = _fmt(now)
         retention_deadline = _fmt(now - _seconds(self.retention_period))
         timeout_deadline = _fmt(now - _seconds(self.write_timeout))
-        for name in sorted(os.listdir(self.path)):
-            path = os.path.join(self.path, name)
-            if not os.path.isfile(path):
-                continue  # skip if not a file
-            if path.endswith(".tmp"):
-                if name < timeout_deadline:
-                    try:
-                        os.remove(path)  # TODO: log data loss
-                    except Exception:
-                        pass  # keep silent
-            if path.endswith(".lock"):
-                if path[path.rindex("@") + 1 : -5] > lease_deadline:
-                    continue  # under lease
-                new_path = path[: path.rindex("@")]
+        leases = {}
+        sizes = {}
+        total = 0
+        for filename in os.listdir(self.path):
+            path = os.path.join(self.path, filename)
+            size = 0
+            # skip if it is symbolic link
+            if not os.path.islink(path):
                 try:
-                    os.rename(path, new_path)
-                except Exception:
-                    continue  # keep silent
-                path = new_path
-            if path.endswith(".blob"):
+                    size = os.path.getsize(path)
+                except OSError:
+                    logger.error(
+                        "Path %s does not exist or is inaccessible.", path,
+                    )
+                    continue
+            if filename.endswith(".tmp"):
+                if filename < timeout_deadline:
+                    self._remove(filename)
+                else:
+                    total += size
+                continue
+            name, deadline = _split_lease(filename)
+            if not name.endswith(".blob"):
+                continue
+            if name < retention_deadline:
+                self._remove(filename)  # TODO: log data loss
+                continue
+            total += size
+            sizes[name] = size
+            if deadline is not None:
+                leases[name] = deadline
+        with self._lock:
+            # keep the blobs put since the listing started
+            names = self._names
+            for name in names[bisect.bisect_right(names, started) :]:
+                if name not in sizes and name in self._sizes:
+                    sizes[name] = self._sizes[name]
+                    total += sizes[name]
+                    if name in self._leases:
+                        leases[name] = self._leases[name]
+            self._names = sorted(sizes)
+            self._leases = leases
+            self._sizes = sizes
+            self._size = total
+            self._mtime = mtime
+
+    def _remove(self, filename):
+        try:
+            os.remove(os.path.join(self.path, filename))
+        except Exception:
+            pass  # keep silent
+
+    def _track(self, mtime):
+        """Keeps the index in sync with the folder after the storage changed
+        it, if the folder was in sync with modification time ``mtime``
+        before. Called with the lock held."""
+        if mtime is not None and mtime == self._mtime:
+            self._mtime = self.folder_mtime()
+
+    def index(self, name, deadline=None, size=0, mtime=None):
+        """Adds a blob to the index or updates its lease.
+
+        Args:
+            name: File name of the blob, without its lease.
+            deadline: Deadline of the lease of the blob, None if not leased.
+            size: Size in bytes of a blob added.
+            mtime: Modification time of the folder before the blob was
+            written or leased by the storage, None if it was not.
+        """
+        with self._lock:
+            names = self._names
+            index = bisect.bisect_left(names, name)
+            if index == len(names) or names[index] != name:
+                names.insert(index, name)
+                self._sizes[name] = size
+                self._size += size
+            if deadline is None:
+                self._leases.pop(name, None)
+            else:
+                self._leases[name] = deadline
+            self._track(mtime)
+
+    def unindex(self, name, mtime=None):
+        """Removes a blob from the index.
+
+        Args:
+            name: File name of the blob, without its lease.
+            mtime: Modification time of the folder before the blob was
+            deleted by the storage, None if it was not.
+        """
+        with self._lock:
+            names = self._names
+            index = bisect.bisect_left(names, name)
+            if index < len(names) and names[index] == name:
+                del names[index]
+                self._size -= self._sizes.pop(name, 0)
+            self._leases.pop(name, None)
+            self._track(mtime)
+
+    def _remove_blob(self, index):
+        """Removes the blob at ``index`` of the index and its file, called
+        with the lock held."""
+        name = self._names.pop(index)
+        deadline = self._leases.pop(name, None)
+        self._size -= self._sizes.pop(name, 0)
+        mtime = self.folder_mtime()
+        self._remove(
+            name if deadline is None else "{}@{}.lock".format(name, deadline)
+        )
+        self._track(mtime)
+
+    def _expire(self):
+        """Deletes the blobs of the index older than the retention period."""
+        retention_deadline = _fmt(_now() - _seconds(self.retention_period))
+        with self._lock:
+            while self._names and self._names[0] < retention_deadline:
+                self._remove_blob(0)  # TODO: log data loss
+
+    def _next(self, after, last, lease_deadline, retention_deadline):
+        """Returns the file name of the first blob not under lease whose
+        name is after ``after`` and not after ``last``, None if there is
+        none."""
+        with self._lock:
+            names = self._names
+            leases = self._leases
+            index = 0 if after is None else bisect.bisect_right(names, after)
+            while index < len(names):
+                name = names[index]
+                if name > last:
+                    break
+                deadline = leases.get(name)
                 if name < retention_deadline:
-                    try:
-                        os.remove(path)  # TODO: log data loss
-                    except Exception:
-                        pass  # keep silent
+                    self._remove_blob(index)  # TODO: log data loss
+                elif deadline is None:
+                    return name
+                elif deadline <= lease_deadline:
+                    return "{}@{}.lock".format(name, deadline)
                 else:
-                    yield LocalFileBlob(path)
+                    index += 1  # under lease
+        return None
+
+    def gets(self):
+        now = _now()
+        lease_deadline = _fmt(now)
+        retention_deadline = _fmt(now - _seconds(self.retention_period))
+        with self._lock:
+            if not self._names:
+                return
+            # the blobs put while iterating are left to the next call
+            last = self._names[-1]
+        after = None
+        while True:
+            filename = self._next(
+                after, last, lease_deadline, retention_deadline
+            )
+            if filename is None:
+                return
+            after = _split_lease(filename)[0]
+            path = os.path.join(self.path, filename)
+            if not os.path.isfile(path):
+                # removed by another storage sharing the folder
+                self.unindex(after)
+                continue
+            yield LocalFileBlob(path, self.json_backend, self)
 
     def get(self):
         cursor = self.gets()
@@ -168,6 +527,13 @@ class LocalFileStorage:
     def put(self, data, lease_period=0):
         if not self._check_storage_size():
             return None
+        if self.compression_level is not None:
+            try:
+                if not isinstance(data, bytes):
+                    data = encode_batch(data, self._json)
+                data = compress_body(data, self.compression_level)
+            except Exception:
+                return None  # keep silent
         blob = LocalFileBlob(
             os.path.join(
                 self.path,
@@ -177,33 +543,26 @@ class LocalFileStorage:
                         random.getrandbits(32)
                     ),  # thread-safe random
                 ),
-            )
+            ),
+            self.json_backend,
+            self,
         )
-        return blob.put(data, lease_period=lease_period)
+        mtime = self.folder_mtime()
+        if blob.put(data, lease_period=lease_period) is None:
+            return None
+        name, deadline = _split_lease(os.path.basename(blob.fullpath))
+        self.index(name, deadline, blob.size, mtime)
+        return blob
 
     def _check_storage_size(self):
-        size = 0
-        # pylint: disable=unused-variable
-        for dirpath, dirnames, filenames in os.walk(self.path):
-            for filename in filenames:
-                path = os.path.join(dirpath, filename)
-                # skip if it is symbolic link
-                if not os.path.islink(path):
-                    try:
-                        size += os.path.getsize(path)
-                    except OSError:
-                        logger.error(
-                            "Path %s does not exist or is " "inaccessible.",
-                            path,
-                        )
-                        continue
-                    if size >= self.max_size:
-                        logger.warning(
-                            "Persistent storage max capacity has been "
-                            "reached. Currently at %fKB. Telemetry will be "
-                            "lost. Please consider increasing the value of "
-                            "'storage_max_size' in exporter config.",
-                            format(size / 1024),
-                        )
-                        return False
+        size = self._size
+        if size >= self.max_size:
+            logger.warning(
+                "Persistent storage max capacity has been "
+                "reached. Currently at %fKB. Telemetry will be "
+                "lost. Please consider increasing the value of "
+                "'storage_max_size' in exporter config.",
+                size / 1024,
+            )
+            return False
         return True
@@ -1,15 +1,20 @@
 # Copyright (c) Microsoft Corporation. All rights reserved.
 # Licensed under the MIT License.
+import functools
 import locale
+import math
 import os
 import platform
 import sys
 import threading
 import time
+from urllib.parse import urlparse
 
 # from opentelemetry.sdk.version import __version__ as opentelemetry_version
 import pkg_resources
+from opentelemetry.trace import SpanKind
 
+from azure_monitor.protocol import ContextTags, EnvelopeTags
 from azure_monitor.version import __version__ as ext_version
 
 # Workaround for missing version file
@@ -29,18 +34,86 @@ azure_monitor_context = {
     ),
 }
 
+# kinds of the spans sent as requests, and of the dependencies going out of
+# the process
+REQUEST_KINDS = (SpanKind.CONSUMER, SpanKind.SERVER)
+OUTGOING_KINDS = (SpanKind.CLIENT, SpanKind.PRODUCER)
+
+_context = dict(azure_monitor_context)
+_context_tags = ContextTags(_context)
+
+
+def context_tags() -> ContextTags:
+    """Returns `azure_monitor_context` as tags shared by envelopes.
+
+    The shared tags are built again when the context was modified.
+    """
+    global _context, _context_tags  # pylint: disable=global-statement
+    if _context != azure_monitor_context:
+        _context = dict(azure_monitor_context)
+        _context_tags = ContextTags(_context)
+    return _context_tags
+
+
+def envelope_tags() -> EnvelopeTags:
+    """Returns new envelope tags laid over the shared context tags."""
+    return EnvelopeTags(context_tags())
+
 
 def ns_to_duration(nanoseconds):
     value = (nanoseconds + 500000) // 1000000  # duration in milliseconds
+    if value < 60000:
+        # most spans last less than a minute
+        return "0.00:00:%02d.%03d" % divmod(value, 1000)
     value, microseconds = divmod(value, 1000)
     value, seconds = divmod(value, 60)
     value, minutes = divmod(value, 60)
     days, hours = divmod(value, 24)
-    return "{:d}.{:02d}:{:02d}:{:02d}.{:03d}".format(
-        days, hours, minutes, seconds, microseconds
+    return "%d.%02d:%02d:%02d.%03d" % (
+        days,
+        hours,
+        minutes,
+        seconds,
+        microseconds,
     )
 
 
+@functools.lru_cache(maxsize=64)
+def _iso_prefix(seconds):
+    return time.strftime("%Y-%m-%dT%H:%M:%S.", time.gmtime(seconds))
+
+
+def ns_to_iso_str(nanoseconds):
+    """Returns the ISO 8601 UTC time of a number of nanoseconds since the
+    epoch, exactly like `opentelemetry.sdk.util.ns_to_iso_str`.
+
+    The part up to the second is cached as telemetry items of a batch
+    mostly share it, only the microseconds are formatted every time.
+    """
+    # rounds the microseconds like datetime.utcfromtimestamp
+    fraction, seconds = math.modf(nanoseconds / 1e9)
+    microseconds = round(fraction * 1e6)
+    if microseconds >= 1000000:
+        seconds += 1
+        microseconds -= 1000000
+    return _iso_prefix(int(seconds)) + "%06dZ" % microseconds
+
+
+@functools.lru_cache(maxsize=1024)
+def format_trace_id(trace_id):
+    """Returns the 32 hex digits of a trace id, cached as the spans of a
+    trace share it."""
+    return format(trace_id, "032x")
+
+
+@functools.lru_cache(maxsize=1024)
+def parse_url(url):
+    """Returns the netloc and path of a URL, cached as dependency calls go
+    to a limited set of hosts and paths."""
+    parsed = urlparse(url)
+    return parsed.netloc, parsed.path
+
+
 class PeriodicTask(threading.Thread):
     """Thread that periodically calls a given function.
 
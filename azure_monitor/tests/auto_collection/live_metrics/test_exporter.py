@@ -76,6 +76,16 @@ class TestLiveMetricsExporter(unittest.TestCase):
             exporter._instrumentation_key, self._instrumentation_key
         )
 
+    def test_constructor_sender_options(self):
+        exporter = LiveMetricsExporter(
+            instrumentation_key=self._instrumentation_key,
+            span_processor=self._span_processor,
+            compression_level=6,
+            compression_min_size=0,
+        )
+        self.assertEqual(exporter._sender._compression_level, 6)
+        self.assertEqual(exporter._sender._compression_min_size, 0)
+
     def test_export(self):
         """Test export."""
         record = MetricRecord(
@@ -68,6 +68,22 @@ class TestLiveMetricsManager(unittest.TestCase):
             self.assertEqual(self._manager._meter, self._meter)
             self.assertIsNotNone(self._manager._ping)
 
+    def test_constructor_sender_options(self):
+        with mock.patch("requests.post"):
+            self._manager = LiveMetricsManager(
+                meter=self._meter,
+                instrumentation_key=self._instrumentation_key,
+                span_processor=self._span_processor,
+                compression_level=6,
+                json_backend="json",
+            )
+            sender = self._manager._exporter._sender
+            self.assertEqual(sender._compression_level, 6)
+            self.assertEqual(sender._json.name, "json")
+            sender = self._manager._ping.sender
+            self.assertEqual(sender._compression_level, 6)
+            self.assertEqual(sender._json.name, "json")
+
     def test_switch(self):
         """Test manager switch between ping and post."""
         with mock.patch("requests.post") as request:
@@ -120,6 +136,18 @@ class TestLiveMetricsManager(unittest.TestCase):
             self._ping.ping()
             self.assertTrue(self._ping.is_user_subscribed)
 
+    def test_ping_sender_options(self):
+        with mock.patch("requests.post") as request:
+            request.return_value = MockResponse(200, None, {})
+            self._ping = LiveMetricsPing(
+                instrumentation_key=self._instrumentation_key,
+                compression_level=6,
+                compression_min_size=0,
+            )
+            self._ping.ping()
+        headers = request.call_args[1]["headers"]
+        self.assertEqual(headers["Content-Encoding"], "gzip")
+
     def test_ping_error(self):
         """Test ping when failure."""
         with mock.patch("requests.post") as request:
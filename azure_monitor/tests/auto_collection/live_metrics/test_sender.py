@@ -1,6 +1,8 @@
 # Copyright (c) Microsoft Corporation. All rights reserved.
 # Licensed under the MIT License.
 
+import gzip
+import json
 import unittest
 from unittest import mock
 
@@ -74,3 +76,20 @@ class TestLiveMetricsSender(unittest.TestCase):
             self.assertTrue(
                 headers.get("x-ms-qps-transmission-time").isdigit()
             )
+
+    def test_post_compressed(self):
+        """Test post with a compressed body."""
+        sender = LiveMetricsSender(
+            instrumentation_key=self._instrumentation_key,
+            compression_level=6,
+            compression_min_size=0,
+        )
+        envelope = LiveMetricEnvelope()
+        with mock.patch("requests.post") as request:
+            sender.post(envelope)
+            headers = request.call_args[1].get("headers")
+            self.assertEqual(headers.get("Content-Encoding"), "gzip")
+            data = gzip.decompress(request.call_args[1].get("data"))
+            self.assertEqual(
+                json.loads(data.decode("utf-8")), [envelope.to_dict()]
+            )
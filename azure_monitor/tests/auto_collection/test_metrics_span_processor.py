@@ -2,11 +2,14 @@
 # Licensed under the MIT License.
 
 import unittest
+from unittest import mock
 
 from opentelemetry.sdk.trace import Span
 from opentelemetry.trace import SpanContext, SpanKind
 from opentelemetry.trace.status import Status, StatusCanonicalCode
 
+from azure_monitor import protocol
+from azure_monitor.export.trace import convert_span_to_envelope
 from azure_monitor.sdk.auto_collection.metrics_span_processor import (
     AzureMetricsSpanProcessor,
 )
@@ -136,3 +139,153 @@ class TestAutoCollection(unittest.TestCase):
         self.assertEqual(
             document.name, "Microsoft.ApplicationInsights.Request"
         )
+
+
+def make_span(kind, duration_ms, code=None, **attributes):
+    span = Span(
+        name="test",
+        kind=kind,
+        context=SpanContext(
+            trace_id=36873507687745823477771305566750195431,
+            span_id=12030755672171557338,
+            is_remote=False,
+        ),
+        attributes=attributes,
+    )
+    span.start(start_time=5000000)
+    if code is not None:
+        span.set_status(Status(code, "test"))
+    span.end(end_time=5000000 + duration_ms * 1000000)
+    return span
+
+
+def metrics_by_id(span_processor):
+    return {
+        (
+            metric.properties["_MS.MetricId"],
+            metric.properties.get("request/resultCode")
+            or metric.properties.get("dependency/resultCode"),
+        ): metric
+        for metric in span_processor.collect_standard_metrics()
+    }
+
+
+class TestStandardMetrics(unittest.TestCase):
+    def test_requests(self):
+        span_processor = AzureMetricsSpanProcessor(standard_metrics=True)
+        for duration in (10, 20, 30):
+            span_processor.on_end(
+                make_span(
+                    SpanKind.SERVER, duration, **{"http.status_code": 200}
+                )
+            )
+        span_processor.on_end(
+            make_span(SpanKind.CONSUMER, 40, StatusCanonicalCode.INTERNAL)
+        )
+        metrics = metrics_by_id(span_processor)
+        self.assertEqual(len(metrics), 2)
+        metric = metrics["requests/duration", "200"]
+        data_point = metric.metrics[0]
+        self.assertEqual(data_point.name, "Server response time")
+        self.assertEqual(data_point.kind, 1)
+        self.assertEqual(data_point.count, 3)
+        self.assertEqual(data_point.value, 60)
+        self.assertEqual(data_point.min, 10)
+        self.assertEqual(data_point.max, 30)
+        self.assertAlmostEqual(data_point.std_dev, 8.16496580927726)
+        self.assertEqual(metric.properties["Request.Success"], "True")
+        self.assertEqual(metric.properties["_MS.IsAutocollected"], "True")
+        self.assertIn("cloud/roleName", metric.properties)
+        self.assertIn("cloud/roleInstance", metric.properties)
+        metric = metrics["requests/duration", "13"]
+        self.assertEqual(metric.properties["Request.Success"], "False")
+        self.assertEqual(metric.metrics[0].count, 1)
+        # aggregates are reset once collected
+        self.assertEqual(span_processor.collect_standard_metrics(), [])
+
+    def test_dependencies(self):
+        span_processor = AzureMetricsSpanProcessor(standard_metrics=True)
+        span_processor.on_end(
+            make_span(
+                SpanKind.CLIENT,
+                5,
+                component="http",
+                **{
+                    "http.url": "https://example.com:8080/path",
+                    "http.status_code": 503,
+                }
+            )
+        )
+        span_processor.on_end(
+            make_span(SpanKind.INTERNAL, 7, StatusCanonicalCode.UNKNOWN)
+        )
+        metrics = metrics_by_id(span_processor)
+        properties = metrics["dependencies/duration", "503"].properties
+        self.assertEqual(properties["dependency/target"], "example.com:8080")
+        self.assertEqual(properties["Dependency.Type"], "HTTP")
+        self.assertEqual(properties["Dependency.Success"], "False")
+        properties = metrics["dependencies/duration", "2"].properties
+        self.assertEqual(properties["Dependency.Type"], "InProc")
+        self.assertEqual(properties["Dependency.Success"], "True")
+
+    def test_dependency_unknown_target(self):
+        span_processor = AzureMetricsSpanProcessor(standard_metrics=True)
+        span_processor.on_end(make_span(SpanKind.CLIENT, 5))
+        (metric,) = span_processor.collect_standard_metrics()
+        self.assertEqual(metric.properties["Dependency.Success"], "True")
+        self.assertNotIn("dependency/target", metric.properties)
+        self.assertNotIn("Dependency.Type", metric.properties)
+        self.assertNotIn(b"null", protocol.serialize(metric))
+
+    def test_envelopes_marked(self):
+        span_processor = AzureMetricsSpanProcessor(standard_metrics=True)
+        request = make_span(SpanKind.SERVER, 10)
+        dependency = make_span(SpanKind.CLIENT, 10)
+        span_processor.on_end(request)
+        span_processor.on_end(dependency)
+        envelope = convert_span_to_envelope(request)
+        self.assertEqual(
+            envelope.data.base_data.properties[
+                "_MS.ProcessedByMetricExtractors"
+            ],
+            "(Name:'Requests', Ver:'1.1')",
+        )
+        envelope = convert_span_to_envelope(dependency)
+        self.assertEqual(
+            envelope.data.base_data.properties[
+                "_MS.ProcessedByMetricExtractors"
+            ],
+            "(Name:'Dependencies', Ver:'1.1')",
+        )
+
+    def test_disabled_by_default(self):
+        span_processor = AzureMetricsSpanProcessor()
+        request = make_span(SpanKind.SERVER, 10)
+        span_processor.on_end(request)
+        self.assertEqual(span_processor.request_count, 1)
+        self.assertEqual(span_processor.collect_standard_metrics(), [])
+        self.assertNotIn("_MS.ProcessedByMetricExtractors", request.attributes)
+
+    def test_series_limit(self):
+        span_processor = AzureMetricsSpanProcessor(standard_metrics=True)
+        with mock.patch(
+            "azure_monitor.sdk.auto_collection.metrics_span_processor"
+            "._MAX_SERIES",
+            2,
+        ):
+            for status_code in (200, 201, 202, 203):
+                span_processor.on_end(
+                    make_span(
+                        SpanKind.SERVER,
+                        10,
+                        **{"http.status_code": status_code}
+                    )
+                )
+        metrics = metrics_by_id(span_processor)
+        self.assertEqual(
+            sorted(metrics),
+            [("requests/duration", code) for code in ("200", "201", "Other")],
+        )
+        self.assertEqual(
+            metrics["requests/duration", "Other"].metrics[0].count, 2
+        )
@@ -87,6 +87,7 @@ class TestAzureMetricsExporter(unittest.TestCase):
 
     @classmethod
     def tearDownClass(cls):
+        cls._exporter.shutdown()
         metrics._METER_PROVIDER = None
 
     def test_constructor(self):
@@ -100,6 +101,7 @@ class TestAzureMetricsExporter(unittest.TestCase):
             exporter.options.instrumentation_key,
             "4321abcd-5678-4efa-8abc-1234567890ab",
         )
+        exporter.shutdown()
 
     @mock.patch(
         "azure_monitor.export.metrics.AzureMonitorMetricsExporter._transmit"
@@ -154,6 +156,30 @@ class TestAzureMetricsExporter(unittest.TestCase):
         self.assertEqual(result, MetricsExportResult.FAILURE)
         self.assertEqual(logger_mock.exception.called, True)
 
+    @mock.patch(
+        "azure_monitor.export.metrics.AzureMonitorMetricsExporter._transmit"
+    )
+    def test_export_standard_metrics(self, transmit):
+        exporter = AzureMonitorMetricsExporter(storage_path=STORAGE_PATH)
+        data = MetricData(
+            metrics=[DataPoint(name="Server response time", kind=1, count=2)],
+            properties={"_MS.MetricId": "requests/duration"},
+        )
+        exporter.set_standard_metrics_source(lambda: [data])
+        transmit.return_value = ExportResult.SUCCESS
+        result = exporter.export([])
+        self.assertEqual(result, MetricsExportResult.SUCCESS)
+        (envelope,) = transmit.call_args[0][0]
+        self.assertEqual(envelope.name, "Microsoft.ApplicationInsights.Metric")
+        self.assertEqual(envelope.ikey, exporter.options.instrumentation_key)
+        self.assertEqual(envelope.data.base_type, "MetricData")
+        self.assertIs(envelope.data.base_data, data)
+        exporter.set_standard_metrics_source(throw(ValueError))
+        with mock.patch("azure_monitor.export.metrics.logger") as logger_mock:
+            exporter.export([])
+        self.assertTrue(logger_mock.exception.called)
+        exporter.shutdown()
+
     def test_metric_to_envelope_none(self):
         exporter = self._exporter
         self.assertIsNone(exporter._metric_to_envelope(None))
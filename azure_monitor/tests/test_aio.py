@@ -0,0 +1,382 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+
+import asyncio
+import gzip
+import json
+import os
+import shutil
+import threading
+import unittest
+from unittest import mock
+
+from opentelemetry.sdk.metrics.export import MetricsExportResult
+from opentelemetry.sdk.trace import Span
+from opentelemetry.sdk.trace.export import SpanExportResult
+from opentelemetry.trace import SpanContext
+
+from azure_monitor import protocol
+from azure_monitor.export import ExportResult
+from azure_monitor.export.aio import (
+    AsyncAzureMonitorMetricsExporter,
+    AsyncAzureMonitorSpanExporter,
+    AsyncBaseExporter,
+)
+
+TEST_FOLDER = os.path.abspath(".test.aio")
+
+
+# pylint: disable=invalid-name
+def setUpModule():
+    os.makedirs(TEST_FOLDER)
+
+
+# pylint: disable=invalid-name
+def tearDownModule():
+    shutil.rmtree(TEST_FOLDER)
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+class MockResponse:
+    def __init__(self, status, text="{}", headers=None):
+        self.status = status
+        self._text = text
+        self.headers = headers or {}
+
+    async def text(self):
+        return self._text
+
+
+class MockRequest:
+    def __init__(self, client, response):
+        self._client = client
+        self._response = response
+
+    async def __aenter__(self):
+        if isinstance(self._response, Exception):
+            raise self._response
+        self._client.in_flight += 1
+        self._client.max_in_flight = max(
+            self._client.max_in_flight, self._client.in_flight
+        )
+        await asyncio.sleep(0.01)
+        self._client.in_flight -= 1
+        return self._response
+
+    async def __aexit__(self, *args):
+        pass
+
+
+class MockClient:
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.closed = False
+
+    def post(self, url, **kwargs):
+        self.requests.append((url, kwargs))
+        response = self.responses.pop(0) if self.responses else 200
+        if isinstance(response, int):
+            response = MockResponse(response)
+        return MockRequest(self, response)
+
+    async def close(self):
+        self.closed = True
+
+
+def patch_client(client):
+    return mock.patch.object(
+        AsyncBaseExporter, "_create_client", return_value=client
+    )
+
+
+def make_span():
+    span = Span(
+        name="test",
+        context=SpanContext(
+            trace_id=36873507687745823477771305566750195431,
+            span_id=12030755672171557338,
+            is_remote=False,
+        ),
+    )
+    span.start()
+    span.end()
+    return span
+
+
+# pylint: disable=protected-access
+# pylint: disable=too-many-public-methods
+class TestAsyncExporters(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        os.environ[
+            "APPINSIGHTS_INSTRUMENTATIONKEY"
+        ] = "1234abcd-5678-4efa-8abc-1234567890ab"
+
+    def _exporter(self, cls=AsyncBaseExporter, **options):
+        return cls(
+            storage_path=os.path.join(TEST_FOLDER, self.id()), **options
+        )
+
+    def test_transmit_empty(self):
+        exporter = self._exporter()
+        result = run(exporter._transmit_async([]))
+        self.assertEqual(result, ExportResult.SUCCESS)
+        exporter.shutdown()
+
+    def test_transmit(self):
+        exporter = self._exporter()
+        client = MockClient(200)
+        with patch_client(client):
+            result = run(exporter._transmit_async([{"name": "test"}]))
+        self.assertEqual(result, ExportResult.SUCCESS)
+        url, kwargs = client.requests[0]
+        self.assertEqual(url, exporter.options.endpoint)
+        self.assertEqual(
+            json.loads(kwargs["data"].decode("utf-8")), [{"name": "test"}]
+        )
+        exporter.shutdown()
+
+    def test_transmit_without_aiohttp(self):
+        exporter = self._exporter()
+        with mock.patch(
+            "azure_monitor.export.aio.aiohttp", None
+        ), mock.patch.object(
+            exporter._circuit_breaker, "allow_request"
+        ) as allow_request:
+            self.assertRaises(
+                ImportError, run, exporter._transmit_async([{"name": "test"}])
+            )
+        self.assertFalse(allow_request.called)
+        exporter.shutdown()
+
+    def test_transmit_compressed_in_executor(self):
+        exporter = self._exporter(compression_level=6)
+        prepare_request = exporter._prepare_request
+        threads = []
+
+        def record_thread(*args):
+            threads.append(threading.current_thread())
+            return prepare_request(*args)
+
+        client = MockClient(200, 200)
+        large = [{"name": "x" * 100}] * 1000
+        with patch_client(client), mock.patch.object(
+            exporter, "_prepare_request", side_effect=record_thread
+        ):
+            run(exporter._transmit_async(large))
+            run(exporter._transmit_async([{"name": "x" * 2000}]))
+        self.assertIsNot(threads[0], threading.current_thread())
+        self.assertIs(threads[1], threading.current_thread())
+        for _, kwargs in client.requests:
+            self.assertEqual(kwargs["headers"]["Content-Encoding"], "gzip")
+        self.assertEqual(
+            json.loads(gzip.decompress(client.requests[0][1]["data"])), large
+        )
+        exporter.shutdown()
+
+    def test_transmit_retryable(self):
+        exporter = self._exporter()
+        with patch_client(MockClient(503)):
+            result = run(exporter._transmit_async([{"name": "test"}]))
+        self.assertEqual(result, ExportResult.FAILED_RETRYABLE)
+        exporter.shutdown()
+
+    def test_transmit_timeout(self):
+        exporter = self._exporter()
+        with patch_client(MockClient(asyncio.TimeoutError())):
+            result = run(exporter._transmit_async([{"name": "test"}]))
+        self.assertEqual(result, ExportResult.FAILED_RETRYABLE)
+        exporter.shutdown()
+
+    def test_transmit_exception(self):
+        exporter = self._exporter()
+        with patch_client(MockClient(Exception())):
+            result = run(exporter._transmit_async([{"name": "test"}]))
+        self.assertEqual(result, ExportResult.FAILED_RETRYABLE)
+        exporter.shutdown()
+
+    def test_transmit_206(self):
+        exporter = self._exporter()
+        response = MockResponse(
+            206,
+            json.dumps(
+                {"errors": [{"index": 0, "statusCode": 500, "message": ""}]}
+            ),
+        )
+        with patch_client(MockClient(response)):
+            result = run(exporter._transmit_async([{"name": "test"}]))
+        self.assertEqual(result, ExportResult.FAILED_NOT_RETRYABLE)
+        self.assertEqual(exporter.storage.get().get(), ({"name": "test"},))
+        exporter.shutdown()
+
+    def test_send_batch_retryable(self):
+        exporter = self._exporter()
+        with patch_client(MockClient(500)):
+            result = run(exporter._send_batch_async([{"name": "test"}]))
+        self.assertEqual(result, ExportResult.FAILED_RETRYABLE)
+        self.assertEqual(len(os.listdir(exporter.storage.path)), 1)
+        self.assertIsNone(exporter.storage.get())
+        exporter.shutdown()
+
+    def test_transmit_from_storage_concurrency(self):
+        exporter = self._exporter(transmission_concurrency=3)
+        for index in range(7):
+            exporter.storage.put([{"name": str(index)}])
+        client = MockClient()
+        with patch_client(client):
+            result = run(exporter._send_batch_async([{"name": "test"}]))
+        self.assertEqual(result, ExportResult.SUCCESS)
+        self.assertEqual(len(client.requests), 8)
+        self.assertEqual(client.max_in_flight, 3)
+        self.assertIsNone(exporter.storage.get())
+        exporter.shutdown()
+
+    def test_send_batch_chunks(self):
+        exporter = self._exporter(
+            transmission_max_items=1, transmission_concurrency=2
+        )
+        client = MockClient(200, 503, 200)
+        envelopes = [{"name": str(index)} for index in range(3)]
+        with patch_client(client):
+            result = run(exporter._send_batch_async(envelopes))
+        self.assertEqual(result, ExportResult.FAILED_RETRYABLE)
+        self.assertEqual(len(client.requests), 3)
+        self.assertEqual(client.max_in_flight, 2)
+        self.assertEqual(len(os.listdir(exporter.storage.path)), 1)
+        exporter.shutdown()
+
+    def test_transmit_blob_stored_body(self):
+        exporter = self._exporter()
+        blob = exporter.storage.put([{"name": "0"}, {"name": "1"}])
+        with open(blob.fullpath, "rb") as file:
+            body = file.read()
+        client = MockClient(200)
+        with patch_client(client):
+            run(exporter._transmit_from_storage_async())
+        self.assertEqual(len(client.requests), 1)
+        self.assertEqual(client.requests[0][1]["data"], body)
+        self.assertEqual(os.listdir(exporter.storage.path), [])
+        exporter.shutdown()
+
+    def test_transmit_from_storage_stops_on_failure(self):
+        exporter = self._exporter(transmission_concurrency=1)
+        for index in range(3):
+            exporter.storage.put([{"name": str(index)}])
+        client = MockClient(200, 503)
+        with patch_client(client):
+            run(exporter._send_batch_async([{"name": "test"}]))
+        self.assertEqual(len(client.requests), 2)
+        self.assertEqual(len(os.listdir(exporter.storage.path)), 3)
+        exporter.shutdown()
+
+    def test_transmit_retry_after(self):
+        exporter = self._exporter()
+        exporter.storage.put([{"name": "stored"}])
+        client = MockClient(MockResponse(429, "{}", {"Retry-After": "30"}))
+        with patch_client(client):
+            result = run(exporter._send_batch_async([{"name": "test"}]))
+            self.assertEqual(result, ExportResult.FAILED_RETRYABLE)
+            self.assertTrue(exporter._retry.paused)
+            run(exporter._transmit_from_storage_async())
+        self.assertEqual(len(client.requests), 1)
+        self.assertEqual(len(os.listdir(exporter.storage.path)), 2)
+        exporter.shutdown()
+
+    def test_send_batch_paused_by_retry_after(self):
+        exporter = self._exporter()
+        client = MockClient(MockResponse(429, "{}", {"Retry-After": "30"}))
+        with patch_client(client):
+            run(exporter._send_batch_async([{"name": "0"}]))
+            result = run(exporter._send_batch_async([{"name": "1"}]))
+        self.assertEqual(result, ExportResult.FAILED_RETRYABLE)
+        self.assertEqual(len(client.requests), 1)
+        self.assertEqual(len(os.listdir(exporter.storage.path)), 2)
+        exporter.shutdown()
+
+    def test_circuit_breaker(self):
+        exporter = self._exporter(circuit_breaker_threshold=1)
+        client = MockClient(503)
+        with patch_client(client):
+            run(exporter._send_batch_async([{"name": "0"}]))
+            result = run(exporter._send_batch_async([{"name": "1"}]))
+        self.assertEqual(result, ExportResult.FAILED_RETRYABLE)
+        self.assertEqual(len(client.requests), 1)
+        self.assertEqual(len(os.listdir(exporter.storage.path)), 2)
+        exporter.shutdown()
+
+    def test_shutdown(self):
+        exporter = self._exporter(connection_pool_size=5)
+        client = MockClient()
+
+        async def export_and_shutdown():
+            await exporter._transmit_async([{"name": "test"}])
+            await exporter.shutdown_async()
+
+        with patch_client(client):
+            run(export_and_shutdown())
+        self.assertTrue(client.closed)
+        self.assertIsNone(exporter._client)
+        self.assertIsNone(exporter._session)
+
+    def test_span_export(self):
+        exporter = self._exporter(AsyncAzureMonitorSpanExporter)
+        client = MockClient(200)
+        with patch_client(client):
+            result = run(exporter.export_async([make_span()]))
+        self.assertEqual(result, SpanExportResult.SUCCESS)
+        data = json.loads(client.requests[0][1]["data"].decode("utf-8"))
+        self.assertEqual(data[0]["data"]["baseData"]["name"], "test")
+        exporter.shutdown()
+
+    def test_span_export_exception(self):
+        exporter = self._exporter(AsyncAzureMonitorSpanExporter)
+        with mock.patch.object(
+            AsyncBaseExporter, "_send_batch_async", side_effect=Exception
+        ):
+            result = run(exporter.export_async([make_span()]))
+        self.assertEqual(result, SpanExportResult.FAILURE)
+        exporter.shutdown()
+
+    def test_metrics_export(self):
+        exporter = self._exporter(AsyncAzureMonitorMetricsExporter)
+        with patch_client(MockClient(200)):
+            result = run(exporter.export_async([]))
+        self.assertEqual(result, MetricsExportResult.SUCCESS)
+        exporter.shutdown()
+
+    def test_metrics_export_standard_metrics(self):
+        exporter = self._exporter(AsyncAzureMonitorMetricsExporter)
+        data = protocol.MetricData(
+            metrics=[protocol.DataPoint(name="Server response time")],
+            properties={"_MS.MetricId": "requests/duration"},
+        )
+        exporter.set_standard_metrics_source(lambda: [data])
+        client = MockClient(200)
+        with patch_client(client):
+            result = run(exporter.export_async([]))
+        self.assertEqual(result, MetricsExportResult.SUCCESS)
+        (envelope,) = json.loads(client.requests[0][1]["data"].decode("utf-8"))
+        self.assertEqual(
+            envelope["data"]["baseData"]["properties"]["_MS.MetricId"],
+            "requests/duration",
+        )
+        exporter.shutdown()
+
+    def test_metrics_export_exception(self):
+        exporter = self._exporter(AsyncAzureMonitorMetricsExporter)
+        with mock.patch.object(
+            AsyncBaseExporter, "_send_batch_async", side_effect=Exception
+        ):
+            result = run(exporter.export_async([]))
+        self.assertEqual(result, MetricsExportResult.FAILURE)
+        exporter.shutdown()
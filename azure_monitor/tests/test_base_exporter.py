@@ -1,21 +1,27 @@
 # Copyright (c) Microsoft Corporation. All rights reserved.
 # Licensed under the MIT License.
 
+import gzip
 import json
 import os
 import shutil
+import threading
+import time
 import unittest
+from concurrent.futures import ThreadPoolExecutor
 from unittest import mock
 
 import requests
 from opentelemetry.sdk.metrics.export import MetricsExportResult
 from opentelemetry.sdk.trace.export import SpanExportResult
 
+from azure_monitor import storage
 from azure_monitor.export import (
     BaseExporter,
     ExportResult,
     get_metrics_export_result,
     get_trace_export_result,
+    merge_results,
 )
 from azure_monitor.options import ExporterOptions
 from azure_monitor.protocol import Data, Envelope
@@ -42,6 +48,7 @@ def throw(exc_type, *args, **kwargs):
 
 
 # pylint: disable=W0212
+# pylint: disable=too-many-lines
 # pylint: disable=R0904
 class TestBaseExporter(unittest.TestCase):
     @classmethod
@@ -51,6 +58,10 @@ class TestBaseExporter(unittest.TestCase):
         ] = "1234abcd-5678-4efa-8abc-1234567890ab"
         cls._base = BaseExporter(storage_path=STORAGE_PATH)
 
+    @classmethod
+    def tearDownClass(cls):
+        cls._base.shutdown()
+
     def setUp(self):
         for filename in os.listdir(STORAGE_PATH):
             file_path = os.path.join(STORAGE_PATH, filename)
@@ -73,6 +84,9 @@ class TestBaseExporter(unittest.TestCase):
             storage_path=os.path.join(TEST_FOLDER, self.id()),
             storage_retention_period=4,
             timeout=5,
+            connection_pool_size=6,
+            connection_keep_alive=False,
+            connection_idle_timeout=7,
         )
         self.assertIsInstance(base.options, ExporterOptions)
         self.assertEqual(
@@ -86,9 +100,102 @@ class TestBaseExporter(unittest.TestCase):
         self.assertEqual(base.options.storage_max_size, 3)
         self.assertEqual(base.options.storage_retention_period, 4)
         self.assertEqual(base.options.timeout, 5)
+        self.assertEqual(base.options.connection_pool_size, 6)
+        self.assertFalse(base.options.connection_keep_alive)
+        self.assertEqual(base.options.connection_idle_timeout, 7)
+        self.assertEqual(base._session.pool_size, 6)
         self.assertEqual(
             base.options.storage_path, os.path.join(TEST_FOLDER, self.id())
         )
+        base.shutdown()
+
+    def test_shutdown(self):
+        base = BaseExporter(
+            storage_path=os.path.join(TEST_FOLDER, self.id()),
+            connection_pool_size=3,
+        )
+        session = base._session
+        self.assertIsNotNone(session)
+        with mock.patch.object(session, "close") as close:
+            base.shutdown()
+            self.assertTrue(close.called)
+        self.assertIsNone(base._session)
+
+    def test_shared_session(self):
+        base = BaseExporter(storage_path=os.path.join(TEST_FOLDER, self.id()))
+        base2 = BaseExporter(
+            storage_path=os.path.join(TEST_FOLDER, self.id() + "2")
+        )
+        self.assertIs(base._session, base2._session)
+        base.shutdown()
+        base2.shutdown()
+
+    def test_send(self):
+        exporter = BaseExporter(
+            storage_path=os.path.join(TEST_FOLDER, self.id())
+        )
+        self.assertIsNone(exporter._transmission)
+        with mock.patch.object(exporter, "_send_batch") as send_batch:
+            send_batch.return_value = ExportResult.FAILED_RETRYABLE
+            result = exporter._send([{"name": "test"}])
+        self.assertEqual(result, ExportResult.FAILED_RETRYABLE)
+        self.assertTrue(exporter.flush())
+        exporter.shutdown()
+
+    def test_send_batch_retryable(self):
+        exporter = BaseExporter(
+            storage_path=os.path.join(TEST_FOLDER, self.id())
+        )
+        with mock.patch.object(exporter, "_transmit") as transmit:
+            transmit.return_value = ExportResult.FAILED_RETRYABLE
+            exporter._send_batch([{"name": "test"}])
+        self.assertEqual(len(os.listdir(exporter.storage.path)), 1)
+        self.assertIsNone(exporter.storage.get())
+        exporter.shutdown()
+
+    def test_send_background(self):
+        exporter = BaseExporter(
+            storage_path=os.path.join(TEST_FOLDER, self.id()),
+            transmission_workers=1,
+        )
+        with mock.patch.object(exporter, "_transmit") as transmit:
+            transmit.return_value = ExportResult.FAILED_NOT_RETRYABLE
+            self.assertEqual(exporter._send([]), ExportResult.SUCCESS)
+            self.assertEqual(
+                exporter._send([{"name": "test"}]), ExportResult.SUCCESS
+            )
+            self.assertTrue(exporter.flush(5))
+            self.assertEqual(transmit.call_count, 1)
+            self.assertEqual(transmit.call_args[0][0], [{"name": "test"}])
+        exporter.shutdown(5)
+        self.assertEqual(
+            exporter._send([{"name": "test"}]),
+            ExportResult.FAILED_NOT_RETRYABLE,
+        )
+
+    def test_shutdown_timeout_keeps_session(self):
+        exporter = BaseExporter(
+            storage_path=os.path.join(TEST_FOLDER, self.id()),
+            transmission_workers=1,
+        )
+        started = threading.Event()
+        release = threading.Event()
+
+        def transmit(*_args):
+            started.set()
+            release.wait()
+            return ExportResult.SUCCESS
+
+        with mock.patch.object(exporter, "_transmit", side_effect=transmit):
+            exporter._send([{"name": "test"}])
+            started.wait(5)
+            exporter.shutdown(0.05)
+            # the batch being sent still uses the session
+            self.assertIsNotNone(exporter._session)
+            release.set()
+            exporter.shutdown(5)
+        self.assertTrue(exporter._transmission.stopped)
+        self.assertIsNone(exporter._session)
 
     def test_constructor_wrong_options(self):
         """Test the constructor with wrong options."""
@@ -120,7 +227,7 @@ class TestBaseExporter(unittest.TestCase):
 
     def test_telemetry_processor_apply_multiple(self):
         base = self._base
-        base._telemetry_processors = []
+        base.clear_telemetry_processors()
 
         def callback_function(envelope):
             envelope.data.base_type += "_world"
@@ -162,13 +269,81 @@ class TestBaseExporter(unittest.TestCase):
         self.assertEqual(len(envelopes), 1)
         self.assertEqual(envelopes[0].data.base_type, "type2")
 
+    def test_telemetry_processor_empty(self):
+        envelopes = [Envelope()]
+        self.assertIs(
+            self._base._apply_telemetry_processors(envelopes), envelopes
+        )
+
+    def test_telemetry_processor_batch(self):
+        base = self._base
+        calls = []
+
+        def batch_processor(envelopes):
+            calls.append(len(envelopes))
+            return [e for e in envelopes if e.data.base_type != "type1"]
+
+        def batch_in_place(envelopes):
+            envelopes.append(Envelope(data=Data(base_type="type3")))
+
+        base.add_telemetry_processor(lambda e: e.data.base_type != "type2")
+        base.add_telemetry_processor(batch_processor, batch=True)
+        base.add_telemetry_processor(batch_in_place, batch=True)
+        base.add_telemetry_processor(throw(ValueError), batch=True)
+        envelopes = base._apply_telemetry_processors(
+            [Envelope(data=Data(base_type=str(i))) for i in range(3)]
+            + [Envelope(data=Data(base_type="type" + str(i))) for i in (1, 2)]
+        )
+        self.assertEqual(calls, [4])
+        self.assertEqual(
+            [envelope.data.base_type for envelope in envelopes],
+            ["0", "1", "2", "type3"],
+        )
+        stats = base.get_stats()["telemetry_processors"]
+        self.assertEqual(
+            [
+                (s["batch"], s["calls"], s["dropped"], s["errors"])
+                for s in stats
+            ],
+            [
+                (False, 5, 1, 0),
+                (True, 1, 1, 0),
+                (True, 1, 0, 0),
+                (True, 1, 0, 1),
+            ],
+        )
+        self.assertEqual(stats[1]["name"], batch_processor.__qualname__)
+        self.assertTrue(all(s["seconds"] >= 0 for s in stats))
+
+    def test_telemetry_processor_add_during_export(self):
+        base = self._base
+        calls = []
+
+        def adding_processor(envelope):
+            calls.append(envelope)
+            base.add_telemetry_processor(calls.append)
+
+        base.add_telemetry_processor(adding_processor)
+        base._apply_telemetry_processors([Envelope(), Envelope()])
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(len(base._telemetry_processors), 3)
+
+    def test_telemetry_processor_stats_errors(self):
+        base = self._base
+        base.add_telemetry_processor(throw(ValueError))
+        envelopes = base._apply_telemetry_processors([Envelope(), Envelope()])
+        self.assertEqual(len(envelopes), 2)
+        stats = base.get_stats()["telemetry_processors"][0]
+        self.assertEqual((stats["calls"], stats["errors"]), (2, 2))
+
     def test_transmission_nothing(self):
         exporter = BaseExporter(
             storage_path=os.path.join(TEST_FOLDER, self.id())
         )
-        with mock.patch("requests.post") as post:
+        with mock.patch("requests.Session.post") as post:
             post.return_value = None
             exporter._transmit_from_storage()
+        exporter.shutdown()
 
     def test_transmit_request_timeout(self):
         exporter = BaseExporter(
@@ -176,10 +351,11 @@ class TestBaseExporter(unittest.TestCase):
         )
         envelopes_to_export = map(lambda x: x.to_dict(), tuple([Envelope()]))
         exporter.storage.put(envelopes_to_export)
-        with mock.patch("requests.post", throw(requests.Timeout)):
+        with mock.patch("requests.Session.post", throw(requests.Timeout)):
             exporter._transmit_from_storage()
         self.assertIsNone(exporter.storage.get())
         self.assertEqual(len(os.listdir(exporter.storage.path)), 1)
+        exporter.shutdown()
 
     def test_transmit_request_exception(self):
         exporter = BaseExporter(
@@ -187,12 +363,13 @@ class TestBaseExporter(unittest.TestCase):
         )
         envelopes_to_export = map(lambda x: x.to_dict(), tuple([Envelope()]))
         exporter.storage.put(envelopes_to_export)
-        with mock.patch("requests.post", throw(Exception)):
+        with mock.patch("requests.Session.post", throw(Exception)):
             exporter._transmit_from_storage()
         self.assertIsNone(exporter.storage.get())
         self.assertEqual(len(os.listdir(exporter.storage.path)), 1)
+        exporter.shutdown()
 
-    @mock.patch("requests.post", return_value=mock.Mock())
+    @mock.patch("requests.Session.post", return_value=mock.Mock())
     def test_transmission_lease_failure(self, requests_mock):
         requests_mock.return_value = MockResponse(200, "unknown")
         exporter = BaseExporter(
@@ -206,6 +383,7 @@ class TestBaseExporter(unittest.TestCase):
             lease.return_value = False
             exporter._transmit_from_storage()
         self.assertTrue(exporter.storage.get())
+        exporter.shutdown()
 
     def test_transmission(self):
         exporter = BaseExporter(
@@ -213,12 +391,13 @@ class TestBaseExporter(unittest.TestCase):
         )
         envelopes_to_export = map(lambda x: x.to_dict(), tuple([Envelope()]))
         exporter.storage.put(envelopes_to_export)
-        with mock.patch("requests.post") as post:
+        with mock.patch("requests.Session.post") as post:
             post.return_value = MockResponse(200, None)
             del post.return_value.text
             exporter._transmit_from_storage()
         self.assertIsNone(exporter.storage.get())
         self.assertEqual(len(os.listdir(exporter.storage.path)), 0)
+        exporter.shutdown()
 
     def test_transmission_200(self):
         exporter = BaseExporter(
@@ -226,11 +405,43 @@ class TestBaseExporter(unittest.TestCase):
         )
         envelopes_to_export = map(lambda x: x.to_dict(), tuple([Envelope()]))
         exporter.storage.put(envelopes_to_export)
-        with mock.patch("requests.post") as post:
+        with mock.patch("requests.Session.post") as post:
             post.return_value = MockResponse(200, "unknown")
             exporter._transmit_from_storage()
         self.assertIsNone(exporter.storage.get())
         self.assertEqual(len(os.listdir(exporter.storage.path)), 0)
+        exporter.shutdown()
+
+    def test_transmission_compressed(self):
+        exporter = BaseExporter(
+            storage_path=os.path.join(TEST_FOLDER, self.id()),
+            compression_level=6,
+            compression_min_size=0,
+        )
+        envelopes_to_export = [Envelope(name="test").to_dict()]
+        with mock.patch("requests.Session.post") as post:
+            post.return_value = MockResponse(200, "unknown")
+            exporter._transmit(envelopes_to_export)
+        headers = post.call_args[1]["headers"]
+        self.assertEqual(headers["Content-Encoding"], "gzip")
+        data = gzip.decompress(post.call_args[1]["data"])
+        self.assertEqual(json.loads(data.decode("utf-8")), envelopes_to_export)
+        exporter.shutdown()
+
+    def test_transmission_not_compressed(self):
+        exporter = BaseExporter(
+            storage_path=os.path.join(TEST_FOLDER, self.id()),
+            compression_level=6,
+        )
+        envelopes_to_export = [Envelope(name="test").to_dict()]
+        with mock.patch("requests.Session.post") as post:
+            post.return_value = MockResponse(200, "unknown")
+            exporter._transmit(envelopes_to_export)
+        headers = post.call_args[1]["headers"]
+        self.assertNotIn("Content-Encoding", headers)
+        data = post.call_args[1]["data"]
+        self.assertEqual(json.loads(data.decode("utf-8")), envelopes_to_export)
+        exporter.shutdown()
 
     def test_transmission_206(self):
         exporter = BaseExporter(
@@ -238,11 +449,12 @@ class TestBaseExporter(unittest.TestCase):
         )
         envelopes_to_export = map(lambda x: x.to_dict(), tuple([Envelope()]))
         exporter.storage.put(envelopes_to_export)
-        with mock.patch("requests.post") as post:
+        with mock.patch("requests.Session.post") as post:
             post.return_value = MockResponse(206, "unknown")
             exporter._transmit_from_storage()
         self.assertIsNone(exporter.storage.get())
         self.assertEqual(len(os.listdir(exporter.storage.path)), 1)
+        exporter.shutdown()
 
     def test_transmission_206_500(self):
         exporter = BaseExporter(
@@ -254,7 +466,7 @@ class TestBaseExporter(unittest.TestCase):
             tuple([Envelope(), Envelope(), test_envelope]),
         )
         exporter.storage.put(envelopes_to_export)
-        with mock.patch("requests.post") as post:
+        with mock.patch("requests.Session.post") as post:
             post.return_value = MockResponse(
                 206,
                 json.dumps(
@@ -277,6 +489,7 @@ class TestBaseExporter(unittest.TestCase):
         self.assertEqual(
             exporter.storage.get().get()[0]["name"], "testEnvelope"
         )
+        exporter.shutdown()
 
     def test_transmission_206_no_retry(self):
         exporter = BaseExporter(
@@ -284,7 +497,7 @@ class TestBaseExporter(unittest.TestCase):
         )
         envelopes_to_export = map(lambda x: x.to_dict(), tuple([Envelope()]))
         exporter.storage.put(envelopes_to_export)
-        with mock.patch("requests.post") as post:
+        with mock.patch("requests.Session.post") as post:
             post.return_value = MockResponse(
                 206,
                 json.dumps(
@@ -299,6 +512,7 @@ class TestBaseExporter(unittest.TestCase):
             )
             exporter._transmit_from_storage()
         self.assertEqual(len(os.listdir(exporter.storage.path)), 0)
+        exporter.shutdown()
 
     def test_transmission_206_bogus(self):
         exporter = BaseExporter(
@@ -306,7 +520,7 @@ class TestBaseExporter(unittest.TestCase):
         )
         envelopes_to_export = map(lambda x: x.to_dict(), tuple([Envelope()]))
         exporter.storage.put(envelopes_to_export)
-        with mock.patch("requests.post") as post:
+        with mock.patch("requests.Session.post") as post:
             post.return_value = MockResponse(
                 206,
                 json.dumps(
@@ -320,6 +534,7 @@ class TestBaseExporter(unittest.TestCase):
             exporter._transmit_from_storage()
         self.assertIsNone(exporter.storage.get())
         self.assertEqual(len(os.listdir(exporter.storage.path)), 0)
+        exporter.shutdown()
 
     def test_transmission_400(self):
         exporter = BaseExporter(
@@ -327,10 +542,11 @@ class TestBaseExporter(unittest.TestCase):
         )
         envelopes_to_export = map(lambda x: x.to_dict(), tuple([Envelope()]))
         exporter.storage.put(envelopes_to_export)
-        with mock.patch("requests.post") as post:
+        with mock.patch("requests.Session.post") as post:
             post.return_value = MockResponse(400, "{}")
             exporter._transmit_from_storage()
         self.assertEqual(len(os.listdir(exporter.storage.path)), 0)
+        exporter.shutdown()
 
     def test_transmission_439(self):
         exporter = BaseExporter(
@@ -338,11 +554,12 @@ class TestBaseExporter(unittest.TestCase):
         )
         envelopes_to_export = map(lambda x: x.to_dict(), tuple([Envelope()]))
         exporter.storage.put(envelopes_to_export)
-        with mock.patch("requests.post") as post:
+        with mock.patch("requests.Session.post") as post:
             post.return_value = MockResponse(439, "{}")
             exporter._transmit_from_storage()
         self.assertIsNone(exporter.storage.get())
         self.assertEqual(len(os.listdir(exporter.storage.path)), 1)
+        exporter.shutdown()
 
     def test_transmission_500(self):
         exporter = BaseExporter(
@@ -350,11 +567,12 @@ class TestBaseExporter(unittest.TestCase):
         )
         envelopes_to_export = map(lambda x: x.to_dict(), tuple([Envelope()]))
         exporter.storage.put(envelopes_to_export)
-        with mock.patch("requests.post") as post:
+        with mock.patch("requests.Session.post") as post:
             post.return_value = MockResponse(500, "{}")
             exporter._transmit_from_storage()
         self.assertIsNone(exporter.storage.get())
         self.assertEqual(len(os.listdir(exporter.storage.path)), 1)
+        exporter.shutdown()
 
     def test_transmission_empty(self):
         exporter = BaseExporter(
@@ -362,6 +580,400 @@ class TestBaseExporter(unittest.TestCase):
         )
         status = exporter._transmit([])
         self.assertEqual(status, ExportResult.SUCCESS)
+        exporter.shutdown()
+
+    def test_transmit_chunks(self):
+        exporter = BaseExporter(
+            storage_path=os.path.join(TEST_FOLDER, self.id()),
+            transmission_max_items=2,
+        )
+        envelopes = [{"name": str(index)} for index in range(5)]
+        with mock.patch("requests.Session.post") as post:
+            post.return_value = MockResponse(200, "{}")
+            results = exporter._transmit_chunks(envelopes)
+        self.assertEqual(post.call_count, 3)
+        self.assertEqual(
+            [json.loads(data.decode("utf-8")) for data, _ in results],
+            [envelopes[0:2], envelopes[2:4], envelopes[4:]],
+        )
+        self.assertEqual(
+            [result for _, result in results], [ExportResult.SUCCESS] * 3
+        )
+        exporter.shutdown()
+
+    def test_transmit_chunks_single_executor(self):
+        exporter = BaseExporter(
+            storage_path=os.path.join(TEST_FOLDER, self.id()),
+            transmission_max_items=1,
+        )
+        executors = []
+
+        def make_executor(**kwargs):
+            time.sleep(0.01)  # widens the window of a race
+            executors.append(ThreadPoolExecutor(**kwargs))
+            return executors[-1]
+
+        envelopes = [{"name": "a"}, {"name": "b"}]
+        threads = [
+            threading.Thread(
+                target=exporter._transmit_chunks, args=(envelopes,)
+            )
+            for _ in range(4)
+        ]
+        with mock.patch(
+            "azure_monitor.export.ThreadPoolExecutor",
+            side_effect=make_executor,
+        ), mock.patch.object(
+            exporter, "_transmit", return_value=ExportResult.SUCCESS
+        ):
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(executors), 1)
+        exporter.shutdown()
+
+    def test_send_batch_partial_retry(self):
+        exporter = BaseExporter(
+            storage_path=os.path.join(TEST_FOLDER, self.id()),
+            transmission_max_items=1,
+        )
+
+        def transmit(envelopes, _data=None):
+            if envelopes[0]["name"] == "retry":
+                return ExportResult.FAILED_RETRYABLE
+            return ExportResult.SUCCESS
+
+        with mock.patch.object(exporter, "_transmit", side_effect=transmit):
+            result = exporter._send_batch(
+                [{"name": "ok"}, {"name": "retry"}, {"name": "ok"}]
+            )
+        self.assertEqual(result, ExportResult.FAILED_RETRYABLE)
+        self.assertEqual(len(os.listdir(exporter.storage.path)), 1)
+        blob = exporter.storage.get()
+        self.assertIsNone(blob)
+        exporter.shutdown()
+
+    def test_transmission_stored_body(self):
+        exporter = BaseExporter(
+            storage_path=os.path.join(TEST_FOLDER, self.id())
+        )
+        blob = exporter.storage.put([{"name": "a"}, {"name": "b"}])
+        with open(blob.fullpath, "rb") as file:
+            body = file.read()
+        with mock.patch(
+            "azure_monitor.export.decode_batch", side_effect=AssertionError
+        ):
+            with mock.patch("requests.Session.post") as post:
+                post.return_value = MockResponse(200, "{}")
+                exporter._transmit_from_storage()
+        # posted as stored, without parsing it
+        self.assertEqual(post.call_args[1]["data"], body)
+        self.assertIsNone(exporter.storage.get())
+        exporter.shutdown()
+
+    def test_transmission_stored_compressed(self):
+        exporter = BaseExporter(
+            storage_path=os.path.join(TEST_FOLDER, self.id()),
+            compression_level=6,
+            compression_min_size=0,
+        )
+        envelopes = [{"name": "test"}]
+        with mock.patch("requests.Session.post") as post:
+            post.return_value = MockResponse(500, "{}")
+            exporter._send_batch(envelopes)
+        later = storage._now() + storage._seconds(2)
+        with mock.patch("azure_monitor.storage._now", return_value=later):
+            blob = exporter.storage.get()
+            self.assertEqual(blob.get(), tuple(envelopes))
+            body = blob.read()
+            self.assertEqual(gzip.decompress(body), b'[{"name":"test"}]')
+            with mock.patch("requests.Session.post") as post:
+                post.return_value = MockResponse(200, "{}")
+                exporter._transmit_from_storage()
+        self.assertEqual(post.call_args[1]["data"], body)
+        self.assertEqual(
+            post.call_args[1]["headers"]["Content-Encoding"], "gzip"
+        )
+        self.assertIsNone(exporter.storage.get())
+        exporter.shutdown()
+
+    def test_transmission_stored_partial(self):
+        exporter = BaseExporter(
+            storage_path=os.path.join(TEST_FOLDER, self.id())
+        )
+        exporter.storage.put([{"name": "ok"}, {"name": "retry"}])
+        with mock.patch("requests.Session.post") as post:
+            post.return_value = MockResponse(
+                206,
+                json.dumps(
+                    {
+                        "itemsReceived": 2,
+                        "itemsAccepted": 1,
+                        "errors": [
+                            {"index": 1, "statusCode": 500, "message": ""}
+                        ],
+                    }
+                ),
+            )
+            exporter._transmit_from_storage()
+        self.assertEqual(post.call_count, 1)
+        # only the partial success parses the stored body
+        self.assertEqual(exporter.storage.get().get(), ({"name": "retry"},))
+        exporter.shutdown()
+
+    def test_transmission_storage_compression(self):
+        exporter = BaseExporter(
+            storage_path=os.path.join(TEST_FOLDER, self.id()),
+            storage_compression_level=6,
+        )
+        self.assertEqual(exporter.storage.compression_level, 6)
+        blob = exporter.storage.put([{"name": "test"}])
+        with open(blob.fullpath, "rb") as file:
+            self.assertEqual(file.read(1), b"x")
+        with mock.patch("requests.Session.post") as post:
+            post.return_value = MockResponse(200, "{}")
+            exporter._transmit_from_storage()
+        # sent decompressed
+        self.assertEqual(post.call_args[1]["data"], b'[{"name":"test"}]')
+        self.assertIsNone(exporter.storage.get())
+        exporter.shutdown()
+
+    def test_spill_split(self):
+        exporter = BaseExporter(
+            storage_path=os.path.join(TEST_FOLDER, self.id()),
+            transmission_max_items=1,
+        )
+        exporter._store_envelopes([{"name": "a"}, {"name": "b"}])
+        self.assertEqual(
+            sorted((blob.get() for blob in exporter.storage.gets()), key=str),
+            [({"name": "a"},), ({"name": "b"},)],
+        )
+        exporter.shutdown()
+
+    def test_transmission_backoff(self):
+        exporter = BaseExporter(
+            storage_path=os.path.join(TEST_FOLDER, self.id())
+        )
+        blob = exporter.storage.put([{"name": "test"}])
+        with mock.patch("requests.Session.post") as post:
+            post.return_value = MockResponse(500, "{}")
+            exporter._transmit_from_storage()
+            self.assertEqual(exporter._retry.attempts(blob.name), 2)
+            # leased for the backoff of the second attempt
+            later = storage._now() + storage._seconds(0.9)
+            with mock.patch("azure_monitor.storage._now", return_value=later):
+                self.assertIsNone(exporter.storage.get())
+            later = storage._now() + storage._seconds(2.1)
+            with mock.patch("azure_monitor.storage._now", return_value=later):
+                exporter._transmit_from_storage()
+            self.assertEqual(exporter._retry.attempts(blob.name), 3)
+            post.return_value = MockResponse(200, "{}")
+            later = storage._now() + storage._seconds(6.2)
+            with mock.patch("azure_monitor.storage._now", return_value=later):
+                exporter._transmit_from_storage()
+        self.assertEqual(post.call_count, 3)
+        self.assertEqual(exporter._retry.attempts(blob.name), 0)
+        self.assertEqual(len(os.listdir(exporter.storage.path)), 0)
+        exporter.shutdown()
+
+    def test_transmission_retry_after(self):
+        exporter = BaseExporter(
+            storage_path=os.path.join(TEST_FOLDER, self.id())
+        )
+        exporter.storage.put([{"name": "0"}])
+        exporter.storage.put([{"name": "1"}])
+        with mock.patch("requests.Session.post") as post:
+            post.return_value = MockResponse(429, "{}", {"Retry-After": "30"})
+            exporter._transmit_from_storage()
+            self.assertTrue(exporter._retry.paused)
+            later = storage._now() + storage._seconds(20)
+            with mock.patch("azure_monitor.storage._now", return_value=later):
+                exporter._transmit_from_storage()
+                self.assertIsNotNone(exporter.storage.get())
+        self.assertEqual(post.call_count, 1)
+        exporter.shutdown()
+
+    def test_send_batch_retry_after(self):
+        exporter = BaseExporter(
+            storage_path=os.path.join(TEST_FOLDER, self.id())
+        )
+        with mock.patch("requests.Session.post") as post:
+            post.return_value = MockResponse(503, "{}", {"Retry-After": "60"})
+            result = exporter._send_batch([{"name": "test"}])
+        self.assertEqual(result, ExportResult.FAILED_RETRYABLE)
+        later = storage._now() + storage._seconds(50)
+        with mock.patch("azure_monitor.storage._now", return_value=later):
+            self.assertIsNone(exporter.storage.get())
+        exporter.shutdown()
+
+    def test_send_batch_paused_by_retry_after(self):
+        exporter = BaseExporter(
+            storage_path=os.path.join(TEST_FOLDER, self.id())
+        )
+        with mock.patch("requests.Session.post") as post:
+            post.return_value = MockResponse(429, "{}", {"Retry-After": "30"})
+            exporter._send_batch([{"name": "0"}])
+            result = exporter._send_batch([{"name": "1"}])
+        self.assertEqual(result, ExportResult.FAILED_RETRYABLE)
+        self.assertEqual(post.call_count, 1)
+        self.assertEqual(len(os.listdir(exporter.storage.path)), 2)
+        self.assertEqual(
+            exporter._circuit_breaker.stats()["consecutive_failures"], 1
+        )
+        exporter.shutdown()
+
+    def test_transmission_max_batches(self):
+        exporter = BaseExporter(
+            storage_path=os.path.join(TEST_FOLDER, self.id()),
+            retry_max_batches=2,
+        )
+        for index in range(3):
+            exporter.storage.put([{"name": str(index)}])
+        with mock.patch("requests.Session.post") as post:
+            post.return_value = MockResponse(200, "{}")
+            exporter._transmit_from_storage()
+        self.assertEqual(post.call_count, 2)
+        self.assertEqual(len(os.listdir(exporter.storage.path)), 1)
+        exporter.shutdown()
+
+    def test_transmission_max_age(self):
+        exporter = BaseExporter(
+            storage_path=os.path.join(TEST_FOLDER, self.id()),
+            retry_max_age=60,
+        )
+        name = "{}-00000000.blob".format(
+            storage._fmt(storage._now() - storage._seconds(120))
+        )
+        storage.LocalFileBlob(os.path.join(exporter.storage.path, name)).put(
+            [{"name": "old"}]
+        )
+        # blobs written to the folder by others are indexed on maintenance
+        exporter.storage._maintenance_routine()
+        exporter.storage.put([{"name": "new"}])
+        with mock.patch("requests.Session.post") as post:
+            post.return_value = MockResponse(200, "{}")
+            exporter._transmit_from_storage()
+        self.assertEqual(post.call_count, 1)
+        self.assertEqual(
+            json.loads(post.call_args[1]["data"].decode("utf-8")),
+            [{"name": "new"}],
+        )
+        self.assertEqual(len(os.listdir(exporter.storage.path)), 0)
+        exporter.shutdown()
+
+    def test_retry_interval(self):
+        exporter = BaseExporter(
+            storage_path=os.path.join(TEST_FOLDER, self.id()),
+            retry_interval=0.01,
+        )
+        with mock.patch.object(
+            exporter, "_transmit_from_storage", side_effect=Exception
+        ) as transmit:
+            for _ in range(500):
+                if transmit.call_count >= 2:
+                    break
+                time.sleep(0.01)
+        exporter.shutdown()
+        self.assertGreaterEqual(transmit.call_count, 2)
+
+    def test_transmit_from_storage_prunes_attempts(self):
+        exporter = BaseExporter(
+            storage_path=os.path.join(TEST_FOLDER, self.id())
+        )
+        blob = exporter.storage.put([{"name": "test"}], lease_period=60)
+        exporter._retry.record_failure(blob.name)
+        exporter._retry.record_failure("removed by retention")
+        exporter._transmit_from_storage()
+        self.assertEqual(exporter._retry.attempts(blob.name), 2)
+        self.assertEqual(exporter._retry.attempts("removed by retention"), 0)
+        exporter.shutdown()
+
+    def test_retry_interval_default(self):
+        exporter = BaseExporter(
+            storage_path=os.path.join(TEST_FOLDER, self.id())
+        )
+        # no background retries unless asked for
+        self.assertIsNone(exporter._retry_task)
+        exporter.shutdown()
+
+    def test_circuit_breaker(self):
+        exporter = BaseExporter(
+            storage_path=os.path.join(TEST_FOLDER, self.id()),
+            circuit_breaker_threshold=2,
+        )
+        with mock.patch("requests.Session.post", throw(requests.Timeout)):
+            for _ in range(2):
+                exporter._send_batch([{"name": "test"}])
+        with mock.patch("requests.Session.post") as post:
+            result = exporter._send_batch([{"name": "test"}])
+            exporter._transmit_from_storage()
+        self.assertEqual(result, ExportResult.FAILED_RETRYABLE)
+        post.assert_not_called()
+        self.assertEqual(len(os.listdir(exporter.storage.path)), 3)
+        stats = exporter.get_stats()["circuit_breaker"]
+        self.assertEqual(stats["state"], "open")
+        self.assertEqual(stats["rejected_requests"], 1)
+        exporter.shutdown()
+
+    def test_circuit_breaker_probe(self):
+        exporter = BaseExporter(
+            storage_path=os.path.join(TEST_FOLDER, self.id()),
+            circuit_breaker_threshold=1,
+            circuit_breaker_recovery_timeout=0,
+        )
+        with mock.patch("requests.Session.post") as post:
+            post.return_value = MockResponse(503, "{}")
+            self.assertEqual(
+                exporter._transmit([{"name": "test"}]),
+                ExportResult.FAILED_RETRYABLE,
+            )
+            post.return_value = MockResponse(200, "{}")
+            self.assertEqual(
+                exporter._transmit([{"name": "test"}]), ExportResult.SUCCESS
+            )
+        self.assertEqual(post.call_count, 2)
+        stats = exporter.get_stats()["circuit_breaker"]
+        self.assertEqual(stats["state"], "closed")
+        self.assertEqual(
+            stats["transitions"], {"closed": 1, "open": 1, "half_open": 1}
+        )
+        exporter.shutdown()
+
+    def test_get_stats_transmission(self):
+        exporter = BaseExporter(
+            storage_path=os.path.join(TEST_FOLDER, self.id()),
+            transmission_workers=1,
+        )
+        stats = exporter.get_stats()
+        self.assertEqual(
+            stats["transmission"], {"queued": 0, "dropped": 0, "spilled": 0}
+        )
+        self.assertEqual(stats["retry"], {"paused_for": 0.0})
+        exporter.shutdown()
+
+    def test_merge_results(self):
+        self.assertEqual(merge_results([]), ExportResult.SUCCESS)
+        self.assertEqual(
+            merge_results([ExportResult.SUCCESS, ExportResult.SUCCESS]),
+            ExportResult.SUCCESS,
+        )
+        self.assertEqual(
+            merge_results(
+                [ExportResult.SUCCESS, ExportResult.FAILED_NOT_RETRYABLE]
+            ),
+            ExportResult.FAILED_NOT_RETRYABLE,
+        )
+        self.assertEqual(
+            merge_results(
+                [
+                    ExportResult.FAILED_NOT_RETRYABLE,
+                    ExportResult.FAILED_RETRYABLE,
+                    ExportResult.SUCCESS,
+                ]
+            ),
+            ExportResult.FAILED_RETRYABLE,
+        )
 
     def test_get_trace_export_result(self):
         self.assertEqual(
@@ -395,6 +1007,7 @@ class TestBaseExporter(unittest.TestCase):
 
 
 class MockResponse:
-    def __init__(self, status_code, text):
+    def __init__(self, status_code, text, headers=None):
         self.status_code = status_code
         self.text = text
+        self.headers = headers or {}
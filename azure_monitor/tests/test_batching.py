@@ -0,0 +1,52 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+
+import json
+import unittest
+
+from azure_monitor.export.batching import split_envelopes
+
+
+class TestBatching(unittest.TestCase):
+    def test_split_empty(self):
+        self.assertEqual(split_envelopes([], 100, 10), [])
+
+    def test_split_single_chunk(self):
+        envelopes = [{"name": "a"}, {"name": "b"}]
+        chunks = split_envelopes(envelopes, 1000, 10)
+        self.assertEqual(len(chunks), 1)
+        chunk, data = chunks[0]
+        self.assertEqual(chunk, envelopes)
+        self.assertEqual(json.loads(data.decode("utf-8")), envelopes)
+
+    def test_split_max_items(self):
+        envelopes = [{"name": str(index)} for index in range(5)]
+        chunks = split_envelopes(envelopes, 1000, 2)
+        self.assertEqual([len(chunk) for chunk, _ in chunks], [2, 2, 1])
+        for chunk, data in chunks:
+            self.assertEqual(json.loads(data.decode("utf-8")), chunk)
+
+    def test_split_max_bytes(self):
+        envelopes = [{"name": str(index)} for index in range(5)]
+        item_size = len(json.dumps(envelopes[0]))
+        # brackets plus two items and their separator
+        max_bytes = 2 + 2 * item_size + 1
+        chunks = split_envelopes(envelopes, max_bytes, 10)
+        self.assertEqual([len(chunk) for chunk, _ in chunks], [2, 2, 1])
+        for chunk, data in chunks:
+            self.assertLessEqual(len(data), max_bytes)
+            self.assertEqual(json.loads(data.decode("utf-8")), chunk)
+
+    def test_split_oversized_envelope(self):
+        envelopes = [{"name": "a"}, {"name": "b" * 100}, {"name": "c"}]
+        chunks = split_envelopes(envelopes, 50, 10)
+        self.assertEqual(
+            [chunk for chunk, _ in chunks],
+            [[envelopes[0]], [envelopes[1]], [envelopes[2]]],
+        )
+
+    def test_split_custom_encode(self):
+        chunks = split_envelopes(
+            [1, 2], 100, 10, encode=lambda x: str(x * 2).encode()
+        )
+        self.assertEqual(chunks[0][1], b"[2,4]")
@@ -0,0 +1,93 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+
+import unittest
+
+from azure_monitor.export.circuit_breaker import CircuitBreaker, CircuitState
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def test_opens_after_threshold(self):
+        breaker = CircuitBreaker(failure_threshold=3, clock=FakeClock())
+        for _ in range(2):
+            self.assertTrue(breaker.allow_request())
+            breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitState.CLOSED)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitState.OPEN)
+        self.assertFalse(breaker.allow_request())
+
+    def test_success_resets_failures(self):
+        breaker = CircuitBreaker(failure_threshold=2, clock=FakeClock())
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitState.CLOSED)
+
+    def test_disabled(self):
+        breaker = CircuitBreaker(failure_threshold=0)
+        for _ in range(100):
+            breaker.record_failure()
+        self.assertTrue(breaker.allow_request())
+
+    def test_half_open_probe_success(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(
+            failure_threshold=1, recovery_timeout=30, clock=clock
+        )
+        breaker.record_failure()
+        clock.now += 29
+        self.assertFalse(breaker.allow_request())
+        clock.now += 1
+        self.assertEqual(breaker.state, CircuitState.HALF_OPEN)
+        self.assertTrue(breaker.allow_request())
+        # a single probe at a time
+        self.assertFalse(breaker.allow_request())
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitState.CLOSED)
+        self.assertTrue(breaker.allow_request())
+
+    def test_half_open_probe_failure(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(
+            failure_threshold=1, recovery_timeout=30, clock=clock
+        )
+        breaker.record_failure()
+        clock.now += 30
+        self.assertTrue(breaker.allow_request())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitState.OPEN)
+        clock.now += 29
+        self.assertFalse(breaker.allow_request())
+        clock.now += 1
+        self.assertTrue(breaker.allow_request())
+
+    def test_stats(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(
+            failure_threshold=2, recovery_timeout=30, clock=clock
+        )
+        breaker.record_failure()
+        breaker.record_failure()
+        breaker.allow_request()
+        clock.now += 30
+        breaker.allow_request()
+        breaker.record_success()
+        self.assertEqual(
+            breaker.stats(),
+            {
+                "state": "closed",
+                "consecutive_failures": 0,
+                "rejected_requests": 1,
+                "transitions": {"closed": 1, "open": 1, "half_open": 1},
+                "last_transition": 1030.0,
+            },
+        )
@@ -0,0 +1,138 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+
+import json
+import os
+import shutil
+import sys
+import types
+import unittest
+from unittest import mock
+
+from azure_monitor import json_backend, protocol
+from azure_monitor.export import BaseExporter
+
+TEST_FOLDER = os.path.abspath(".test.json")
+INSTRUMENTATION_KEY = "1234abcd-5678-4efa-8abc-1234567890ab"
+
+
+# pylint: disable=invalid-name
+def setUpModule():
+    os.makedirs(TEST_FOLDER)
+
+
+# pylint: disable=invalid-name
+def tearDownModule():
+    shutil.rmtree(TEST_FOLDER)
+
+
+def make_envelope():
+    return protocol.Envelope(
+        name="Microsoft.ApplicationInsights.RemoteDependency",
+        time="2020-01-01T00:00:00.000000Z",
+        ikey="ikey",
+        tags={"ai.operation.id": "abc", "ai.device.locale": "fr_FR"},
+        data=protocol.Data(
+            base_data=protocol.RemoteDependency(
+                name="GET /café",
+                id="id",
+                result_code="200",
+                duration="0.00:00:01.000",
+                data="https://www.example.com/a/b?q=1",
+                type="HTTP",
+                properties={"text": 'quote " and \\ and \n', "emoji": "✓"},
+            ),
+            base_type="RemoteDependencyData",
+        ),
+    )
+
+
+def old_ujson():
+    """A ujson 3 lookalike, whose dumps has no ``default`` argument."""
+
+    # pylint: disable=unused-argument
+    def dumps(value, ensure_ascii=True, escape_forward_slashes=True):
+        return json.dumps(value, ensure_ascii=ensure_ascii)
+
+    return types.SimpleNamespace(dumps=dumps, loads=json.loads)
+
+
+# pylint: disable=protected-access
+class TestJsonBackend(unittest.TestCase):
+    def test_available_backends(self):
+        names = json_backend.available_backends()
+        self.assertEqual(names[-1], "json")
+        self.assertEqual(json_backend.get_backend().name, names[0])
+        self.assertEqual(json_backend.get_backend("auto").name, names[0])
+
+    def test_get_backend_errors(self):
+        self.assertRaises(ValueError, json_backend.get_backend, "simplejson")
+        with mock.patch.dict(json_backend._backends, {"ujson": None}):
+            self.assertRaises(ValueError, json_backend.get_backend, "ujson")
+
+    def test_broken_backend_skipped(self):
+        with mock.patch.dict(
+            sys.modules, {"ujson": old_ujson()}
+        ), mock.patch.dict(json_backend._backends, clear=True):
+            self.assertNotIn("ujson", json_backend.available_backends())
+            self.assertNotEqual(json_backend.get_backend().name, "ujson")
+            self.assertRaises(ValueError, json_backend.get_backend, "ujson")
+
+    def test_matrix(self):
+        envelope = make_envelope()
+        expected = json.loads(protocol.serialize(envelope))
+        values = (
+            envelope,
+            [envelope, {"nested": [envelope]}],
+            {"a": [1, 2.5, None, True, False], "b": {}, "c": []},
+            {1: "int key"},
+            "plain string",
+        )
+        for name in json_backend.available_backends():
+            backend = json_backend.get_backend(name)
+            with self.subTest(backend=name):
+                data = backend.dumps(envelope)
+                self.assertIsInstance(data, bytes)
+                self.assertEqual(json.loads(data.decode("utf-8")), expected)
+                self.assertEqual(backend.loads(data), expected)
+                self.assertEqual(backend.loads(data.decode("utf-8")), expected)
+                self.assertNotIn(b'"ver":1', data)
+                tags = protocol.EnvelopeTags(
+                    protocol.ContextTags({"ai.cloud.role": "rôle"}),
+                    dict(envelope.tags),
+                )
+                shared = make_envelope()
+                shared.tags = tags
+                self.assertEqual(
+                    backend.loads(backend.dumps(shared))["tags"], dict(tags)
+                )
+                for value in values:
+                    self.assertEqual(
+                        backend.loads(backend.dumps(value)),
+                        json.loads(protocol.serialize(value)),
+                    )
+                self.assertRaises(TypeError, backend.dumps, object())
+
+    def test_json_fields_dict(self):
+        self.assertRaises(TypeError, protocol.json_fields, {1: "int key"})
+
+    def test_exporter_option(self):
+        exporter = BaseExporter(
+            instrumentation_key=INSTRUMENTATION_KEY,
+            storage_path=os.path.join(TEST_FOLDER, self.id()),
+            json_backend="json",
+        )
+        self.assertEqual(exporter._json.name, "json")
+        self.assertEqual(exporter.storage.json_backend, "json")
+        data, _ = exporter._prepare_request([make_envelope()])
+        self.assertEqual(data, protocol.serialize([make_envelope()]))
+        exporter.shutdown()
+
+    def test_exporter_invalid_option(self):
+        self.assertRaises(
+            ValueError,
+            BaseExporter,
+            instrumentation_key=INSTRUMENTATION_KEY,
+            storage_path=os.path.join(TEST_FOLDER, self.id()),
+            json_backend="unknown",
+        )
@@ -0,0 +1,349 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+
+import gzip
+import os
+import shutil
+import unittest
+from unittest import mock
+
+from azure_monitor.export import BaseExporter
+from azure_monitor.log_storage import CHECKPOINT, LogStorage
+from azure_monitor.protocol import Envelope
+from azure_monitor.storage import _now, _seconds
+
+TEST_FOLDER = os.path.abspath(".test.log_storage")
+
+
+# pylint: disable=invalid-name
+def setUpModule():
+    os.makedirs(TEST_FOLDER)
+
+
+# pylint: disable=invalid-name
+def tearDownModule():
+    shutil.rmtree(TEST_FOLDER)
+
+
+def segments(storage):
+    return sorted(
+        name for name in os.listdir(storage.path) if name.endswith(".log")
+    )
+
+
+class MockResponse:
+    def __init__(self, status_code, text):
+        self.status_code = status_code
+        self.text = text
+        self.headers = {}
+
+
+# pylint: disable=protected-access
+class TestLogStorage(unittest.TestCase):
+    def setUp(self):
+        self.path = os.path.join(TEST_FOLDER, self.id())
+
+    def test_get_nothing(self):
+        with LogStorage(self.path) as storage:
+            self.assertIsNone(storage.get())
+            self.assertEqual(segments(storage), [])
+
+    def test_put_and_get(self):
+        with LogStorage(self.path) as storage:
+            first = storage.put(({"a": 1}, {"b": [2]}))
+            second = storage.put([3])
+            self.assertEqual(first.get(), ({"a": 1}, {"b": [2]}))
+            self.assertEqual(second.get(), (3,))
+            self.assertEqual(
+                [record.name for record in storage.gets()],
+                [first.name, second.name],
+            )
+            self.assertLessEqual(first.created, second.created)
+            self.assertEqual(len(segments(storage)), 1)
+
+    def test_put_body(self):
+        with LogStorage(self.path) as storage:
+            body = gzip.compress(b'[{"a":1},\n{"b":2}]')
+            storage.put(body)
+            storage.put((3,))
+        with LogStorage(self.path) as storage:
+            self.assertEqual(storage.get().read(), body)
+            self.assertEqual(
+                [record.get() for record in storage.gets()],
+                [({"a": 1}, {"b": 2}), (3,)],
+            )
+
+    def test_put_compressed(self):
+        with LogStorage(self.path, compression_level=6) as storage:
+            record = storage.put([{"name": "test"}] * 10)
+            self.assertEqual(
+                record.read(),
+                b"[" + b",".join([b'{"name":"test"}'] * 10) + b"]",
+            )
+            self.assertEqual(record.get(), ({"name": "test"},) * 10)
+            self.assertLess(storage._size, 36 + len(record.read()))
+
+    def test_lease_and_delete(self):
+        with LogStorage(self.path) as storage:
+            first = storage.put((1,))
+            second = storage.put((2,), lease_period=60)
+            self.assertEqual(storage.get().lease(60).name, first.name)
+            self.assertIsNone(storage.get())
+            with mock.patch(
+                "azure_monitor.log_storage._now",
+                return_value=_now() + _seconds(120),
+            ):
+                self.assertEqual(storage.get().name, first.name)
+            first.delete()
+            first.delete()
+            self.assertIsNone(first.lease(60))
+            self.assertIsNone(first.created)
+            self.assertEqual([record.name for record in storage.gets()], [])
+            second.lease(0)
+            self.assertEqual(storage.get().name, second.name)
+
+    def test_lease_exclusive(self):
+        with LogStorage(self.path) as storage:
+            storage.put((1,))
+            storage.put((2,))
+            leased = []
+            for first, second in zip(storage.gets(), storage.gets()):
+                self.assertEqual(first.name, second.name)
+                for record in (first, second):
+                    if record.lease(60):
+                        leased.append(record)
+            self.assertEqual(len(leased), 2)
+            self.assertIsNotNone(leased[0].lease(60))  # renewed
+            with mock.patch(
+                "azure_monitor.log_storage._now",
+                return_value=_now() + _seconds(120),
+            ):
+                record = storage.get()
+                self.assertIsNotNone(record.lease(60))
+                self.assertIsNone(leased[0].lease(60))
+
+    def test_contains(self):
+        with LogStorage(self.path) as storage:
+            record = storage.put((1,))
+            self.assertIn(record.name, storage)
+            record.delete()
+            self.assertNotIn(record.name, storage)
+
+    def test_gets_skips_new_records(self):
+        with LogStorage(self.path) as storage:
+            storage.put((1,))
+            names = []
+            for record in storage.gets():
+                names.append(record.name)
+                storage.put((2,))
+            self.assertEqual(len(names), 1)
+
+    def test_put_max_size(self):
+        with LogStorage(self.path, max_size=50) as storage:
+            self.assertIsNotNone(storage.put(("x" * 50,)))
+            self.assertIsNone(storage.put((1,)))
+            storage.get().delete()
+            # the acked segment is deleted to make room
+            self.assertIsNotNone(storage.put((1,)))
+            self.assertEqual(len(segments(storage)), 1)
+            self.assertEqual(storage._size, 36 + len(b"[1]") + 1)
+
+    def test_rolls_and_deletes_segments(self):
+        with LogStorage(self.path, segment_size=100) as storage:
+            records = [storage.put(("x" * 40,)) for _ in range(6)]
+            self.assertEqual(len(segments(storage)), 6)
+            for record in records[:5]:
+                record.delete()
+            # acked segments are deleted whole, the active one is kept
+            self.assertEqual(len(segments(storage)), 1)
+            records[5].delete()
+            self.assertEqual(len(segments(storage)), 1)
+            storage.put((1,))
+            self.assertEqual(len(segments(storage)), 1)
+            self.assertEqual(
+                storage._size,
+                os.path.getsize(
+                    os.path.join(storage.path, segments(storage)[0])
+                ),
+            )
+
+    def test_restart(self):
+        with LogStorage(self.path, segment_size=100) as storage:
+            records = [storage.put((index,)) for index in range(10)]
+            records[0].delete()
+            records[3].delete()
+            records[4].delete()
+        with LogStorage(self.path, segment_size=100) as storage:
+            self.assertEqual(
+                [record.get() for record in storage.gets()],
+                [(1,), (2,), (5,), (6,), (7,), (8,), (9,)],
+            )
+            for record in storage.gets():
+                record.delete()
+        with LogStorage(self.path) as storage:
+            self.assertIsNone(storage.get())
+            self.assertEqual(segments(storage), [])
+            # new records sort after the ones acked by the checkpoint
+            storage.put((10,))
+        with LogStorage(self.path) as storage:
+            self.assertEqual(storage.get().get(), (10,))
+
+    def test_torn_write(self):
+        with LogStorage(self.path) as storage:
+            storage.put((1,))
+            segment = os.path.join(storage.path, segments(storage)[0])
+        with open(segment, "ab") as file:
+            file.write(b"2020-01-01T000000.000000 [2")
+        with LogStorage(self.path) as storage:
+            self.assertEqual(
+                [record.get() for record in storage.gets()], [(1,)]
+            )
+            storage.put((3,))
+            self.assertEqual(
+                [record.get() for record in storage.gets()], [(1,), (3,)]
+            )
+
+    def test_invalid_checkpoint(self):
+        with LogStorage(self.path) as storage:
+            storage.put((1,))
+            storage.put((2,))
+            storage.get().delete()
+        with open(os.path.join(self.path, CHECKPOINT), "w") as file:
+            file.write("000")
+        with LogStorage(self.path) as storage:
+            # every record is sent again rather than lost
+            self.assertEqual(len(list(storage.gets())), 2)
+
+    def test_checkpoint_appended(self):
+        with mock.patch("azure_monitor.log_storage._COMPACT_MIN", 4):
+            with LogStorage(self.path) as storage:
+                records = [storage.put((index,)) for index in range(20)]
+                # the first record stays, the others are acked after it
+                records[0].lease(60)
+                for record in records[1:11]:
+                    record.delete()
+                # rewritten after 4 acks, then after 4 and 8 more
+                self.assertEqual(storage._acks, 2)
+                self.assertEqual(storage._compacted, 8)
+                with open(os.path.join(self.path, CHECKPOINT)) as file:
+                    lines = file.read().split("\n")
+                self.assertEqual(lines[0], records[0].name)
+                self.assertEqual(len(lines), 12)
+            with LogStorage(self.path) as storage:
+                self.assertEqual(
+                    [record.get() for record in storage.gets()],
+                    [(0,)] + [(index,) for index in range(11, 20)],
+                )
+
+    def test_torn_checkpoint_line(self):
+        with LogStorage(self.path) as storage:
+            storage.put((1,))
+            storage.put((2,))
+            storage.put((3,))
+            storage.get().delete()
+            second = storage.get()
+        with open(os.path.join(self.path, CHECKPOINT), "a") as file:
+            file.write(second.name[:10])
+        with LogStorage(self.path) as storage:
+            self.assertEqual(
+                [record.get() for record in storage.gets()], [(2,), (3,)]
+            )
+            storage.get().delete()
+        with LogStorage(self.path) as storage:
+            self.assertEqual(storage.get().get(), (3,))
+
+    def test_retention(self):
+        with LogStorage(
+            self.path, segment_size=100, retention_period=60
+        ) as storage:
+            old = storage.put(("x" * 40,))
+            with mock.patch(
+                "azure_monitor.log_storage._now",
+                return_value=_now() + _seconds(30),
+            ):
+                storage.put(("x" * 40,))
+                storage.put(("x" * 40,))
+            self.assertEqual(len(segments(storage)), 3)
+            with mock.patch(
+                "azure_monitor.log_storage._now",
+                return_value=_now() + _seconds(61),
+            ):
+                storage._maintenance_routine()
+            self.assertEqual(len(segments(storage)), 2)
+            self.assertIsNone(old.get())
+            self.assertEqual(len(list(storage.gets())), 2)
+        with LogStorage(self.path) as storage:
+            self.assertEqual(len(list(storage.gets())), 2)
+
+    def test_retention_active_segment(self):
+        with LogStorage(self.path, retention_period=60) as storage:
+            storage.put((1,))
+            with mock.patch(
+                "azure_monitor.log_storage._now",
+                return_value=_now() + _seconds(61),
+            ):
+                storage._maintenance_routine()
+            self.assertEqual(segments(storage), [])
+            storage.put((2,))
+            self.assertEqual(storage.get().get(), (2,))
+
+    def test_shared(self):
+        first = LogStorage.open(self.path)
+        second = LogStorage.open(self.path + "/")
+        self.assertIs(first, second)
+        first.close()
+        first.put((1,))
+        second.close()
+        third = LogStorage.open(self.path)
+        self.assertIsNot(third, first)
+        self.assertEqual(third.get().get(), (1,))
+        third.close()
+
+    def test_locked_folder(self):
+        # another process would hold the lock the same way
+        with LogStorage(self.path) as storage:
+            storage.put((1,))
+            with LogStorage(self.path) as other:
+                self.assertEqual(other.path, self.path + "-1")
+                self.assertIsNone(other.get())
+                other.put((2,))
+                with LogStorage(self.path) as third:
+                    self.assertEqual(third.path, self.path + "-2")
+        with LogStorage(self.path) as storage:
+            self.assertEqual(storage.path, self.path)
+            self.assertEqual(storage.get().get(), (1,))
+        with LogStorage(self.path + "-1") as storage:
+            self.assertEqual(storage.get().get(), (2,))
+
+
+# pylint: disable=protected-access
+class TestLogStorageExporter(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        os.environ[
+            "APPINSIGHTS_INSTRUMENTATIONKEY"
+        ] = "1234abcd-5678-4efa-8abc-1234567890ab"
+
+    def test_transmission(self):
+        exporter = BaseExporter(
+            storage_path=os.path.join(TEST_FOLDER, self.id()),
+            storage_engine="log",
+        )
+        self.assertIsInstance(exporter.storage, LogStorage)
+        exporter.storage.put([Envelope().to_dict()])
+        with mock.patch("requests.Session.post") as post:
+            post.return_value = MockResponse(200, "unknown")
+            exporter._transmit_from_storage()
+        self.assertEqual(post.call_count, 1)
+        self.assertIsNone(exporter.storage.get())
+        self.assertEqual(exporter.storage._names, [])
+        exporter.shutdown()
+
+    def test_unknown_engine(self):
+        self.assertRaises(
+            ValueError,
+            lambda: BaseExporter(
+                storage_path=os.path.join(TEST_FOLDER, self.id()),
+                storage_engine="sqlite",
+            ),
+        )
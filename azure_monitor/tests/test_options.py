@@ -284,3 +284,103 @@ class TestOptions(unittest.TestCase):
             instrumentation_key=self._valid_instrumentation_key,
         )
         self.assertEqual(options.endpoint, "https://dc.123/v2/track")
+
+    def test_connection_pool_size_minimum(self):
+        self.assertRaises(
+            ValueError,
+            lambda: ExporterOptions(
+                instrumentation_key=self._valid_instrumentation_key,
+                connection_pool_size=0,
+            ),
+        )
+        options = ExporterOptions(
+            instrumentation_key=self._valid_instrumentation_key,
+            connection_idle_timeout=0,
+        )
+        self.assertEqual(options.connection_idle_timeout, 0)
+
+    def test_compression_level_range(self):
+        for name in ("compression_level", "storage_compression_level"):
+            for level in (0, 10):
+                self.assertRaises(
+                    ValueError,
+                    lambda name=name, level=level: ExporterOptions(
+                        instrumentation_key=self._valid_instrumentation_key,
+                        **{name: level}
+                    ),
+                )
+            options = ExporterOptions(
+                instrumentation_key=self._valid_instrumentation_key,
+                **{name: 9}
+            )
+            self.assertEqual(getattr(options, name), 9)
+
+    def test_transmission_queue_minimum(self):
+        self.assertRaises(
+            ValueError,
+            lambda: ExporterOptions(
+                instrumentation_key=self._valid_instrumentation_key,
+                transmission_queue_size=0,
+            ),
+        )
+        self.assertRaises(
+            ValueError,
+            lambda: ExporterOptions(
+                instrumentation_key=self._valid_instrumentation_key,
+                transmission_workers=-1,
+            ),
+        )
+
+    def test_transmission_concurrency_minimum(self):
+        self.assertRaises(
+            ValueError,
+            lambda: ExporterOptions(
+                instrumentation_key=self._valid_instrumentation_key,
+                transmission_concurrency=0,
+            ),
+        )
+
+    def test_transmission_max_items_minimum(self):
+        for name in ("transmission_max_bytes", "transmission_max_items"):
+            self.assertRaises(
+                ValueError,
+                lambda name=name: ExporterOptions(
+                    instrumentation_key=self._valid_instrumentation_key,
+                    **{name: 0}
+                ),
+            )
+
+    def test_retry_option_minimum(self):
+        self.assertRaises(
+            ValueError,
+            lambda: ExporterOptions(
+                instrumentation_key=self._valid_instrumentation_key,
+                retry_max_age=-1,
+            ),
+        )
+        self.assertRaises(
+            ValueError,
+            lambda: ExporterOptions(
+                instrumentation_key=self._valid_instrumentation_key,
+                retry_max_batches=0,
+            ),
+        )
+        options = ExporterOptions(
+            instrumentation_key=self._valid_instrumentation_key,
+            retry_max_age=None,
+        )
+        self.assertIsNone(options.retry_max_age)
+
+    def test_circuit_breaker_threshold_minimum(self):
+        self.assertRaises(
+            ValueError,
+            lambda: ExporterOptions(
+                instrumentation_key=self._valid_instrumentation_key,
+                circuit_breaker_threshold=-1,
+            ),
+        )
+        options = ExporterOptions(
+            instrumentation_key=self._valid_instrumentation_key,
+            circuit_breaker_threshold=0,
+        )
+        self.assertEqual(options.circuit_breaker_threshold, 0)
@@ -1,6 +1,7 @@
 # Copyright (c) Microsoft Corporation. All rights reserved.
 # Licensed under the MIT License.
 
+import json
 import unittest
 
 from azure_monitor import protocol
@@ -49,7 +50,7 @@ class TestProtocol(unittest.TestCase):
             "outerId": None,
             "typeName": None,
             "message": None,
-            "hasFullStack ": None,
+            "hasFullStack": None,
             "stack": None,
             "parsedStack": None,
         }
@@ -118,3 +119,310 @@ class TestProtocol(unittest.TestCase):
             "measurements": None,
         }
         self.assertEqual(data.to_dict(), to_dict)
+
+
+def without_none(value):
+    if isinstance(value, dict):
+        return {
+            key: without_none(item)
+            for key, item in value.items()
+            if item is not None
+        }
+    if isinstance(value, list):
+        return [without_none(item) for item in value]
+    return value
+
+
+def as_dict(value):
+    if isinstance(value, protocol.BaseObject):
+        return value.to_dict()
+    if isinstance(value, list):
+        return [as_dict(item) for item in value]
+    return value
+
+
+# pylint: disable=protected-access
+class TestEncoders(unittest.TestCase):
+    def assert_encoded(self, obj):
+        expected = {
+            key: as_dict(value)
+            for key, value in obj.to_dict().items()
+            if value is not None
+        }
+        if isinstance(obj, protocol.Envelope) and obj.ver == 1:
+            del expected["ver"]
+        encoded = {
+            key: as_dict(value)
+            for key, value in protocol.json_fields(obj).items()
+        }
+        self.assertEqual(encoded, expected)
+
+    def test_every_class(self):
+        for cls in vars(protocol).values():
+            if (
+                isinstance(cls, type)
+                and issubclass(cls, protocol.BaseObject)
+                and cls is not protocol.BaseObject
+            ):
+                self.assertEqual(
+                    protocol._encoders[cls].__name__, "encode_" + cls.__name__,
+                )
+
+    def test_matches_to_dict(self):
+        data_point = protocol.DataPoint(ns="ns", name="name", value=1.5)
+        objects = (
+            protocol.Envelope(),
+            protocol.Envelope(
+                ver=2,
+                name="name",
+                time="time",
+                sample_rate=50.0,
+                seq="seq",
+                ikey="ikey",
+                flags=1,
+                tags={"ai.operation.id": "abc"},
+                data=protocol.Data(
+                    base_data=protocol.Event(name="event"),
+                    base_type="EventData",
+                ),
+            ),
+            protocol.Data(base_data=data_point),
+            data_point,
+            protocol.DataPoint(count=2, min=0.5, max=1, std_dev=0.1),
+            protocol.Event(properties={"a": "b"}, measurements={"c": 1}),
+            protocol.ExceptionDetails(
+                id=1, type_name="ValueError", has_full_stack=False
+            ),
+            protocol.ExceptionData(
+                exceptions=[protocol.ExceptionDetails(message="error")],
+                severity_level=3,
+            ),
+            protocol.Message(message="text", severity_level=0),
+            protocol.MetricData(metrics=[data_point]),
+            protocol.RemoteDependency(name="GET /", success=False),
+            protocol.Request(id="id", response_code="500", success=False),
+            protocol.LiveMetricDocument(properties={"a": "b"}),
+            protocol.LiveMetric("name", "1", 1),
+            protocol.LiveMetricEnvelope(),
+            protocol.LiveMetricEnvelope(documents=[]),
+            protocol.LiveMetricEnvelope(
+                documents=[protocol.LiveMetricDocument()],
+                metrics=[protocol.LiveMetric("name", "1", 1)],
+            ),
+        )
+        for obj in objects:
+            with self.subTest(cls=type(obj).__name__):
+                self.assert_encoded(obj)
+        # every protocol class is covered
+        self.assertEqual(
+            {type(obj) for obj in objects},
+            {
+                cls
+                for cls in protocol._subclasses(protocol.BaseObject)
+                if cls.__module__ == protocol.__name__
+            },
+        )
+
+    def test_make_encoder(self):
+        encode = protocol.make_encoder(protocol.Envelope, first="tags")
+        envelope = protocol.Envelope(name="name", tags={"a": "b"})
+        self.assertEqual(
+            list(encode(envelope, {"c": "d"}).items()),
+            [("tags", {"c": "d"}), ("name", "name"), ("time", "")],
+        )
+        self.assertRaises(TypeError, protocol.make_encoder, dict)
+
+
+class TestEnvelopeTags(unittest.TestCase):
+    def setUp(self):
+        self.context = protocol.ContextTags(
+            {"ai.cloud.role": "role", "ai.device.id": "device"}
+        )
+
+    def test_context_tags(self):
+        source = {"ai.cloud.role": "role"}
+        context = protocol.ContextTags(source)
+        source["ai.cloud.role"] = "other"
+        self.assertEqual(context, {"ai.cloud.role": "role"})
+        self.assertEqual(context, protocol.ContextTags(context))
+        self.assertNotEqual(context, source)
+        self.assertEqual(
+            context.fragment(protocol.serialize), b'"ai.cloud.role":"role"'
+        )
+
+    def test_mapping(self):
+        tags = protocol.EnvelopeTags(self.context)
+        tags["ai.operation.id"] = "abc"
+        tags["ai.cloud.role"] = "overridden"
+        self.assertEqual(
+            dict(tags),
+            {
+                "ai.cloud.role": "overridden",
+                "ai.device.id": "device",
+                "ai.operation.id": "abc",
+            },
+        )
+        self.assertEqual(len(tags), 3)
+        self.assertEqual(tags.get("ai.device.id"), "device")
+        self.assertIsNone(tags.get("ai.user.id"))
+        self.assertEqual(self.context["ai.cloud.role"], "role")
+
+    def test_delete_shared_tag(self):
+        tags = protocol.EnvelopeTags(self.context, {"ai.operation.id": "abc"})
+        del tags["ai.cloud.role"]
+        self.assertEqual(
+            dict(tags), {"ai.device.id": "device", "ai.operation.id": "abc"}
+        )
+        self.assertEqual(
+            dict(protocol.EnvelopeTags(self.context)), dict(self.context)
+        )
+        self.assertRaises(KeyError, tags.__delitem__, "ai.cloud.role")
+        tags.clear()
+        self.assertEqual(len(tags), 0)
+
+    def test_serialize(self):
+        for own in ({}, {"ai.operation.id": "abc"}, {"ai.cloud.role": "x"}):
+            tags = protocol.EnvelopeTags(self.context, dict(own))
+            envelope = protocol.Envelope(
+                name="Microsoft.ApplicationInsights.Request",
+                time="2020-01-01T00:00:00.000000Z",
+                ikey="ikey",
+                tags=tags,
+            )
+            expected = {
+                "name": "Microsoft.ApplicationInsights.Request",
+                "time": "2020-01-01T00:00:00.000000Z",
+                "iKey": "ikey",
+                "tags": dict(tags),
+            }
+            with self.subTest(own=own):
+                self.assertEqual(
+                    json.loads(protocol.serialize(envelope)), expected
+                )
+                self.assertEqual(
+                    json.loads(protocol.serialize([envelope, envelope])),
+                    [expected, expected],
+                )
+                self.assertEqual(
+                    json.loads(protocol.serialize({"tags": tags})),
+                    {"tags": expected["tags"]},
+                )
+
+    def test_serialize_tags_not_first(self):
+        # like dicts not keeping their insertion order
+        serialize = protocol.make_serializer(
+            lambda value: json.dumps(
+                value, default=protocol.json_fields, sort_keys=True
+            ).encode("utf-8")
+        )
+        tags = protocol.EnvelopeTags(self.context, {"ai.operation.id": "abc"})
+        envelope = protocol.Envelope(
+            name="test", time="time", ikey="ikey", tags=tags
+        )
+        self.assertEqual(
+            json.loads(serialize(envelope)),
+            {
+                "name": "test",
+                "time": "time",
+                "iKey": "ikey",
+                "tags": dict(tags),
+            },
+        )
+
+
+class TestSerialize(unittest.TestCase):
+    def assert_serialized(self, obj, expected):
+        self.assertEqual(json.loads(protocol.serialize(obj)), expected)
+
+    def test_scalars(self):
+        for value in ("text", 'é\n"', 0, -3, 1.5, True, False, None):
+            self.assertEqual(
+                protocol.serialize(value), json.dumps(value).encode("ascii")
+            )
+        self.assertEqual(protocol.serialize(float("nan")), b"NaN")
+        self.assertEqual(protocol.serialize(float("inf")), b"Infinity")
+        self.assertEqual(protocol.serialize(float("-inf")), b"-Infinity")
+
+    def test_containers(self):
+        value = {"a": [1, {"b": None}], 2: (), "c": {}, True: "x"}
+        self.assertEqual(
+            protocol.serialize(value),
+            b'{"a":[1,{"b":null}],"2":[],"c":{},"true":"x"}',
+        )
+
+    def test_unserializable(self):
+        self.assertRaises(TypeError, protocol.serialize, object())
+        self.assertRaises(TypeError, protocol.serialize, {(1,): 1})
+
+    def test_envelope(self):
+        envelope = protocol.Envelope(
+            name="Microsoft.ApplicationInsights.Request",
+            time="2020-01-01T00:00:00.000000Z",
+            ikey="ikey",
+            tags={"ai.operation.id": "abc"},
+            data=protocol.Data(
+                base_data=protocol.Request(
+                    id="id",
+                    duration="0.00:00:01.000",
+                    response_code="200",
+                    name="GET /",
+                    url="https://www.example.com/",
+                    properties={"component": "http"},
+                ),
+                base_type="RequestData",
+            ),
+        )
+        expected = without_none(envelope.to_dict())
+        # the default envelope version is left out
+        del expected["ver"]
+        self.assert_serialized(envelope, expected)
+
+    def test_envelope_version(self):
+        self.assert_serialized(protocol.Envelope(), {"name": "", "time": ""})
+        self.assert_serialized(
+            protocol.Envelope(ver=2), {"ver": 2, "name": "", "time": ""}
+        )
+
+    def test_remote_dependency(self):
+        data = protocol.RemoteDependency(
+            name="GET /", id="id", data="https://www.example.com/", type="HTTP"
+        )
+        self.assert_serialized(data, without_none(data.to_dict()))
+
+    def test_metric_data(self):
+        data = protocol.MetricData(
+            metrics=[
+                protocol.DataPoint(
+                    ns="ns",
+                    name="name",
+                    kind=protocol.DataPointType.AGGREGATION.value,
+                    value=1.5,
+                    count=2,
+                    std_dev=0.5,
+                )
+            ],
+            properties={"key": "value"},
+        )
+        self.assert_serialized(data, without_none(data.to_dict()))
+
+    def test_exception_data(self):
+        data = protocol.ExceptionData(
+            exceptions=[protocol.ExceptionDetails(id=1, has_full_stack=True)]
+        )
+        self.assert_serialized(
+            data, {"ver": 2, "exceptions": [{"id": 1, "hasFullStack": True}]},
+        )
+
+    def test_live_metric_envelope(self):
+        envelope = protocol.LiveMetricEnvelope(
+            documents=[protocol.LiveMetricDocument(quickpulse_type="type")],
+            metrics=[protocol.LiveMetric("name", "1", 1)],
+        )
+        self.assert_serialized(envelope, without_none(envelope.to_dict()))
+
+    def test_array(self):
+        self.assertEqual(protocol.serialize([]), b"[]")
+        self.assertEqual(
+            protocol.serialize((protocol.Event(), {"a": 1})),
+            b'[{"ver":2,"name":""},{"a":1}]',
+        )
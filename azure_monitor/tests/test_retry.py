@@ -0,0 +1,97 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+
+import datetime
+import unittest
+
+from azure_monitor.export.retry import RetryScheduler, parse_retry_after
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestParseRetryAfter(unittest.TestCase):
+    def test_seconds(self):
+        self.assertEqual(parse_retry_after("120"), 120.0)
+        self.assertEqual(parse_retry_after(" 1.5 "), 1.5)
+        self.assertEqual(parse_retry_after("-3"), 0.0)
+
+    def test_http_date(self):
+        now = datetime.datetime(
+            2015, 10, 21, 7, 28, tzinfo=datetime.timezone.utc
+        ).timestamp()
+        self.assertEqual(
+            parse_retry_after("Wed, 21 Oct 2015 07:28:30 GMT", now), 30.0
+        )
+        self.assertEqual(
+            parse_retry_after("Wed, 21 Oct 2015 07:27:00 GMT", now), 0.0
+        )
+
+    def test_invalid(self):
+        self.assertIsNone(parse_retry_after(None))
+        self.assertIsNone(parse_retry_after(object()))
+        self.assertIsNone(parse_retry_after("soon"))
+
+
+class TestRetryScheduler(unittest.TestCase):
+    def test_backoff(self):
+        scheduler = RetryScheduler(initial_backoff=2, max_backoff=10)
+        for _ in range(100):
+            self.assertTrue(1 <= scheduler.backoff(1) <= 2)
+            self.assertTrue(2 <= scheduler.backoff(2) <= 4)
+            self.assertTrue(4 <= scheduler.backoff(3) <= 8)
+            self.assertTrue(5 <= scheduler.backoff(30) <= 10)
+
+    def test_record_failure(self):
+        scheduler = RetryScheduler(initial_backoff=2, max_backoff=100)
+        self.assertTrue(1 <= scheduler.record_failure() <= 2)
+        self.assertEqual(scheduler.attempts("blob"), 0)
+        self.assertTrue(2 <= scheduler.record_failure("blob") <= 4)
+        self.assertTrue(4 <= scheduler.record_failure("blob") <= 8)
+        self.assertEqual(scheduler.attempts("blob"), 3)
+        scheduler.record_success("blob")
+        self.assertEqual(scheduler.attempts("blob"), 0)
+
+    def test_prune(self):
+        scheduler = RetryScheduler()
+        scheduler.record_failure("kept")
+        scheduler.record_failure("removed")
+        scheduler.prune({"kept"}.__contains__)
+        self.assertEqual(scheduler.attempts("kept"), 2)
+        self.assertEqual(scheduler.attempts("removed"), 0)
+
+    def test_throttle(self):
+        clock = FakeClock()
+        scheduler = RetryScheduler(initial_backoff=1, clock=clock)
+        self.assertFalse(scheduler.paused)
+        scheduler.throttle(30)
+        self.assertTrue(scheduler.paused)
+        self.assertEqual(scheduler.pause_remaining, 30)
+        self.assertEqual(scheduler.record_failure(), 30)
+        scheduler.throttle(10)
+        self.assertEqual(scheduler.pause_remaining, 30)
+        clock.now += 30
+        self.assertFalse(scheduler.paused)
+
+    def test_throttle_capped(self):
+        clock = FakeClock()
+        scheduler = RetryScheduler(max_backoff=60, clock=clock)
+        scheduler.throttle(3600)
+        self.assertEqual(scheduler.pause_remaining, 60)
+
+    def test_is_expired(self):
+        now = datetime.datetime.utcnow()
+        scheduler = RetryScheduler(max_age=60)
+        self.assertFalse(scheduler.is_expired(now))
+        self.assertTrue(
+            scheduler.is_expired(now - datetime.timedelta(seconds=61))
+        )
+        self.assertFalse(scheduler.is_expired(None))
+        self.assertFalse(
+            RetryScheduler().is_expired(now - datetime.timedelta(days=30))
+        )
@@ -1,16 +1,23 @@
 # Copyright (c) Microsoft Corporation. All rights reserved.
 # Licensed under the MIT License.
 
+import datetime
+import gzip
 import os
 import shutil
+import time
 import unittest
+import zlib
 from unittest import mock
 
+from azure_monitor.protocol import Envelope
 from azure_monitor.storage import (
     LocalFileBlob,
     LocalFileStorage,
     _now,
     _seconds,
+    compress_body,
+    decompress_body,
 )
 
 TEST_FOLDER = os.path.abspath(".test")
@@ -57,6 +64,38 @@ class TestLocalFileBlob(unittest.TestCase):
         blob.put(test_input)
         self.assertEqual(blob.get(), test_input)
 
+    def test_put_body(self):
+        blob = LocalFileBlob(os.path.join(TEST_FOLDER, "foobar.blob"))
+        body = gzip.compress(b'[{"a":1},\n{"b":2}]')
+        blob.put(body)
+        self.assertEqual(blob.read(), body)
+        self.assertEqual(blob.get(), ({"a": 1}, {"b": 2}))
+        blob.delete()
+
+    def test_read_lines(self):
+        path = os.path.join(TEST_FOLDER, "foobar.blob")
+        with open(path, "wb") as file:
+            file.write(b'{"a":1}\n{"b":2}\n')
+        blob = LocalFileBlob(path)
+        # blobs of earlier versions hold an envelope per line
+        self.assertEqual(blob.read(), b'[{"a":1},{"b":2}]')
+        self.assertEqual(blob.get(), ({"a": 1}, {"b": 2}))
+        blob.delete()
+
+    def test_compress_body(self):
+        body = b'[{"name":"Microsoft.ApplicationInsights.Request"}]'
+        compressed = compress_body(body, 6)
+        self.assertLess(len(compressed), len(zlib.compress(body, 6)))
+        self.assertEqual(decompress_body(compressed), body)
+        self.assertEqual(decompress_body(body), body)
+        gzipped = gzip.compress(body)
+        self.assertEqual(compress_body(gzipped, 6), gzipped)
+        # no dictionary, or an unknown one
+        plain = zlib.compress(body)
+        self.assertEqual(decompress_body(plain), plain)
+        unknown = compressed[:2] + b"\0\0\0\0" + compressed[6:]
+        self.assertEqual(decompress_body(unknown), unknown)
+
     def test_put_with_lease(self):
         blob = LocalFileBlob(os.path.join(TEST_FOLDER, "foobar.blob"))
         test_input = (1, 2, 3)
@@ -65,6 +104,29 @@ class TestLocalFileBlob(unittest.TestCase):
         blob.lease(0.01)
         self.assertEqual(blob.get(), test_input)
 
+    def test_name(self):
+        blob = LocalFileBlob(
+            os.path.join(TEST_FOLDER, "2020-01-02T030405.000006-ff.blob")
+        )
+        blob.delete()
+        blob.put((1,), lease_period=60)
+        self.assertTrue(blob.fullpath.endswith(".lock"))
+        self.assertEqual(blob.name, "2020-01-02T030405.000006-ff.blob")
+        self.assertEqual(
+            blob.created, datetime.datetime(2020, 1, 2, 3, 4, 5, 6)
+        )
+        blob.delete()
+        self.assertIsNone(LocalFileBlob("foobar.blob").created)
+
+    def test_put_protocol_objects(self):
+        blob = LocalFileBlob(os.path.join(TEST_FOLDER, "foobar.blob"))
+        blob.delete()
+        blob.put([Envelope(name="test", ikey=None), {"name": "dict"}])
+        self.assertEqual(
+            blob.get(), ({"name": "test", "time": ""}, {"name": "dict"})
+        )
+        blob.delete()
+
     def test_lease_error(self):
         blob = LocalFileBlob(os.path.join(TEST_FOLDER, "foobar.blob"))
         blob.delete()
@@ -106,6 +168,14 @@ class TestLocalFileStorage(unittest.TestCase):
             with mock.patch("os.rename", side_effect=throw(Exception)):
                 self.assertIsNone(stor.put(test_input))
 
+    def test_contains(self):
+        with LocalFileStorage(os.path.join(TEST_FOLDER, "contains")) as stor:
+            blob = stor.put((1,))
+            blob.lease(60)
+            self.assertIn(blob.name, stor)
+            blob.delete()
+            self.assertNotIn(blob.name, stor)
+
     def test_put_max_size(self):
         test_input = (1, 2, 3)
         with LocalFileStorage(os.path.join(TEST_FOLDER, "asd")) as stor:
@@ -115,6 +185,21 @@ class TestLocalFileStorage(unittest.TestCase):
             stor.put(test_input)
             self.assertEqual(stor.get(), None)
 
+    def test_put_compressed(self):
+        path = os.path.join(TEST_FOLDER, "compressed")
+        envelopes = [
+            {"name": "Microsoft.ApplicationInsights.Request", "index": index}
+            for index in range(10)
+        ]
+        with LocalFileStorage(path, compression_level=6) as stor:
+            blob = stor.put(envelopes)
+            with open(blob.fullpath, "rb") as file:
+                content = file.read()
+            self.assertEqual(stor._size, len(content))
+            self.assertEqual(decompress_body(content), blob.read())
+            self.assertEqual(blob.get(), tuple(envelopes))
+            self.assertLess(len(content), len(blob.read()) / 2)
+
     def test_check_storage_size_full(self):
         test_input = (1, 2, 3)
         with LocalFileStorage(os.path.join(TEST_FOLDER, "asd2"), 1) as stor:
@@ -133,20 +218,58 @@ class TestLocalFileStorage(unittest.TestCase):
 
     def test_check_storage_size_links(self):
         test_input = (1, 2, 3)
+        target = os.path.join(TEST_FOLDER, "asd4.target")
+        with open(target, "wb") as file:
+            file.write(b"x" * 2000)
         with LocalFileStorage(os.path.join(TEST_FOLDER, "asd4"), 1000) as stor:
             stor.put(test_input)
-            with mock.patch("os.path.islink") as os_mock:
-                os_mock.return_value = True
+            os.symlink(target, os.path.join(stor.path, "link.blob"))
+            stor._maintenance_routine()
+            self.assertEqual(stor._size, len(b"[1,2,3]"))
             self.assertTrue(stor._check_storage_size())
 
     def test_check_storage_size_error(self):
         test_input = (1, 2, 3)
         with LocalFileStorage(os.path.join(TEST_FOLDER, "asd5"), 1) as stor:
+            stor.put(test_input)
             with mock.patch("os.path.getsize", side_effect=throw(OSError)):
-                stor.put(test_input)
-                with mock.patch("os.path.islink") as os_mock:
-                    os_mock.return_value = True
-                self.assertTrue(stor._check_storage_size())
+                with mock.patch("azure_monitor.storage.logger") as logger:
+                    stor._maintenance_routine()
+            self.assertTrue(logger.error.called)
+            self.assertTrue(stor._check_storage_size())
+
+    def test_storage_size_counter(self):
+        def disk_size(path):
+            return sum(
+                os.path.getsize(os.path.join(path, name))
+                for name in os.listdir(path)
+            )
+
+        path = os.path.join(TEST_FOLDER, "asd6")
+        with LocalFileStorage(path, 1000) as stor:
+            first = stor.put((1, 2, 3))
+            self.assertEqual(stor._size, len(b"[1,2,3]"))
+            stor.put([{"a": 1}], lease_period=10)
+            self.assertEqual(stor._size, disk_size(path))
+            first.lease(10)
+            first.delete()
+            self.assertEqual(stor._size, disk_size(path))
+            with mock.patch("azure_monitor.storage._now") as now_mock:
+                now_mock.return_value = _now() - _seconds(30 * 24 * 60 * 60)
+                stor.put((1, 2, 3))
+            self.assertEqual(stor._size, disk_size(path))
+            # removed by retention
+            self.assertIsNone(stor.get())
+            self.assertEqual(stor._size, disk_size(path))
+            stor.put(["x" * 1000])
+            self.assertFalse(stor._check_storage_size())
+            self.assertIsNone(stor.put((1,)))
+            size = stor._size
+        with open(os.path.join(path, "other.tmp"), "wb") as file:
+            file.write(b"x" * 10)
+        with LocalFileStorage(path, 1000) as stor:
+            # reconciled with the folder
+            self.assertEqual(stor._size, size + 10)
 
     def test_maintanence_routine(self):
         with mock.patch("os.makedirs") as m:
@@ -163,3 +286,112 @@ class TestLocalFileStorage(unittest.TestCase):
                 stor._maintenance_routine()
             with mock.patch("os.path.isdir", side_effect=throw(Exception)):
                 stor._maintenance_routine()
+
+
+# pylint: disable=protected-access
+class TestLocalFileStorageIndex(unittest.TestCase):
+    def test_lease_and_delete(self):
+        with LocalFileStorage(os.path.join(TEST_FOLDER, "index1")) as stor:
+            first = stor.put((1,))
+            second = stor.put((2,))
+            self.assertEqual(stor.get().name, first.name)
+            stor.get().lease(60)
+            self.assertEqual(stor.get().name, second.name)
+            with mock.patch("azure_monitor.storage._now") as now_mock:
+                now_mock.return_value = _now() + _seconds(120)
+                # the lease has expired
+                self.assertEqual(stor.get().name, first.name)
+                stor.get().delete()
+                stor.get().delete()
+                self.assertIsNone(stor.get())
+            self.assertEqual(os.listdir(stor.path), [])
+
+    def test_put_with_lease(self):
+        with LocalFileStorage(os.path.join(TEST_FOLDER, "index2")) as stor:
+            stor.put((1,), lease_period=60)
+            self.assertIsNone(stor.get())
+            blob = stor.put((2,))
+            self.assertEqual(stor.get().get(), (2,))
+            blob.lease(60)
+            self.assertIsNone(stor.get())
+
+    def test_built_at_startup(self):
+        path = os.path.join(TEST_FOLDER, "index3")
+        with LocalFileStorage(path) as stor:
+            stor.put((1,), lease_period=60)
+            stor.put((2,))
+        tmp = "2020-01-02T030405.000006-ff.blob.tmp"
+        with open(os.path.join(path, tmp), "w"):
+            pass
+        with LocalFileStorage(path) as stor:
+            self.assertEqual(stor.get().get(), (2,))
+            self.assertEqual(len(stor._names), 2)
+            self.assertEqual(len(stor._leases), 1)
+            self.assertNotIn(tmp, os.listdir(path))
+
+    def test_shared_folder(self):
+        path = os.path.join(TEST_FOLDER, "index4")
+        with LocalFileStorage(path) as stor, LocalFileStorage(path) as other:
+            other.put((1,))
+            self.assertIsNone(stor.get())
+            stor._maintenance_routine()
+            self.assertEqual(stor.get().get(), (1,))
+            # leased by the other storage
+            stale = stor.get()
+            other.get().lease(60)
+            self.assertIsNone(stale.lease(60))
+            self.assertEqual(stor._names, [])
+            stor._maintenance_routine()
+            self.assertEqual(len(stor._leases), 1)
+            self.assertIsNone(stor.get())
+            # deleted by the other storage
+            blob = other.put((2,))
+            stor._maintenance_routine()
+            self.assertEqual(len(stor._names), 2)
+            os.remove(blob.fullpath)
+            self.assertIsNone(stor.get())
+            self.assertEqual(len(stor._names), 1)
+
+    def test_reconciled_on_folder_change(self):
+        path = os.path.join(TEST_FOLDER, "index7")
+        os.makedirs(path)
+        past = time.time() - 10
+        os.utime(path, (past, past))
+        with LocalFileStorage(path) as stor:
+            self.assertEqual(stor._mtime, past)
+            blob = stor.put((1,))
+            blob.lease(60)
+            blob.delete()
+            # changed by the storage itself, still in sync
+            self.assertEqual(stor._mtime, os.stat(path).st_mtime)
+            with mock.patch.object(stor, "_load_index") as load_index:
+                stor._maintenance_routine()
+            self.assertFalse(load_index.called)
+            with LocalFileStorage(path) as other:
+                other.put((2,))
+            with mock.patch.object(stor, "_load_index") as load_index:
+                stor._maintenance_routine()
+            self.assertTrue(load_index.called)
+            stor._maintenance_routine()
+            self.assertEqual(stor.get().get(), (2,))
+
+    def test_gets_skips_new_blobs(self):
+        with LocalFileStorage(os.path.join(TEST_FOLDER, "index5")) as stor:
+            stor.put((1,))
+            stor.put((2,))
+            values = []
+            for blob in stor.gets():
+                values.append(blob.get())
+                stor.put((3,))
+            self.assertEqual(values, [(1,), (2,)])
+            self.assertEqual(len(list(stor.gets())), 4)
+
+    def test_retention(self):
+        with LocalFileStorage(os.path.join(TEST_FOLDER, "index6")) as stor:
+            with mock.patch("azure_monitor.storage._now") as now_mock:
+                now_mock.return_value = _now() - _seconds(30 * 24 * 60 * 60)
+                stor.put((1,))
+                stor.put((2,), lease_period=10)
+            stor.put((3,))
+            self.assertEqual(stor.get().get(), (3,))
+            self.assertEqual(len(os.listdir(stor.path)), 1)
@@ -0,0 +1,157 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+
+import threading
+import unittest
+
+from azure_monitor.export.transmission import OverflowPolicy, TransmissionQueue
+
+
+def throw(exc_type, *args, **kwargs):
+    def func(*_args, **_kwargs):
+        raise exc_type(*args, **kwargs)
+
+    return func
+
+
+class BlockingSender:
+    def __init__(self):
+        self.sent = []
+        self.release = threading.Event()
+        self.started = threading.Event()
+
+    def __call__(self, batch):
+        self.started.set()
+        self.release.wait()
+        self.sent.append(batch)
+
+
+class TestTransmissionQueue(unittest.TestCase):
+    def test_send(self):
+        sent = []
+        queue = TransmissionQueue(send=sent.append, workers=2)
+        self.assertTrue(queue.put([1]))
+        self.assertTrue(queue.put([2]))
+        self.assertTrue(queue.flush(5))
+        self.assertEqual(sorted(sent), [[1], [2]])
+        self.assertTrue(queue.shutdown(5))
+
+    def test_send_exception(self):
+        queue = TransmissionQueue(send=throw(Exception))
+        self.assertTrue(queue.put([1]))
+        self.assertTrue(queue.flush(5))
+        self.assertTrue(queue.shutdown(5))
+
+    def test_overflow_string_policy(self):
+        queue = TransmissionQueue(send=list, overflow_policy="drop_oldest")
+        self.assertEqual(queue.overflow_policy, OverflowPolicy.DROP_OLDEST)
+        queue.shutdown(5)
+
+    def test_overflow_drop_oldest(self):
+        sender = BlockingSender()
+        queue = TransmissionQueue(
+            send=sender,
+            max_size=2,
+            overflow_policy=OverflowPolicy.DROP_OLDEST,
+        )
+        queue.put([0])
+        sender.started.wait(5)
+        queue.put([1])
+        queue.put([2])
+        queue.put([3])
+        self.assertEqual(queue.dropped, 1)
+        self.assertEqual(len(queue), 2)
+        sender.release.set()
+        self.assertTrue(queue.flush(5))
+        self.assertEqual(sender.sent, [[0], [2], [3]])
+        queue.shutdown(5)
+
+    def test_overflow_spill(self):
+        sender = BlockingSender()
+        spilled = []
+        queue = TransmissionQueue(
+            send=sender,
+            spill=spilled.append,
+            max_size=1,
+            overflow_policy=OverflowPolicy.SPILL_TO_DISK,
+        )
+        queue.put([0])
+        sender.started.wait(5)
+        queue.put([1])
+        self.assertTrue(queue.put([2]))
+        self.assertEqual(spilled, [[2]])
+        self.assertEqual(queue.spilled, 1)
+        sender.release.set()
+        queue.shutdown(5)
+        self.assertEqual(sender.sent, [[0], [1]])
+
+    def test_overflow_spill_without_spill(self):
+        sender = BlockingSender()
+        queue = TransmissionQueue(
+            send=sender,
+            max_size=1,
+            overflow_policy=OverflowPolicy.SPILL_TO_DISK,
+        )
+        queue.put([0])
+        sender.started.wait(5)
+        queue.put([1])
+        self.assertFalse(queue.put([2]))
+        self.assertEqual(queue.dropped, 1)
+        sender.release.set()
+        queue.shutdown(5)
+
+    def test_overflow_spill_exception(self):
+        sender = BlockingSender()
+        queue = TransmissionQueue(
+            send=sender,
+            spill=throw(Exception),
+            max_size=1,
+            overflow_policy=OverflowPolicy.SPILL_TO_DISK,
+        )
+        queue.put([0])
+        sender.started.wait(5)
+        queue.put([1])
+        self.assertFalse(queue.put([2]))
+        self.assertEqual(queue.dropped, 1)
+        sender.release.set()
+        queue.shutdown(5)
+
+    def test_overflow_block(self):
+        sender = BlockingSender()
+        queue = TransmissionQueue(send=sender, max_size=1)
+        queue.put([0])
+        sender.started.wait(5)
+        queue.put([1])
+        blocked = threading.Thread(target=queue.put, args=([2],))
+        blocked.start()
+        blocked.join(0.1)
+        self.assertTrue(blocked.is_alive())
+        sender.release.set()
+        blocked.join(5)
+        self.assertFalse(blocked.is_alive())
+        queue.shutdown(5)
+        self.assertEqual(sender.sent, [[0], [1], [2]])
+
+    def test_flush_timeout(self):
+        sender = BlockingSender()
+        queue = TransmissionQueue(send=sender)
+        queue.put([0])
+        self.assertFalse(queue.flush(0.05))
+        sender.release.set()
+        self.assertTrue(queue.flush(5))
+        queue.shutdown(5)
+
+    def test_shutdown_timeout_spills(self):
+        sender = BlockingSender()
+        spilled = []
+        queue = TransmissionQueue(send=sender, spill=spilled.append)
+        queue.put([0])
+        sender.started.wait(5)
+        queue.put([1])
+        self.assertFalse(queue.shutdown(0.05))
+        self.assertFalse(queue.stopped)
+        self.assertEqual(spilled, [[1]])
+        self.assertFalse(queue.put([2]))
+        sender.release.set()
+        self.assertTrue(queue.shutdown(5))
+        self.assertTrue(queue.stopped)
@@ -0,0 +1,99 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+
+import gzip
+import unittest
+from unittest import mock
+
+from azure_monitor.export import transport
+
+
+# pylint: disable=protected-access
+class TestTransport(unittest.TestCase):
+    def test_encode_body_disabled(self):
+        data = b"x" * 4096
+        self.assertEqual(transport.encode_body(data), (data, None))
+
+    def test_encode_body_below_min_size(self):
+        data = b"x" * 10
+        self.assertEqual(
+            transport.encode_body(data, level=6, min_size=11), (data, None)
+        )
+
+    def test_encode_body(self):
+        data = b"x" * 4096
+        body, encoding = transport.encode_body(data, level=6, min_size=10)
+        self.assertEqual(encoding, "gzip")
+        self.assertLess(len(body), len(data))
+        self.assertEqual(gzip.decompress(body), data)
+
+    def test_acquire_shared(self):
+        session = transport.acquire_session("https://dc.example.com/v2/track")
+        session2 = transport.acquire_session("https://dc.example.com/v2/track")
+        self.assertIs(session, session2)
+        self.assertEqual(session._references, 2)
+        transport.release_session(session)
+        transport.release_session(session2)
+
+    def test_acquire_different_endpoints(self):
+        session = transport.acquire_session("https://dc.example.com/v2/track")
+        session2 = transport.acquire_session("https://rt.example.com/v2/track")
+        self.assertIsNot(session, session2)
+        transport.release_session(session)
+        transport.release_session(session2)
+
+    def test_acquire_different_options(self):
+        session = transport.acquire_session("https://dc.example.com/v2/track")
+        session2 = transport.acquire_session(
+            "https://dc.example.com/v2/track", pool_size=2
+        )
+        self.assertIsNot(session, session2)
+        self.assertEqual(session2.pool_size, 2)
+        transport.release_session(session)
+        transport.release_session(session2)
+
+    def test_release_closes_last(self):
+        session = transport.acquire_session("https://dc.example.com/v2/track")
+        transport.acquire_session("https://dc.example.com/v2/track")
+        with mock.patch.object(session, "close") as close:
+            transport.release_session(session)
+            self.assertFalse(close.called)
+            transport.release_session(session)
+            self.assertTrue(close.called)
+        self.assertNotIn(session._key, transport._sessions)
+
+    def test_release_none(self):
+        self.assertIsNone(transport.release_session(None))
+
+    def test_keep_alive_disabled(self):
+        session = transport.PooledSession(keep_alive=False)
+        self.assertEqual(session._session.headers["Connection"], "close")
+        session.close()
+
+    def test_post(self):
+        session = transport.PooledSession()
+        with mock.patch("requests.Session.post") as post:
+            session.post(url="https://dc.example.com", data="[]")
+            self.assertEqual(
+                post.call_args[1]["url"], "https://dc.example.com"
+            )
+        session.close()
+
+    def test_post_idle_eviction(self):
+        session = transport.PooledSession(idle_timeout=10)
+        session._last_used -= 20
+        with mock.patch("requests.Session.post"):
+            with mock.patch("requests.Session.close") as close:
+                session.post(url="https://dc.example.com", data="[]")
+                self.assertTrue(close.called)
+                close.reset_mock()
+                session.post(url="https://dc.example.com", data="[]")
+                self.assertFalse(close.called)
+
+    def test_post_idle_eviction_disabled(self):
+        session = transport.PooledSession(idle_timeout=0)
+        session._last_used -= 20
+        with mock.patch("requests.Session.post"):
+            with mock.patch("requests.Session.close") as close:
+                session.post(url="https://dc.example.com", data="[]")
+                self.assertFalse(close.called)
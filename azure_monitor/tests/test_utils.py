@@ -3,6 +3,9 @@
 
 import os
 import unittest
+from unittest import mock
+
+from opentelemetry.sdk import util as otel_util
 
 from azure_monitor import utils
 
@@ -22,3 +25,47 @@ class TestUtils(unittest.TestCase):
         self.assertEqual(ns_to_duration(60 * 1000000000), "0.00:01:00.000")
         self.assertEqual(ns_to_duration(3600 * 1000000000), "0.01:00:00.000")
         self.assertEqual(ns_to_duration(86400 * 1000000000), "1.00:00:00.000")
+        self.assertEqual(ns_to_duration(59999499999), "0.00:00:59.999")
+        self.assertEqual(ns_to_duration(59999500000), "0.00:01:00.000")
+        self.assertEqual(
+            ns_to_duration(((27 * 24 + 3) * 3600 + 4) * 1000000000 + 5000000),
+            "27.03:00:04.005",
+        )
+
+    def test_ns_to_iso_str(self):
+        for nanoseconds in (
+            0,
+            1575494316027613500,
+            1575494316999999500,
+            1575494316999999499,
+            1575494316000000499,
+            1575494317000000000,
+            1600000000123456789,
+        ):
+            self.assertEqual(
+                utils.ns_to_iso_str(nanoseconds),
+                otel_util.ns_to_iso_str(nanoseconds),
+            )
+        self.assertEqual(
+            utils.ns_to_iso_str(1575494316027613500),
+            "2019-12-04T21:18:36.027613Z",
+        )
+
+    def test_format_trace_id(self):
+        self.assertEqual(
+            utils.format_trace_id(36873507687745823477771305566750195431),
+            "1bbd944a73a05d89eab5d3740a213ee7",
+        )
+        self.assertEqual(utils.format_trace_id(1), "0" * 31 + "1")
+
+    def test_envelope_tags(self):
+        tags = utils.envelope_tags()
+        self.assertEqual(dict(tags), utils.azure_monitor_context)
+        tags["ai.operation.id"] = "abc"
+        self.assertNotIn("ai.operation.id", utils.envelope_tags())
+        self.assertIs(tags.context, utils.context_tags())
+        with mock.patch.dict(
+            utils.azure_monitor_context, {"ai.user.id": "user"}
+        ):
+            self.assertEqual(utils.envelope_tags()["ai.user.id"], "user")
+        self.assertNotIn("ai.user.id", utils.envelope_tags())
@@ -0,0 +1,188 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+
+import os
+import re
+import shutil
+import unittest
+from unittest import mock
+
+from opentelemetry.sdk.trace import Span
+from opentelemetry.trace import SpanContext, SpanKind
+from opentelemetry.trace.status import Status, StatusCanonicalCode
+
+from azure_monitor.export import trace as trace_module
+from azure_monitor.export.trace import AzureMonitorSpanExporter
+from azure_monitor.export.trace.filters import (
+    SpanFilter,
+    SpanSampler,
+    apply_filter,
+)
+
+TEST_FOLDER = os.path.abspath(".test.filters")
+
+
+# pylint: disable=invalid-name
+def setUpModule():
+    os.makedirs(TEST_FOLDER)
+
+
+# pylint: disable=invalid-name
+def tearDownModule():
+    shutil.rmtree(TEST_FOLDER)
+
+
+def make_span(name="test", kind=SpanKind.INTERNAL, attributes=None, code=None):
+    span = Span(
+        name=name,
+        context=SpanContext(
+            trace_id=36873507687745823477771305566750195431,
+            span_id=12030755672171557337,
+            is_remote=False,
+        ),
+        kind=kind,
+        attributes=attributes,
+    )
+    span.start()
+    span.end()
+    if code is not None:
+        span.status = Status(canonical_code=code)
+    return span
+
+
+class EvenSampler(SpanSampler):
+    sample_rate = 50.0
+
+    def __init__(self):
+        self.count = 0
+
+    def should_sample(self, span):
+        self.count += 1
+        return self.count % 2 == 0
+
+
+class TestSpanFilter(unittest.TestCase):
+    def test_name(self):
+        self.assertFalse(SpanFilter(name="health")(make_span("health")))
+        self.assertTrue(SpanFilter(name="health")(make_span("healthz")))
+        span_filter = SpanFilter(name=["a", "b"])
+        self.assertFalse(span_filter(make_span("b")))
+        self.assertTrue(span_filter(make_span("c")))
+        span_filter = SpanFilter(name=re.compile(r"GET /health.*"))
+        self.assertFalse(span_filter(make_span("GET /healthz")))
+        self.assertTrue(span_filter(make_span("POST /health")))
+
+    def test_kind(self):
+        span_filter = SpanFilter(kind=SpanKind.INTERNAL)
+        self.assertFalse(span_filter(make_span()))
+        self.assertTrue(span_filter(make_span(kind=SpanKind.SERVER)))
+        span_filter = SpanFilter(kind=[SpanKind.CLIENT, SpanKind.SERVER])
+        self.assertFalse(span_filter(make_span(kind=SpanKind.SERVER)))
+
+    def test_attributes(self):
+        span_filter = SpanFilter(
+            attributes={"http.route": "/health", "http.method": "GET"}
+        )
+        self.assertFalse(
+            span_filter(
+                make_span(
+                    attributes={
+                        "http.route": "/health",
+                        "http.method": "GET",
+                        "other": 1,
+                    }
+                )
+            )
+        )
+        self.assertTrue(
+            span_filter(make_span(attributes={"http.route": "/health"}))
+        )
+        self.assertTrue(
+            span_filter(
+                make_span(
+                    attributes={"http.route": "/items", "http.method": "GET"}
+                )
+            )
+        )
+
+    def test_status(self):
+        span_filter = SpanFilter(status=StatusCanonicalCode.OK)
+        self.assertFalse(span_filter(make_span()))
+        self.assertTrue(
+            span_filter(make_span(code=StatusCanonicalCode.UNKNOWN))
+        )
+
+    def test_all_criteria(self):
+        span_filter = SpanFilter(name="test", kind=SpanKind.SERVER)
+        self.assertTrue(span_filter(make_span()))
+        self.assertFalse(span_filter(make_span(kind=SpanKind.SERVER)))
+        self.assertFalse(SpanFilter()(make_span()))
+
+    def test_apply_filter_exception(self):
+        spans = [make_span("a"), make_span("b"), make_span("c")]
+        calls = []
+
+        def span_filter(span):
+            calls.append(span)
+            if span.name == "b":
+                raise ValueError()
+            return span.name != "a"
+
+        self.assertEqual(
+            apply_filter(span_filter, spans), [spans[1], spans[2]]
+        )
+        self.assertEqual(calls, spans)
+
+
+# pylint: disable=protected-access
+class TestExporterSpanFilters(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        os.environ[
+            "APPINSIGHTS_INSTRUMENTATIONKEY"
+        ] = "1234abcd-5678-4efa-8abc-1234567890ab"
+
+    def setUp(self):
+        self.exporter = AzureMonitorSpanExporter(
+            storage_path=os.path.join(TEST_FOLDER, self.id())
+        )
+
+    def tearDown(self):
+        self.exporter.shutdown()
+
+    def test_no_filter(self):
+        envelopes = self.exporter._convert_spans([make_span(), None])
+        self.assertEqual(len(envelopes), 1)
+        self.assertEqual(
+            self.exporter.get_stats()["spans"],
+            {"filtered": 0, "sampled_out": 0},
+        )
+
+    def test_filters_before_conversion(self):
+        self.exporter.add_span_filter(SpanFilter(name="health"))
+        self.exporter.add_span_filter(lambda span: span.name != "noise")
+        spans = [make_span("health"), make_span("noise"), make_span("kept")]
+        with mock.patch(
+            "azure_monitor.export.trace._convert_span",
+            wraps=trace_module._convert_span,
+        ) as convert:
+            envelopes = self.exporter._convert_spans(spans + [None])
+        self.assertEqual(convert.call_count, 1)
+        self.assertEqual(
+            [envelope.data.base_data.name for envelope in envelopes], ["kept"]
+        )
+        self.assertEqual(self.exporter.get_stats()["spans"]["filtered"], 2)
+        self.exporter.clear_span_filters()
+        self.assertEqual(len(self.exporter._convert_spans(spans)), 3)
+
+    def test_sampler(self):
+        self.exporter.add_span_filter(SpanFilter(name="health"))
+        self.exporter.set_span_sampler(EvenSampler())
+        spans = [make_span("health")] + [make_span() for _ in range(4)]
+        self.assertEqual(len(self.exporter._convert_spans(spans)), 2)
+        self.assertEqual(
+            self.exporter.get_stats()["spans"],
+            {"filtered": 1, "sampled_out": 2},
+        )
+        self.exporter.set_span_sampler(None)
+        self.assertEqual(len(self.exporter._convert_spans(spans)), 4)
@@ -0,0 +1,266 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+
+import ctypes
+import os
+import random
+import shutil
+import unittest
+
+from opentelemetry.sdk.trace import Span
+from opentelemetry.trace import SpanContext, TraceFlags
+
+from azure_monitor.export.trace import AzureMonitorSpanExporter
+from azure_monitor.export.trace.sampling import (
+    SAMPLE_RATE_ATTRIBUTE,
+    AdaptiveSampler,
+    FixedRateSampler,
+    sampling_score,
+)
+
+TEST_FOLDER = os.path.abspath(".test.sampling")
+
+
+# pylint: disable=invalid-name
+def setUpModule():
+    os.makedirs(TEST_FOLDER)
+
+
+# pylint: disable=invalid-name
+def tearDownModule():
+    shutil.rmtree(TEST_FOLDER)
+
+
+def make_span(trace_id, sampled=True, attributes=None):
+    span = Span(
+        name="test",
+        context=SpanContext(
+            trace_id=trace_id,
+            span_id=12030755672171557337,
+            is_remote=False,
+            trace_flags=TraceFlags(
+                TraceFlags.SAMPLED if sampled else TraceFlags.DEFAULT
+            ),
+        ),
+        attributes=attributes,
+    )
+    span.start()
+    span.end()
+    return span
+
+
+def reference_score(trace_id):
+    value = ctypes.c_int32(5381).value
+    for char in "{:032x}".format(trace_id):
+        value = ctypes.c_int32((value << 5) + value + ord(char)).value
+    value = 2 ** 31 - 1 if value == -(2 ** 31) else abs(value)
+    return value / (2 ** 31 - 1)
+
+
+class TestSampling(unittest.TestCase):
+    def setUp(self):
+        self.trace_ids = [
+            random.Random(index).getrandbits(128) for index in range(2000)
+        ]
+
+    def test_sampling_score(self):
+        for trace_id in self.trace_ids[:200] + [0, 2 ** 128 - 1]:
+            score = sampling_score(trace_id)
+            self.assertEqual(score, reference_score(trace_id))
+            self.assertTrue(0 <= score <= 1)
+
+    def test_fixed_rate(self):
+        sampler = FixedRateSampler(25)
+        spans = [make_span(trace_id) for trace_id in self.trace_ids]
+        kept = sampler.sample(spans)
+        self.assertAlmostEqual(len(kept) / len(spans), 0.25, delta=0.05)
+        for span in kept:
+            self.assertLess(sampling_score(span.context.trace_id), 0.25)
+            self.assertEqual(sampler.rate_of(span), 25.0)
+        self.assertEqual(FixedRateSampler(0).sample(spans), [])
+        self.assertEqual(len(FixedRateSampler(100).sample(spans)), 2000)
+
+    def test_same_trace(self):
+        sampler = FixedRateSampler(50)
+        for trace_id in self.trace_ids[:100]:
+            decisions = {
+                sampler.should_sample(make_span(trace_id)) for _ in range(3)
+            }
+            self.assertEqual(len(decisions), 1)
+
+    def test_sampled_flag(self):
+        span = make_span(self.trace_ids[0], sampled=False)
+        self.assertEqual(FixedRateSampler(100).sample([span]), [])
+        sampler = FixedRateSampler(100, respect_sampled_flag=False)
+        self.assertEqual(sampler.sample([span]), [span])
+
+    def test_upstream_rate(self):
+        sampler = FixedRateSampler(50)
+        spans = [
+            make_span(trace_id, attributes={SAMPLE_RATE_ATTRIBUTE: 10.0})
+            for trace_id in self.trace_ids
+        ]
+        kept = sampler.sample(spans)
+        for span in kept:
+            self.assertLess(sampling_score(span.context.trace_id), 0.1)
+            self.assertEqual(sampler.rate_of(span), 10.0)
+        self.assertEqual(sampler.rate_of(make_span(1)), 50.0)
+
+    def test_invalid_rate(self):
+        self.assertRaises(ValueError, FixedRateSampler, 150)
+        self.assertRaises(ValueError, FixedRateSampler, -1)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestAdaptiveSampler(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.spans = [
+            make_span(random.Random(index).getrandbits(128))
+            for index in range(1000)
+        ]
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.sampler = AdaptiveSampler(
+            target_items_per_second=5.0,
+            evaluation_interval=15.0,
+            increase_timeout=60.0,
+            clock=self.clock,
+        )
+        self.offset = 0
+
+    def run_load(self, items_per_second, seconds):
+        """Feeds the sampler one batch per second, returns the spans kept
+        during the last minute."""
+        kept = []
+        for second in range(seconds):
+            self.clock.now += 1
+            count = int(items_per_second)
+            batch = [
+                self.spans[(self.offset + index) % len(self.spans)]
+                for index in range(count)
+            ]
+            self.offset += count
+            result = self.sampler.sample(batch)
+            if second >= seconds - 60:
+                kept.extend(result)
+        return kept
+
+    def test_steady_load(self):
+        kept = self.run_load(50, 300)
+        self.assertAlmostEqual(self.sampler.items_per_second, 50, delta=1)
+        self.assertEqual(self.sampler.sample_rate, 10.0)
+        self.assertAlmostEqual(len(kept) / 60, 5, delta=2)
+
+    def test_under_target(self):
+        self.assertEqual(len(self.run_load(3, 120)), 180)
+        self.assertEqual(self.sampler.sample_rate, 100.0)
+
+    def test_burst(self):
+        self.run_load(5, 120)
+        self.assertEqual(self.sampler.sample_rate, 100.0)
+        # a 20x burst lowers the rate from the first evaluation
+        self.run_load(100, 15)
+        self.assertLess(self.sampler.sample_rate, 100.0)
+        kept = self.run_load(100, 300)
+        self.assertEqual(self.sampler.sample_rate, 5.0)
+        self.assertAlmostEqual(len(kept) / 60, 5, delta=2)
+        # back to off-peak, the rate is raised once per timeout at most
+        self.run_load(3, 15)
+        rate = self.sampler.sample_rate
+        self.assertLess(rate, 10.0)
+        self.run_load(3, 45)
+        self.assertEqual(self.sampler.sample_rate, rate)
+        self.run_load(3, 600)
+        self.assertEqual(self.sampler.sample_rate, 100.0)
+
+    def test_whole_item_counts(self):
+        self.run_load(30, 300)
+        # 100 / 6, each kept span stands for 6 spans
+        self.assertAlmostEqual(self.sampler.sample_rate, 100 / 6)
+        self.run_load(700, 300)
+        self.assertAlmostEqual(self.sampler.sample_rate, 100 / 140)
+
+    def test_min_sample_rate(self):
+        self.sampler.min_sample_rate = 10.0
+        self.run_load(500, 300)
+        self.assertEqual(self.sampler.sample_rate, 10.0)
+
+    def test_trace_consistent(self):
+        self.run_load(100, 300)
+        rate = self.sampler.sample_rate
+        kept = self.sampler.sample(self.spans)
+        self.assertTrue(kept)
+        for span in kept:
+            self.assertLess(sampling_score(span.context.trace_id) * 100, rate)
+            self.assertEqual(self.sampler.rate_of(span), rate)
+        # a trace kept at a low rate is kept at any higher rate
+        self.sampler.sample_rate = 50.0
+        self.assertTrue(
+            set(kept) <= set(FixedRateSampler(50).sample(self.spans))
+        )
+
+    def test_invalid_min_rate(self):
+        self.assertRaises(ValueError, AdaptiveSampler, min_sample_rate=0)
+
+
+# pylint: disable=protected-access
+class TestExporterSampling(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        os.environ[
+            "APPINSIGHTS_INSTRUMENTATIONKEY"
+        ] = "1234abcd-5678-4efa-8abc-1234567890ab"
+
+    def setUp(self):
+        self.exporter = AzureMonitorSpanExporter(
+            storage_path=os.path.join(TEST_FOLDER, self.id())
+        )
+
+    def tearDown(self):
+        self.exporter.shutdown()
+
+    def test_sample_rate_stamped(self):
+        self.exporter.set_span_sampler(FixedRateSampler(50))
+        spans = [
+            make_span(random.Random(index).getrandbits(128))
+            for index in range(100)
+        ]
+        envelopes = self.exporter._convert_spans(spans)
+        self.assertTrue(0 < len(envelopes) < len(spans))
+        for envelope in envelopes:
+            self.assertEqual(envelope.sample_rate, 50.0)
+            self.assertEqual(envelope.to_dict()["sampleRate"], 50.0)
+
+    def test_upstream_rate_without_sampler(self):
+        span = make_span(1, attributes={SAMPLE_RATE_ATTRIBUTE: 20.0, "a": 1})
+        (envelope,) = self.exporter._convert_spans([span])
+        self.assertEqual(envelope.sample_rate, 20.0)
+        self.assertEqual(envelope.data.base_data.properties, {"a": 1})
+        (envelope,) = self.exporter._convert_spans([make_span(1)])
+        self.assertIsNone(envelope.sample_rate)
+
+    def test_adaptive_rate_stamped(self):
+        clock = FakeClock()
+        sampler = AdaptiveSampler(
+            target_items_per_second=1.0, evaluation_interval=1.0, clock=clock
+        )
+        self.exporter.set_span_sampler(sampler)
+        spans = [
+            make_span(random.Random(index).getrandbits(128))
+            for index in range(100)
+        ]
+        clock.now += 1
+        envelopes = self.exporter._convert_spans(spans)
+        self.assertEqual(sampler.sample_rate, 1.0)
+        self.assertEqual(len(envelopes), len(sampler.sample(spans)))
+        for envelope in envelopes:
+            self.assertEqual(envelope.sample_rate, 1.0)
@@ -0,0 +1,261 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+
+import os
+import random
+import shutil
+import unittest
+
+from opentelemetry.sdk.trace import Span
+from opentelemetry.sdk.trace.export import SpanExporter, SpanExportResult
+from opentelemetry.trace import SpanContext, TraceFlags
+from opentelemetry.trace.status import Status, StatusCanonicalCode
+
+from azure_monitor.export.trace import AzureMonitorSpanExporter
+from azure_monitor.export.trace.sampling import (
+    SAMPLE_RATE_ATTRIBUTE,
+    AdaptiveSampler,
+    FixedRateSampler,
+)
+from azure_monitor.export.trace.tail_sampling import (
+    AttributePolicy,
+    ErrorPolicy,
+    LatencyPolicy,
+    TailSamplingSpanExporter,
+)
+
+TEST_FOLDER = os.path.abspath(".test.tail_sampling")
+
+
+# pylint: disable=invalid-name
+def setUpModule():
+    os.makedirs(TEST_FOLDER)
+
+
+# pylint: disable=invalid-name
+def tearDownModule():
+    shutil.rmtree(TEST_FOLDER)
+
+
+class ListExporter(SpanExporter):
+    def __init__(self):
+        self.spans = []
+        self.shut_down = False
+
+    def export(self, spans):
+        self.spans.extend(spans)
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self):
+        self.shut_down = True
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_span(
+    trace_id,
+    span_id=1,
+    parent_id=None,
+    duration=0.01,
+    code=None,
+    parent=None,
+    **attrs
+):
+    if parent_id is not None:
+        parent = SpanContext(
+            trace_id=trace_id, span_id=parent_id, is_remote=False
+        )
+    span = Span(
+        name="test",
+        context=SpanContext(
+            trace_id=trace_id,
+            span_id=span_id,
+            is_remote=False,
+            trace_flags=TraceFlags(TraceFlags.SAMPLED),
+        ),
+        parent=parent,
+        attributes=attrs,
+    )
+    span.start(start_time=10 ** 18)
+    span.end(end_time=10 ** 18 + int(duration * 1e9))
+    if code is not None:
+        span.status = Status(canonical_code=code)
+    return span
+
+
+def make_trace(trace_id, children=2, duration=0.01, **root_options):
+    spans = [
+        make_span(trace_id, span_id=index + 2, parent_id=1, duration=duration)
+        for index in range(children)
+    ]
+    spans.append(make_span(trace_id, duration=duration, **root_options))
+    return spans
+
+
+class TestPolicies(unittest.TestCase):
+    def test_error(self):
+        self.assertFalse(ErrorPolicy()(make_trace(1)))
+        spans = make_trace(1) + [
+            make_span(1, code=StatusCanonicalCode.INTERNAL)
+        ]
+        self.assertTrue(ErrorPolicy()(spans))
+
+    def test_latency(self):
+        self.assertFalse(LatencyPolicy(1.0)(make_trace(1)))
+        self.assertTrue(LatencyPolicy(1.0)(make_trace(1, duration=1.5)))
+
+    def test_attributes(self):
+        policy = AttributePolicy({"http.status_code": 429})
+        self.assertFalse(policy(make_trace(1)))
+        self.assertTrue(policy(make_trace(1, **{"http.status_code": 429})))
+
+
+class TestTailSamplingSpanExporter(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.delegate = ListExporter()
+        self.exporter = TailSamplingSpanExporter(
+            self.delegate,
+            policies=[ErrorPolicy(), LatencyPolicy(1.0)],
+            decision_wait=30.0,
+            max_spans=100,
+            clock=self.clock,
+        )
+
+    def test_decided_when_root_ends(self):
+        error = make_trace(1, code=StatusCanonicalCode.UNKNOWN)
+        slow = make_trace(2, duration=2.0)
+        healthy = make_trace(3)
+        # children come in a first batch, roots in the next one
+        self.exporter.export(error[:-1] + slow[:-1] + healthy[:-1])
+        self.assertEqual(self.delegate.spans, [])
+        self.assertEqual(self.exporter.get_stats()["buffered_traces"], 3)
+        self.exporter.export([error[-1], slow[-1], healthy[-1]])
+        self.assertEqual(self.delegate.spans, error + slow)
+        stats = self.exporter.get_stats()
+        self.assertEqual(stats["buffered_traces"], 0)
+        self.assertEqual(stats["buffered_spans"], 0)
+        self.assertEqual(stats["kept"], 2)
+        self.assertEqual(stats["dropped"], 1)
+        for span in error:
+            self.assertNotIn(SAMPLE_RATE_ATTRIBUTE, span.attributes)
+
+    def test_span_parent(self):
+        root = make_span(1, duration=2.0)
+        child = make_span(1, span_id=2, parent=root)
+        result = self.exporter.export([child, root])
+        self.assertEqual(result, SpanExportResult.SUCCESS)
+        self.assertEqual(self.delegate.spans, [child, root])
+
+    def test_late_spans_follow_decision(self):
+        self.exporter.export(make_trace(1, children=0, duration=2.0))
+        self.exporter.export(make_trace(2, children=0))
+        late = [make_span(1, span_id=9, parent_id=1)]
+        self.exporter.export(late + [make_span(2, span_id=9, parent_id=1)])
+        self.assertEqual(self.delegate.spans[-1], late[0])
+        self.assertEqual(len(self.delegate.spans), 2)
+        self.assertEqual(self.exporter.get_stats()["buffered_spans"], 0)
+
+    def test_timeout(self):
+        slow = make_trace(1, duration=2.0)[:-1]
+        self.exporter.export(slow)
+        self.clock.now += 20
+        self.exporter.export([make_span(2, parent_id=5)])
+        self.assertEqual(self.delegate.spans, [])
+        self.clock.now += 15
+        self.exporter.export([])
+        self.assertEqual(self.delegate.spans, slow)
+        stats = self.exporter.get_stats()
+        self.assertEqual(stats["expired"], 1)
+        self.assertEqual(stats["buffered_traces"], 1)
+
+    def test_lru_eviction(self):
+        slow = make_trace(0, children=10, duration=2.0)[:-1]
+        self.exporter.export(slow)
+        for trace_id in range(1, 20):
+            self.exporter.export(make_trace(trace_id, children=5)[:-1])
+        stats = self.exporter.get_stats()
+        self.assertLessEqual(stats["buffered_spans"], 100)
+        self.assertEqual(stats["evicted"], 1)
+        # the least recently updated trace is decided first
+        self.assertEqual(self.delegate.spans, slow)
+        self.assertEqual(stats["kept"], 1)
+
+    def test_sampler(self):
+        self.exporter.sampler = FixedRateSampler(50)
+        spans = []
+        for index in range(200):
+            spans.extend(make_trace(random.Random(index).getrandbits(128)))
+        self.exporter.export(spans)
+        kept = self.delegate.spans
+        self.assertTrue(0 < len(kept) < len(spans))
+        self.assertEqual(len(kept) % 3, 0)
+        for span in kept:
+            self.assertEqual(span.attributes[SAMPLE_RATE_ATTRIBUTE], 50.0)
+
+    def test_adaptive_sampler(self):
+        sampler = AdaptiveSampler(
+            target_items_per_second=1.0,
+            evaluation_interval=1.0,
+            clock=self.clock,
+        )
+        self.exporter.sampler = sampler
+        for trace_id in range(1, 101):
+            self.exporter.export(make_trace(trace_id))
+        self.clock.now += 10.0
+        self.exporter.export(make_trace(101))
+        self.assertAlmostEqual(sampler.items_per_second, 30.3)
+        self.assertEqual(sampler.sample_rate, 100.0 / 31)
+
+    def test_policy_exception(self):
+        def failing(spans):
+            raise ValueError()
+
+        self.exporter.policies = (failing, ErrorPolicy())
+        spans = make_trace(1, code=StatusCanonicalCode.UNKNOWN)
+        self.exporter.export(spans)
+        self.assertEqual(self.delegate.spans, spans)
+
+    def test_shutdown(self):
+        slow = make_trace(1, duration=2.0)[:-1]
+        self.exporter.export(slow)
+        self.exporter.shutdown()
+        self.assertEqual(self.delegate.spans, slow)
+        self.assertTrue(self.delegate.shut_down)
+        self.assertEqual(self.exporter.get_stats()["buffered_spans"], 0)
+
+
+# pylint: disable=protected-access
+class TestTailSamplingEnvelopes(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        os.environ[
+            "APPINSIGHTS_INSTRUMENTATIONKEY"
+        ] = "1234abcd-5678-4efa-8abc-1234567890ab"
+
+    def test_sample_rate_on_envelopes(self):
+        delegate = AzureMonitorSpanExporter(
+            storage_path=os.path.join(TEST_FOLDER, self.id())
+        )
+        exporter = TailSamplingSpanExporter(
+            delegate, policies=[ErrorPolicy()], sampler=FixedRateSampler(25)
+        )
+        spans = [
+            make_span(random.Random(index).getrandbits(128))
+            for index in range(100)
+        ]
+        exporter.exporter = ListExporter()
+        exporter.export(spans)
+        kept = exporter.exporter.spans
+        self.assertTrue(kept)
+        for envelope in delegate._convert_spans(kept):
+            self.assertEqual(envelope.sample_rate, 25.0)
+            self.assertNotIn(
+                SAMPLE_RATE_ATTRIBUTE, envelope.data.base_data.properties
+            )
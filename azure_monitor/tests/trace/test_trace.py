@@ -14,8 +14,13 @@ from opentelemetry.sdk.trace.export import SpanExportResult
 from opentelemetry.trace import Link, SpanContext, SpanKind
 from opentelemetry.trace.status import Status, StatusCanonicalCode
 
+from azure_monitor import utils
 from azure_monitor.export import ExportResult
-from azure_monitor.export.trace import AzureMonitorSpanExporter
+from azure_monitor.export.trace import (
+    AzureMonitorSpanExporter,
+    convert_span_to_envelope,
+    convert_spans_to_envelopes,
+)
 from azure_monitor.options import ExporterOptions
 
 TEST_FOLDER = os.path.abspath(".test")
@@ -51,6 +56,10 @@ class TestAzureExporter(unittest.TestCase):
         ] = "1234abcd-5678-4efa-8abc-1234567890ab"
         cls._exporter = AzureMonitorSpanExporter(storage_path=STORAGE_PATH)
 
+    @classmethod
+    def tearDownClass(cls):
+        cls._exporter.shutdown()
+
     def setUp(self):
         for filename in os.listdir(STORAGE_PATH):
             file_path = os.path.join(STORAGE_PATH, filename)
@@ -76,6 +85,7 @@ class TestAzureExporter(unittest.TestCase):
         self.assertEqual(
             exporter.options.storage_path, os.path.join(TEST_FOLDER, self.id())
         )
+        exporter.shutdown()
 
     def test_export_empty(self):
         exporter = self._exporter
@@ -168,6 +178,85 @@ class TestAzureExporter(unittest.TestCase):
         exporter = self._exporter
         self.assertIsNone(exporter._span_to_envelope(None))
 
+    def test_convert_spans_to_envelopes(self):
+        parent = SpanContext(
+            trace_id=36873507687745823477771305566750195431,
+            span_id=12030755672171557338,
+            is_remote=False,
+        )
+        attributes = {
+            SpanKind.SERVER: {
+                "http.method": "GET",
+                "http.route": "/wiki/:entry",
+                "http.url": "https://www.wikipedia.org/wiki/Rabbit",
+                "http.status_code": 404,
+                "test": "asd",
+            },
+            SpanKind.CLIENT: {
+                "component": "http",
+                "http.method": "GET",
+                "http.url": "https://www.wikipedia.org/wiki/Rabbit",
+                "http.status_code": 200,
+            },
+            SpanKind.INTERNAL: {"key": "value"},
+        }
+        spans = []
+        for index, (kind, span_attributes) in enumerate(attributes.items()):
+            span = Span(
+                name="test",
+                context=SpanContext(
+                    trace_id=36873507687745823477771305566750195431,
+                    span_id=index + 1,
+                    is_remote=False,
+                ),
+                parent=parent if index else None,
+                attributes=span_attributes,
+                links=[Link(context=parent)],
+                kind=kind,
+            )
+            span.start(start_time=1575494316027613500)
+            span.end(end_time=1575494317028613500)
+            spans.append(span)
+        envelopes = convert_spans_to_envelopes(spans + [None], "ikey")
+        self.assertEqual(len(envelopes), 3)
+        for span, envelope in zip(spans, envelopes):
+            expected = convert_span_to_envelope(span)
+            expected.ikey = "ikey"
+            self.assertEqual(envelope.to_dict(), expected.to_dict())
+        self.assertEqual(
+            envelopes[0].tags["ai.operation.name"], "GET /wiki/:entry"
+        )
+        self.assertNotIn("ai.operation.parentId", envelopes[0].tags)
+        self.assertEqual(
+            envelopes[2].data.base_data.properties["key"], "value"
+        )
+
+    def test_convert_dependency_url_cache(self):
+        span = Span(
+            name="test",
+            context=SpanContext(
+                trace_id=36873507687745823477771305566750195431,
+                span_id=12030755672171557337,
+                is_remote=False,
+            ),
+            attributes={
+                "http.method": "GET",
+                "http.url": "https://example.com:8080/cache/test?q=1",
+                "http.user_agent": "agent",
+                "peer.service": "example",
+            },
+            kind=SpanKind.CLIENT,
+        )
+        span.start()
+        span.end()
+        hits = utils.parse_url.cache_info().hits
+        for envelope in convert_spans_to_envelopes([span, span]):
+            data = envelope.data.base_data
+            self.assertEqual(data.target, "example.com:8080")
+            self.assertEqual(data.name, "GET//cache/test")
+            self.assertEqual(data.properties, {"peer.service": "example"})
+        self.assertEqual(utils.parse_url.cache_info().hits, hits + 1)
+
     # pylint: disable=too-many-statements
     def test_span_to_envelope(self):
         exporter = AzureMonitorSpanExporter(
@@ -923,3 +1012,4 @@ class TestAzureExporter(unittest.TestCase):
         self.assertIsNone(
             envelope.data.base_data.properties.get("request.url")
         )
+        exporter.shutdown()